@@ -1,10 +1,12 @@
 import asyncio
 from datetime import datetime, timedelta
-from typing import List
+from typing import List, Optional
 
 from app.tgs_calculator import get_match_prediction
 from app.collector import fetch_scheduled_events_for_dates
-from app.pred_store import read_predictions, write_predictions
+from app.pred_store import queue_predictions
+from app.ratelimit import upstream_priority
+from app.snapshots import record_snapshot
 
 
 def _time_offsets_minutes() -> List[int]:
@@ -28,18 +30,26 @@ def _should_run_now(event_ts: int, now: datetime, offset_min: int) -> bool:
     return delta <= 30
 
 
-async def _compute_and_store(event_id: int):
+async def _compute_and_store(event_id: int, offset_min: Optional[int] = None):
     pred = await get_match_prediction(event_id)
     if "error" in pred:
         return False
     date_str = datetime.now().strftime("%Y-%m-%d")
-    all_preds = read_predictions(date_str)
-    all_preds[str(event_id)] = pred
-    write_predictions(date_str, all_preds)
+    # Write-behind: paralel hesaplanan tahminler tek yazmada birleşir; parmak izi değişmeyenler yazılmaz
+    queue_predictions(date_str, {str(event_id): pred})
+    if offset_min is not None:
+        # Güncel tahmin yukarıda değişir; offset'teki değer ayrı bir görüntü olarak saklanır
+        await asyncio.to_thread(record_snapshot, date_str, event_id, offset_min, pred)
     return True
 
 
 async def run_agent_loop(poll_seconds: int = 30, parallelism: int = 4):
+    # Agent'ın upstream çağrıları kullanıcı isteklerinin arkasında sıraya girer
+    with upstream_priority("agent"):
+        await _agent_loop(poll_seconds, parallelism)
+
+
+async def _agent_loop(poll_seconds: int, parallelism: int):
     sem = asyncio.Semaphore(parallelism)
     offsets = _time_offsets_minutes()
     while True:
@@ -55,10 +65,11 @@ async def run_agent_loop(poll_seconds: int = 30, parallelism: int = 4):
                 if not eid or not ts:
                     continue
                 # Decide if any offset should trigger now
-                if any(_should_run_now(ts, now, off) for off in offsets):
-                    async def _task(eid=eid):
+                offset = next((off for off in offsets if _should_run_now(ts, now, off)), None)
+                if offset is not None:
+                    async def _task(eid=eid, offset=offset):
                         async with sem:
-                            await _compute_and_store(eid)
+                            await _compute_and_store(eid, offset)
                     tasks.append(asyncio.create_task(_task()))
             if tasks:
                 await asyncio.gather(*tasks)
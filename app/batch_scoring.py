@@ -0,0 +1,134 @@
+# app/batch_scoring.py
+import sys
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+# İki oyuncunun ham değerlerinin birbirine oranlandığı metrikler: skor = h / (h + a), toplam <= 0 ise 0.5
+PAIR_METRICS = (
+    "servis_hakimiyeti",
+    "kritik_anlar_puani",
+    "hucum_puani",
+    "sıralama",
+    "oran",
+    "sentiment",
+    "h2h",
+    "rakip_kalitesi",
+    "markov",
+)
+# Her oyuncu için ayrı oran olan metrikler: skor = pay / payda, payda <= 0 ise 0.5
+RATIO_METRICS = (
+    "genel_form",
+    "son_10_mac_formu",
+    "yuzey_formu",
+    "tiebreak_psikolojisi",
+)
+# calculate_metric_scores'un döndürdüğü sözlüklerdeki anahtar sırası
+METRIC_ORDER = (
+    "servis_hakimiyeti",
+    "kritik_anlar_puani",
+    "hucum_puani",
+    "sıralama",
+    "oran",
+    "sentiment",
+    "h2h",
+    "genel_form",
+    "son_10_mac_formu",
+    "yuzey_formu",
+    "rakip_kalitesi",
+    "tiebreak_psikolojisi",
+    "markov",
+)
+
+_PAIR_COL = {name: i for i, name in enumerate(PAIR_METRICS)}
+_RATIO_COL = {name: i for i, name in enumerate(RATIO_METRICS)}
+
+# Tek maçın girdisi: ([(h, a)] * 9, [((h_pay, h_payda), (a_pay, a_payda))] * 4)
+MetricInputs = Tuple[Sequence[Tuple[float, float]], Sequence[Tuple[Tuple[float, float], Tuple[float, float]]]]
+
+
+def pack_inputs(rows: Sequence[MetricInputs]) -> Tuple[np.ndarray, np.ndarray]:
+    """N maçın girdilerini (N, 9, 2) ve (N, 4, 2, 2) float64 dizilerine paketler."""
+    pairs = np.array([row[0] for row in rows], dtype=np.float64).reshape(len(rows), len(PAIR_METRICS), 2)
+    ratios = np.array([row[1] for row in rows], dtype=np.float64).reshape(len(rows), len(RATIO_METRICS), 2, 2)
+    return pairs, ratios
+
+
+def score_arrays(pairs: np.ndarray, ratios: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Tüm maçların metrik skorlarını tek geçişte hesaplar; (N, 13) ev ve deplasman matrisleri
+    METRIC_ORDER sütun sırasıyla döner. İşlemler tek maçlık hesapla aynı IEEE adımlarını izler.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        total = pairs[:, :, 0] + pairs[:, :, 1]
+        valid = ~(total <= 0)  # NaN toplam, tek maçlık hesapta olduğu gibi bölmeye gider
+        pair_home = np.where(valid, pairs[:, :, 0] / total, 0.5)
+        pair_away = np.where(valid, pairs[:, :, 1] / total, 0.5)
+        num, den = ratios[..., 0], ratios[..., 1]
+        ratio_scores = np.where(den > 0, num / den, 0.5)
+
+    n = pairs.shape[0]
+    home = np.empty((n, len(METRIC_ORDER)), dtype=np.float64)
+    away = np.empty((n, len(METRIC_ORDER)), dtype=np.float64)
+    for col, name in enumerate(METRIC_ORDER):
+        if name in _PAIR_COL:
+            home[:, col] = pair_home[:, _PAIR_COL[name]]
+            away[:, col] = pair_away[:, _PAIR_COL[name]]
+        else:
+            home[:, col] = ratio_scores[:, _RATIO_COL[name], 0]
+            away[:, col] = ratio_scores[:, _RATIO_COL[name], 1]
+    return home, away
+
+
+# Python 3.12+ float toplamında sum() Neumaier telafili toplama kullanır; vektörel toplam da aynısını yapar
+_COMPENSATED_SUM = sys.version_info >= (3, 12)
+
+
+def _weighted_sum(scores: np.ndarray, weights: Dict[str, float]) -> np.ndarray:
+    """Her satır için sum(w * skor) değerini yerleşik sum() ile birebir aynı sırada ve yöntemle hesaplar."""
+    terms = [weight * scores[:, METRIC_ORDER.index(key)] for key, weight in weights.items()]
+    if not terms:
+        return np.zeros(scores.shape[0], dtype=np.float64)
+    acc = terms[0].copy()
+    if not _COMPENSATED_SUM:
+        for x in terms[1:]:
+            acc = acc + x
+        return acc
+    comp = np.zeros_like(acc)
+    for x in terms[1:]:
+        t = acc + x
+        comp = comp + np.where(np.abs(acc) >= np.abs(x), (acc - t) + x, (x - t) + acc)
+        acc = t
+    return np.where((comp != 0) & np.isfinite(comp), acc + comp, acc)
+
+
+def tgs_arrays(home: np.ndarray, away: np.ndarray, weights: Dict[str, float]) -> Tuple[np.ndarray, ...]:
+    """Ağırlıklı TGS ve kazanma olasılıkları (ağırlık sırasıyla toplanır)."""
+    with np.errstate(invalid="ignore", over="ignore"):
+        home_tgs = _weighted_sum(home, weights)
+        away_tgs = _weighted_sum(away, weights)
+    total = home_tgs + away_tgs
+    with np.errstate(divide="ignore", invalid="ignore"):
+        home_prob = np.where(total > 0, home_tgs / total, 0.5)
+        away_prob = np.where(total > 0, away_tgs / total, 0.5)
+    return home_tgs, away_tgs, home_prob, away_prob
+
+
+def score_batch(rows: Sequence[MetricInputs], weights: Dict[str, float]) -> List[Dict[str, Any]]:
+    """N maçı tek vektörel geçişte skorlar; her maç için skor sözlükleri, TGS ve olasılıklar döner."""
+    if not rows:
+        return []
+    home, away = score_arrays(*pack_inputs(rows))
+    home_tgs, away_tgs, home_prob, away_prob = tgs_arrays(home, away, weights)
+    home_rows, away_rows = home.tolist(), away.tolist()
+    results = []
+    for i in range(len(rows)):
+        results.append({
+            "home": dict(zip(METRIC_ORDER, home_rows[i])),
+            "away": dict(zip(METRIC_ORDER, away_rows[i])),
+            "home_tgs": float(home_tgs[i]),
+            "away_tgs": float(away_tgs[i]),
+            "home_win_prob": float(home_prob[i]),
+            "away_win_prob": float(away_prob[i]),
+        })
+    return results
@@ -0,0 +1,182 @@
+# app/browser_pool.py
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from playwright.async_api import async_playwright, Browser, BrowserContext, Page, Playwright
+
+from app.ratelimit import PrioritySemaphore
+
+logger = logging.getLogger("browser_pool")
+logger.setLevel(logging.INFO)
+
+# Sayfalar bu adrese bir kez gidip cookie/state oluşturur, sonra API çağrıları için tekrar kullanılır.
+WARMUP_URL = "https://www.sofascore.com/tr/tenis"
+
+
+class BrowserPool:
+    """
+    Uygulama boyunca yaşayan tek bir Chromium süreci ve ısıtılmış sayfa havuzu.
+    Her collector çağrısı yeni tarayıcı başlatmak yerine havuzdan bir sayfa ödünç alır.
+    """
+
+    def __init__(self, size: int = 4, headless: bool = True, max_uses: int = 500, warmup_url: str = WARMUP_URL):
+        self.size = size
+        self.headless = headless
+        self.max_uses = max_uses
+        self.warmup_url = warmup_url
+        self._playwright: Optional[Playwright] = None
+        self._browser: Optional[Browser] = None
+        self._context: Optional[BrowserContext] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._idle: List[Page] = []
+        self._uses: Dict[Page, int] = {}
+        self._sem: Optional[PrioritySemaphore] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._in_use = 0
+        self.launches = 0
+        self.pages_created = 0
+        self.pages_discarded = 0
+
+    def _bind_loop(self):
+        # Playwright nesneleri event loop'a bağlıdır; script'lerde asyncio.run birden
+        # fazla kez çağrılabileceği için loop değişince havuzu sıfırdan kuruyoruz.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._sem = PrioritySemaphore(self.size)
+            self._lock = asyncio.Lock()
+            self._playwright = self._browser = self._context = None
+            self._idle, self._uses, self._in_use = [], {}, 0
+
+    async def _ensure_browser(self):
+        if self._browser is not None and self._browser.is_connected():
+            return
+        async with self._lock:
+            if self._browser is not None and self._browser.is_connected():
+                return
+            if self._browser is not None:
+                logger.warning("Chromium bağlantısı koptu, havuz yeniden başlatılıyor.")
+            self._idle, self._uses = [], {}
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            self._browser = await self._playwright.chromium.launch(headless=self.headless)
+            self._context = await self._browser.new_context()
+            self.launches += 1
+
+    async def start(self):
+        self._bind_loop()
+        await self._ensure_browser()
+
+    async def close(self):
+        if self._loop is not None and self._loop is not asyncio.get_running_loop():
+            return
+        for page in self._idle:
+            try:
+                await page.close()
+            except Exception:
+                pass
+        self._idle, self._uses = [], {}
+        try:
+            if self._browser is not None:
+                await self._browser.close()
+            if self._playwright is not None:
+                await self._playwright.stop()
+        except Exception as e:
+            logger.warning("BrowserPool kapatma hatası: %s", e)
+        self._playwright = self._browser = self._context = None
+
+    async def _new_page(self, timeout_sec: int) -> Page:
+        page = await self._context.new_page()
+        try:
+            await page.goto(self.warmup_url, wait_until="domcontentloaded", timeout=timeout_sec * 1000)
+        except Exception:
+            await self._discard(page)
+            raise
+        self._uses[page] = 0
+        self.pages_created += 1
+        return page
+
+    async def _discard(self, page: Page):
+        self._uses.pop(page, None)
+        self.pages_discarded += 1
+        try:
+            await page.close()
+        except Exception:
+            pass
+
+    async def _checkout(self, timeout_sec: int) -> Page:
+        await self._ensure_browser()
+        while self._idle:
+            page = self._idle.pop()
+            if not page.is_closed():
+                return page
+            self._uses.pop(page, None)
+        return await self._new_page(timeout_sec)
+
+    async def _checkin(self, page: Page, healthy: bool):
+        uses = self._uses.get(page, 0) + 1
+        browser_ok = self._browser is not None and self._browser.is_connected()
+        if not healthy or not browser_ok or page.is_closed() or uses >= self.max_uses or page not in self._uses:
+            await self._discard(page)
+            return
+        self._uses[page] = uses
+        self._idle.append(page)
+
+    @asynccontextmanager
+    async def page(self, timeout_sec: int = 20):
+        """
+        Havuzdan ısıtılmış bir sayfa ödünç verir; aynı anda en fazla `size` sayfa kullanılabilir.
+        Sayfa bekleyenler upstream öncelik sınıfına göre (interactive > agent > bulk) sıraya girer.
+        """
+        self._bind_loop()
+        await self._sem.acquire()
+        try:
+            page = await self._checkout(timeout_sec)
+            self._in_use += 1
+            healthy = True
+            try:
+                yield page
+            except Exception:
+                healthy = False
+                raise
+            finally:
+                self._in_use -= 1
+                await self._checkin(page, healthy)
+        finally:
+            self._sem.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "connected": bool(self._browser is not None and self._browser.is_connected()),
+            "idle": len(self._idle),
+            "in_use": self._in_use,
+            "launches": self.launches,
+            "pages_created": self.pages_created,
+            "pages_discarded": self.pages_discarded,
+        }
+
+
+_POOL: Optional[BrowserPool] = None
+
+
+def get_browser_pool() -> BrowserPool:
+    global _POOL
+    if _POOL is None:
+        _POOL = BrowserPool(
+            size=int(os.getenv("BROWSER_POOL_SIZE", "4")),
+            headless=os.getenv("BROWSER_HEADLESS", "1") != "0",
+        )
+    return _POOL
+
+
+async def start_browser_pool():
+    await get_browser_pool().start()
+
+
+async def close_browser_pool():
+    if _POOL is not None:
+        await _POOL.close()
@@ -0,0 +1,301 @@
+# app/cache.py
+import asyncio
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger("cache")
+logger.setLevel(logging.INFO)
+
+BASE_DIR = Path(__file__).resolve().parent
+DEFAULT_CACHE_PATH = BASE_DIR.parent / "data" / "cache" / "cache.sqlite3"
+
+# Süresiz (kapanmış veri) kayıtlar için TTL değeri
+NO_EXPIRY = None
+# Disk yazmaları arka plan thread'inde bu aralıkla (ya da bu kadar kayıt birikince) toplu yazılır
+DISK_FLUSH_INTERVAL_SEC = float(os.getenv("CACHE_FLUSH_INTERVAL_SEC", "0.5"))
+DISK_FLUSH_BATCH = 200
+# Bekleyen disk işlemlerinde silme işareti
+_DELETE = object()
+
+
+class _Namespace:
+    __slots__ = ("name", "ttl", "max_entries", "persist", "entries", "counters")
+
+    def __init__(self, name: str, ttl: Optional[float], max_entries: int, persist: bool):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.persist = persist
+        # key -> (expires_at | None, value); sıra = LRU sırası (sondaki en yeni)
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.counters = {"hits": 0, "disk_hits": 0, "misses": 0, "expired": 0, "evictions": 0, "writes": 0}
+
+
+class TieredCache:
+    """
+    İki katmanlı TTL cache: bellekte namespace başına boyutu sınırlı LRU, arkasında
+    yeniden başlatmalarda korunan SQLite dosyası. Bellekte olmayan kayıt diskten okunup
+    belleğe alınır. Değerler JSON olarak saklanır; süre hesabı duvar saatine (time.time) göredir.
+
+    Disk yazmaları (JSON kodlama dahil) event loop'u bloklamaz: put belleğe yazar, disk kaydı
+    arka plan thread'inde toplu yazılır. Async kod bellekte olmayan kaydı get_async ile okur
+    (disk okuması thread'de). Değerler referansla döner ve diske sonradan kodlanır: get/put
+    ile geçen nesneler salt okunurdur, değiştirmek isteyen önce kopyalar (bkz. player_profiles).
+    """
+
+    def __init__(self, path: Optional[Path] = DEFAULT_CACHE_PATH, persist: bool = True):
+        self.path = Path(path) if path else None
+        self.persist = persist and self.path is not None
+        self._namespaces: Dict[str, _Namespace] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes_since_purge = 0
+        # Bağlantı loop thread'i, to_thread işçileri ve yazıcı thread arasında paylaşılır
+        self._db_lock = threading.RLock()
+        # (ns, key) -> (expires_at, value) ya da _DELETE; yazıcı thread boşaltır
+        self._pending: Dict[tuple, Any] = {}
+        # Yazılmakta olan parti; commit edilene kadar okumalar buradan görür
+        self._flushing: Dict[tuple, Any] = {}
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+
+    def namespace(self, name: str, ttl: Optional[float], max_entries: int = 1000, persist: bool = True):
+        """Namespace'i TTL (saniye, None = süresiz) ve bellek üst sınırıyla tanımlar."""
+        self._namespaces[name] = _Namespace(name, ttl, max_entries, persist)
+        return self
+
+    # --- SQLite katmanı ---
+    def _db(self) -> Optional[sqlite3.Connection]:
+        if not self.persist:
+            return None
+        if self._conn is None:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(str(self.path), isolation_level=None, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS cache ("
+                    " ns TEXT NOT NULL, key TEXT NOT NULL, expires_at REAL, value TEXT NOT NULL,"
+                    " PRIMARY KEY (ns, key))"
+                )
+                self._conn = conn
+            except sqlite3.Error as e:
+                logger.warning("Disk cache açılamadı (%s), sadece bellek kullanılacak: %s", self.path, e)
+                self.persist = False
+                return None
+        return self._conn
+
+    def _disk_get(self, ns: _Namespace, key: str) -> Optional[tuple]:
+        if not (self.persist and ns.persist):
+            return None
+        # Henüz yazılmamış kayıt diskteki eski kaydın önüne geçer
+        with self._pending_lock:
+            pending = self._pending.get((ns.name, key), self._flushing.get((ns.name, key)))
+        if pending is not None:
+            return None if pending is _DELETE else pending
+        with self._db_lock:
+            db = self._db()
+            if db is None:
+                return None
+            try:
+                row = db.execute("SELECT expires_at, value FROM cache WHERE ns = ? AND key = ?", (ns.name, key)).fetchone()
+            except sqlite3.Error as e:
+                logger.warning("Disk cache okuma hatası: %s", e)
+                return None
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def _disk_put(self, ns: _Namespace, key: str, expires_at: Optional[float], value: Any):
+        if self.persist and ns.persist:
+            self._enqueue((ns.name, key), (expires_at, value))
+
+    def _disk_delete(self, ns: _Namespace, key: str):
+        if self.persist and ns.persist:
+            self._enqueue((ns.name, key), _DELETE)
+
+    def _enqueue(self, item_key: tuple, op: Any):
+        with self._pending_lock:
+            self._pending[item_key] = op
+            count = len(self._pending)
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._writer_loop, name="cache-writer", daemon=True)
+                self._writer.start()
+                atexit.register(self.flush)
+        if count >= DISK_FLUSH_BATCH:
+            self._wake.set()
+
+    def _writer_loop(self):
+        while True:
+            self._wake.wait(DISK_FLUSH_INTERVAL_SEC)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning("Disk cache yazıcı hatası: %s", e)
+
+    def flush(self) -> int:
+        """Bekleyen disk yazmalarını tek işlemde yazar (yazıcı thread'i ve kapanışta çağrılır); yazılan kayıt sayısı."""
+        with self._flush_lock:
+            with self._pending_lock:
+                batch, self._pending = self._pending, {}
+                self._flushing = batch
+            try:
+                return self._write_batch(batch) if batch else 0
+            finally:
+                with self._pending_lock:
+                    self._flushing = {}
+
+    def _write_batch(self, batch: Dict[tuple, Any]) -> int:
+        # JSON kodlama bağlantı kilidi dışında: okumalar bu sırada beklemez
+        rows, deletes = [], []
+        for (ns_name, key), op in batch.items():
+            if op is _DELETE:
+                deletes.append((ns_name, key))
+                continue
+            try:
+                rows.append((ns_name, key, op[0], json.dumps(op[1], ensure_ascii=False, separators=(",", ":"))))
+            except (TypeError, ValueError) as e:
+                logger.warning("Disk cache yazma hatası (%s): %s", ns_name, e)
+        with self._db_lock:
+            db = self._db()
+            if db is None:
+                return 0
+            try:
+                db.execute("BEGIN")
+                db.executemany("DELETE FROM cache WHERE ns = ? AND key = ?", deletes)
+                db.executemany("INSERT OR REPLACE INTO cache (ns, key, expires_at, value) VALUES (?, ?, ?, ?)", rows)
+                db.execute("COMMIT")
+            except sqlite3.Error as e:
+                logger.warning("Disk cache yazma hatası: %s", e)
+                try:
+                    db.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+                return 0
+            self._writes_since_purge += len(rows)
+            if self._writes_since_purge >= 500:
+                self.purge_expired()
+        return len(rows) + len(deletes)
+
+    def purge_expired(self):
+        with self._db_lock:
+            self._writes_since_purge = 0
+            db = self._db()
+            if db is not None:
+                try:
+                    db.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+                except sqlite3.Error as e:
+                    logger.warning("Disk cache temizleme hatası: %s", e)
+
+    # --- Bellek katmanı ---
+    def _remember(self, ns: _Namespace, key: str, expires_at: Optional[float], value: Any):
+        ns.entries[key] = (expires_at, value)
+        ns.entries.move_to_end(key)
+        while len(ns.entries) > ns.max_entries:
+            ns.entries.popitem(last=False)
+            ns.counters["evictions"] += 1
+
+    @staticmethod
+    def _key(key: Any) -> str:
+        return key if isinstance(key, str) else json.dumps(key, separators=(",", ":"))
+
+    def _memory_get(self, ns: _Namespace, k: str, now: float) -> Optional[tuple]:
+        item = ns.entries.get(k)
+        if item is not None:
+            expires_at, value = item
+            if expires_at is None or expires_at > now:
+                ns.entries.move_to_end(k)
+                ns.counters["hits"] += 1
+                return item
+            del ns.entries[k]
+            ns.counters["expired"] += 1
+        return None
+
+    def get(self, namespace: str, key: Any) -> Optional[Any]:
+        """Süresi dolmamış değeri döndürür; yoksa None. Bellekte yoksa diske senkron gider (async kodda get_async)."""
+        ns = self._namespaces[namespace]
+        k = self._key(key)
+        now = time.time()
+        item = self._memory_get(ns, k, now)
+        if item is not None:
+            return item[1]
+        return self._from_disk(ns, k, now, self._disk_get(ns, k))
+
+    async def get_async(self, namespace: str, key: Any) -> Optional[Any]:
+        """get ile aynı; bellekte olmayan kaydın disk okuması ve JSON çözümü thread'de yapılır."""
+        ns = self._namespaces[namespace]
+        k = self._key(key)
+        now = time.time()
+        item = self._memory_get(ns, k, now)
+        if item is not None:
+            return item[1]
+        disk_item = await asyncio.to_thread(self._disk_get, ns, k) if self.persist and ns.persist else None
+        # Beklerken başka bir çağıran yazmış olabilir
+        item = self._memory_get(ns, k, now)
+        if item is not None:
+            return item[1]
+        return self._from_disk(ns, k, now, disk_item)
+
+    def _from_disk(self, ns: _Namespace, k: str, now: float, item: Optional[tuple]) -> Optional[Any]:
+        if item is not None:
+            expires_at, value = item
+            if expires_at is None or expires_at > now:
+                self._remember(ns, k, expires_at, value)
+                ns.counters["disk_hits"] += 1
+                return value
+            self._disk_delete(ns, k)
+            ns.counters["expired"] += 1
+        ns.counters["misses"] += 1
+        return None
+
+    def put(self, namespace: str, key: Any, value: Any, ttl: Optional[float] = -1):
+        """Değeri belleğe yazar, diske arka planda yazılır. ttl verilmezse namespace TTL'i, ttl=None ise süresiz."""
+        ns = self._namespaces[namespace]
+        k = self._key(key)
+        ttl = ns.ttl if ttl == -1 else ttl
+        expires_at = None if ttl is None else time.time() + ttl
+        self._remember(ns, k, expires_at, value)
+        ns.counters["writes"] += 1
+        self._disk_put(ns, k, expires_at, value)
+
+    def invalidate(self, namespace: str, key: Any):
+        ns = self._namespaces[namespace]
+        k = self._key(key)
+        ns.entries.pop(k, None)
+        self._disk_delete(ns, k)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            name: {"ttl": ns.ttl, "size": len(ns.entries), "max_entries": ns.max_entries, **ns.counters}
+            for name, ns in self._namespaces.items()
+        }
+
+
+def make_cache() -> TieredCache:
+    """CACHE_DB_PATH ile disk dosyası, CACHE_PERSIST=0 ile sadece bellek."""
+    return TieredCache(
+        Path(os.getenv("CACHE_DB_PATH", str(DEFAULT_CACHE_PATH))),
+        persist=os.getenv("CACHE_PERSIST", "1") != "0",
+    )
+
+
+_SHARED: Optional[TieredCache] = None
+
+
+def get_cache() -> TieredCache:
+    """Uygulama genelinde paylaşılan cache; modüller kendi namespace'lerini tanımlar."""
+    global _SHARED
+    if _SHARED is None:
+        _SHARED = make_cache()
+    return _SHARED
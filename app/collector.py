@@ -1,64 +1,207 @@
 # app/collector.py
 import asyncio
-from playwright.async_api import async_playwright
-from typing import Dict, Any, List
+import contextlib
+import copy
+import functools
+import inspect
+from collections import defaultdict
+from typing import Dict, Any, List, Optional
 import logging
-import json
-import re
+
+from app.event_index import index_events
+from app.transport import get_transport
+from app.ratelimit import SharedPriority, current_priority, get_governor, shared_priority
 
 logger = logging.getLogger("collector")
 logger.setLevel(logging.INFO)
 
+# --- Single-flight: aynı fonksiyon + argümanlarla eşzamanlı çağrılar tek upstream isteğini paylaşır ---
+class _Flight:
+    __slots__ = ("task", "shared", "waiters")
+
+    def __init__(self, task: asyncio.Task, shared: SharedPriority):
+        self.task = task
+        self.shared = shared
+        self.waiters = 0
+
+
+_INFLIGHT: Dict[tuple, _Flight] = {}
+_SINGLE_FLIGHT_STATS: Dict[str, Dict[str, int]] = defaultdict(lambda: {"calls": 0, "coalesced": 0, "promoted": 0})
+# Sonucu etkilemeyen parametreler anahtara dahil edilmez
+_SINGLE_FLIGHT_IGNORED = ("headless",)
+
+
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
+
+
+def single_flight(func):
+    """
+    Aynı (fonksiyon, argümanlar) için devam eden bir çağrı varsa yenisini başlatmaz,
+    mevcut task'ın sonucunu bekler. İş, çağıranlardan bağımsız bir task'ta koşar;
+    bekleyenlerden biri iptal edilse de diğerleri sonucu alır. Sonucu değiştiren çağıranlar birbirini
+    etkilemesin diye her bekleyen kendi kopyasını alır (sonuncusu asıl nesneyi).
+
+    Sarılan her fonksiyon ayrıca `priority="interactive"|"agent"|"bulk"` alır; verilmezse
+    çağıran bağlamın önceliği (`upstream_priority`) kullanılır. Devam eden işe daha öncelikli bir
+    çağıran katılırsa iş (kuyrukta bekleyen istekleriyle birlikte) o önceliğe yükseltilir.
+    """
+    sig = inspect.signature(func)
+    stats = _SINGLE_FLIGHT_STATS[func.__name__]
+
+    async def _run(shared, args, kwargs):
+        with shared_priority(shared):
+            return await func(*args, **kwargs)
+
+    @functools.wraps(func)
+    async def wrapper(*args, priority: Optional[str] = None, **kwargs):
+        bound = sig.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = (func.__name__, _freeze({k: v for k, v in bound.arguments.items() if k not in _SINGLE_FLIGHT_IGNORED}))
+        stats["calls"] += 1
+        cls = priority or current_priority()
+        flight = _INFLIGHT.get(key)
+        if flight is not None and not flight.task.done() and flight.task.get_loop() is asyncio.get_running_loop():
+            stats["coalesced"] += 1
+            if flight.shared.raise_to(cls):
+                stats["promoted"] += 1
+        else:
+            shared = SharedPriority(cls)
+            flight = _INFLIGHT[key] = _Flight(asyncio.ensure_future(_run(shared, args, kwargs)), shared)
+
+            def _release(t, key=key):
+                current = _INFLIGHT.get(key)
+                if current is not None and current.task is t:
+                    del _INFLIGHT[key]
+            flight.task.add_done_callback(_release)
+        flight.waiters += 1
+        try:
+            result = await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+        # Task bittikten sonra yeni bekleyen katılmaz; en son uyanan asıl nesneyi, diğerleri kopyasını alır
+        return result if flight.waiters == 0 else copy.deepcopy(result)
+
+    return wrapper
+
+
+def collector_stats() -> Dict[str, Any]:
+    """Fonksiyon bazında çağrı ve birleştirilen (coalesced) istek sayıları."""
+    per_function = {name: dict(v) for name, v in _SINGLE_FLIGHT_STATS.items()}
+    return {
+        "single_flight": per_function,
+        "coalesced_total": sum(v["coalesced"] for v in per_function.values()),
+        "inflight": len(_INFLIGHT),
+    }
+
+
+def _upstream_slot(transport, tokens: int = 1):
+    # Replay modunda upstream yok: governor (hız + eşzamanlılık sınırı) atlanır
+    if not transport.rate_limited:
+        return contextlib.nullcontext()
+    return get_governor().slot(tokens=tokens)
+
+
+def _observe(transport, responses):
+    if transport.rate_limited:
+        get_governor().observe(responses)
+
+
+async def _fetch_json(url: str, timeout_sec: int = 20) -> Optional[Any]:
+    """
+    JSON API çağrısını aktif transport (httpx hızlı yol / tarayıcı havuzu) üzerinden yapar; hata durumunda None.
+    Tüm çağrılar paylaşılan upstream governor'dan (rate limit + eşzamanlılık) geçer (replay hariç).
+    """
+    transport = get_transport()
+    async with _upstream_slot(transport):
+        resp = await transport.fetch(url, timeout_sec)
+    _observe(transport, [resp])
+    if not resp.ok:
+        logger.debug("upstream hata (%s): %s", url, resp.error)
+        return None
+    return resp.data
+
+
+async def _fetch_json_batch(urls: List[str], timeout_sec: int = 20) -> List[Dict[str, Any]]:
+    """
+    URL listesini eşzamanlı çeker; toplam süre en yavaş endpoint ile sınırlıdır.
+    Sonuçlar girdi sırasıyla {"status", "data"} ya da {"status", "error"} olarak döner.
+    """
+    if not urls:
+        return []
+    transport = get_transport()
+    async with _upstream_slot(transport, tokens=len(urls)):
+        responses = await transport.fetch_many(urls, timeout_sec)
+    _observe(transport, responses)
+    results = []
+    for resp in responses:
+        if resp.ok:
+            results.append({"status": resp.status, "data": resp.data})
+        else:
+            results.append({"status": resp.status, "error": resp.error})
+    return results
 
+
+@single_flight
 async def fetch_live_events_via_page(timeout_sec: int = 20, headless: bool = True) -> Dict[str, Any]:
     api_url = "https://api.sofascore.com/api/v1/sport/tennis/events/live"
     captured = None
     try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=headless)
-            page = await browser.new_page()
-            await page.goto("https://www.sofascore.com/tr/tenis", wait_until="domcontentloaded", timeout=timeout_sec * 1000)
-            captured = await page.evaluate(
-                f"""() => fetch("{api_url}")
-                    .then(r => r.json())
-                    .catch(() => null)"""
-            )
-            await browser.close()
+        captured = await _fetch_json(api_url, timeout_sec)
     except Exception as e:
         logger.warning("fetch_live_events_via_page hata: %s", e)
+    if isinstance(captured, dict) and isinstance(captured.get("events"), list):
+        index_events(captured["events"])
     return captured or {"events": []}
 
 
-async def fetch_all_event_details(event_id: int, endpoints: List[str], timeout_sec: int = 25, headless: bool = True) -> List[Dict[str, Any]]:
+@single_flight
+async def fetch_event(event_id: int, timeout_sec: int = 10) -> Dict[str, Any]:
+    """Tek maçın event nesnesi (/api/v1/event/{id}); maç indeksine de eklenir. Hata durumunda {}."""
+    url = f"https://www.sofascore.com/api/v1/event/{event_id}"
+    data = None
+    try:
+        data = await _fetch_json(url, timeout_sec)
+    except Exception as e:
+        logger.warning("fetch_event (event_id: %s) hata: %s", event_id, e)
+    event = data.get("event") if isinstance(data, dict) else None
+    if not isinstance(event, dict):
+        return {}
+    index_events([event])
+    return event
+
+
+@single_flight
+async def fetch_all_event_details(event_id: int, endpoints: List[str], timeout_sec: int = 25, headless: bool = True, batched: bool = True) -> List[Dict[str, Any]]:
     """
-    Verilen endpoint listesi için TÜM verileri TEK bir Playwright oturumunda çeker.
-    Bu, her endpoint için ayrı ayrı tarayıcı başlatma yükünü ortadan kaldırır.
+    Verilen endpoint listesi için TÜM verileri aktif transport üzerinden çeker.
+    batched=True iken tüm endpoint'ler eşzamanlı sorgulanır (tarayıcıda tek evaluate + Promise.allSettled,
+    httpx'te paralel istekler; süre = en yavaş endpoint). Başarısız endpoint'ler sırası korunarak
+    {"error": ..., "endpoint": ...} olarak döner.
     """
     base_url = f"https://api.sofascore.com/api/v1/event/{event_id}"
     all_results = []
 
     try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=headless)
-            page = await browser.new_page()
-            # Oturum cookielerini ve state'i ayarlamak için ana sayfaya bir kez git
-            await page.goto("https://www.sofascore.com/tr/tenis", wait_until="domcontentloaded", timeout=timeout_sec * 1000)
-
-            # Tüm endpoint'leri aynı sayfa üzerinden paralel olarak sorgula
-            for endpoint in endpoints:
-                api_url = f"{base_url}/{endpoint}"
-                try:
-                    captured = await page.evaluate(
-                        f"""() => fetch("{api_url}")
-                            .then(r => r.json())
-                            .catch(() => null)"""
-                    )
-                    all_results.append(captured or {})
-                except Exception as e:
-                    logger.warning(f"Endpoint '{endpoint}' için evaluate hatası: {e}")
-                    all_results.append({"error": f"Endpoint fetch failed for {endpoint}"})
-
-            await browser.close()
+        if batched:
+            settled = await _fetch_json_batch([f"{base_url}/{endpoint}" for endpoint in endpoints], timeout_sec)
+            for endpoint, res in zip(endpoints, settled):
+                if "error" in res:
+                    logger.warning(f"Endpoint '{endpoint}' hatası (event_id: {event_id}): {res['error']}")
+                    all_results.append({"error": res["error"], "endpoint": endpoint, "status": res.get("status", 0)})
+                else:
+                    all_results.append(res.get("data") or {})
+            return all_results
+
+        for endpoint in endpoints:
+            captured = await _fetch_json(f"{base_url}/{endpoint}", timeout_sec)
+            all_results.append(captured or {})
 
     except Exception as e:
         logger.error(f"fetch_all_event_details genel hata (event_id: {event_id}): {e}")
@@ -68,36 +211,26 @@ async def fetch_all_event_details(event_id: int, endpoints: List[str], timeout_s
     return all_results
 
 
+@single_flight
 async def fetch_player_profile(team_id: int, headless: bool = True):
     url = f"https://www.sofascore.com/api/v1/team/{team_id}"
-    text = "{}"
+    data = None
     try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=headless)
-            page = await browser.new_page()
-            await page.goto(url)
-            text = await page.inner_text("pre, body")
-            await browser.close()
+        data = await _fetch_json(url)
     except Exception as e:
         logger.warning("fetch_player_profile hata: %s", e)
-    return json.loads(text)
+    return data or {}
 
 
+@single_flight
 async def fetch_player_matches(team_id: int, page: int = 0, headless: bool = True):
     url = f"https://www.sofascore.com/api/v1/team/{team_id}/events/last/{page}"
-    text = "{}"
+    data = None
     try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=headless)
-            page_ = await browser.new_page()
-            await page_.goto(url, wait_until="domcontentloaded", timeout=20000)
-            text = await page_.inner_text("pre, body")
-            await browser.close()
+        data = await _fetch_json(url, timeout_sec=20)
     except Exception as e:
         logger.warning("fetch_player_matches hata: %s", e)
-    try:
-        data = json.loads(text)
-    except json.JSONDecodeError:
+    if not isinstance(data, dict):
         logger.warning(f"JSON parse hatası: {url}")
         return {"events": []}
     all_events = data.get("events", [])
@@ -110,26 +243,47 @@ async def fetch_player_matches(team_id: int, page: int = 0, headless: bool = Tru
     return data
 
 
+@single_flight
+async def fetch_player_last_events(team_id: int, page: int = 0, timeout_sec: int = 10) -> Dict[str, Any]:
+    """Oyuncunun son maçlarını filtrelemeden döndürür (turnuva/sezon bilgisi için). Hata durumunda {}."""
+    url = f"https://www.sofascore.com/api/v1/team/{team_id}/events/last/{page}"
+    data = None
+    try:
+        data = await _fetch_json(url, timeout_sec)
+    except Exception as e:
+        logger.warning("fetch_player_last_events hata: %s", e)
+    return data if isinstance(data, dict) else {}
+
+
+@single_flight
+async def fetch_player_tournament_statistics(team_id: int, tournament_id: int, season_id: int, timeout_sec: int = 10) -> Dict[str, Any]:
+    """Oyuncunun belirli turnuva/sezondaki genel istatistikleri. Hata durumunda {}."""
+    url = (f"https://www.sofascore.com/api/v1/team/{team_id}/unique-tournament/"
+           f"{tournament_id}/season/{season_id}/statistics/overall")
+    data = None
+    try:
+        data = await _fetch_json(url, timeout_sec)
+    except Exception as e:
+        logger.warning("fetch_player_tournament_statistics hata: %s", e)
+    return data if isinstance(data, dict) else {}
+
+
+@single_flight
 async def fetch_rankings_via_page(team_id: int, timeout_sec: int = 20, headless: bool = True):
     url = f"https://www.sofascore.com/api/v1/team/{team_id}/rankings"
     data = {"error": "Veri alınamadı."}
     try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=headless)
-            page = await browser.new_page()
-            await page.goto(url, timeout=timeout_sec * 1000)
-            html = await page.content()
-            await browser.close()
-            match = re.search(r"<pre.*?>(.*?)</pre>", html, re.S)
-            if match:
-                data = json.loads(match.group(1))
-            else:
-                data = {"error": "JSON verisi bulunamadı."}
+        captured = await _fetch_json(url, timeout_sec)
+        if isinstance(captured, dict):
+            data = captured
+        else:
+            data = {"error": "JSON verisi bulunamadı."}
     except Exception as e:
         logger.warning("fetch_rankings_via_page hata: %s", e)
         data = {"error": str(e)}
     return data
 
+@single_flight
 async def fetch_scheduled_events_for_dates(dates: List[str], timeout_sec: int = 20, headless: bool = True) -> Dict[str, Any]:
     """Verilen ISO tarih listesi (YYYY-MM-DD) için planlanan tenis maçlarını döndürür.
 
@@ -137,48 +291,40 @@ async def fetch_scheduled_events_for_dates(dates: List[str], timeout_sec: int =
     """
     all_events: List[Dict[str, Any]] = []
     try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=headless)
-            page = await browser.new_page()
-            # Cookie/state oluşsun
-            await page.goto("https://www.sofascore.com/tr/tenis", wait_until="domcontentloaded", timeout=timeout_sec * 1000)
-            for d in dates:
-                api_url = f"https://www.sofascore.com/api/v1/sport/tennis/scheduled-events/{d}"
-                try:
-                    captured = await page.evaluate(
-                        f"""() => fetch("{api_url}")
-                            .then(r => r.json())
-                            .catch(() => null)"""
-                    )
-                    events = (captured or {}).get("events", [])
-                    if isinstance(events, list):
-                        all_events.extend(events)
-                except Exception as e:
-                    logger.warning("scheduled-events evaluate hata (%s): %s", d, e)
-            await browser.close()
+        urls = [f"https://www.sofascore.com/api/v1/sport/tennis/scheduled-events/{d}" for d in dates]
+        # Tarihler tek evaluate içinde eşzamanlı çekilir
+        for d, res in zip(dates, await _fetch_json_batch(urls, timeout_sec)):
+            if "error" in res:
+                logger.warning("scheduled-events hata (%s): %s", d, res["error"])
+                continue
+            events = (res.get("data") or {}).get("events", [])
+            if isinstance(events, list):
+                all_events.extend(events)
     except Exception as e:
         logger.warning("fetch_scheduled_events_for_dates genel hata: %s", e)
     # Aynı event id'leri tekilleştir
     unique = {e.get("id"): e for e in all_events if e and e.get("id")}
+    index_events(unique.values())
     return {"events": list(unique.values())}
 
+@single_flight
 async def fetch_year_statistics(team_id: int, year: int, headless: bool = True) -> Dict[str, Any]:
-    """Bir oyuncunun belirli bir yıldaki istatistiklerini çeker."""
+    """
+    Bir oyuncunun belirli bir yıldaki istatistiklerini çeker. Upstream'e ulaşılamazsa (hata/engel) sonuç
+    `fetch_error: True` taşır; böylece gerçekten boş bir yıldan ayrılır ve uzun süre cache'lenmez.
+    """
     url = f"https://www.sofascore.com/api/v1/team/{team_id}/year-statistics/{year}"
-    data = {"statistics": []}
+    data = {"statistics": [], "fetch_error": True}
     try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=headless)
-            page = await browser.new_page()
-            await page.goto(url, timeout=20 * 1000)
-            content = await page.inner_text("pre, body")
-            await browser.close()
-            data = json.loads(content)
+        captured = await _fetch_json(url, timeout_sec=20)
+        if isinstance(captured, dict):
+            data = captured
     except Exception as e:
         logger.warning(f"fetch_year_statistics (team_id: {team_id}, year: {year}) hata: {e}")
     return data
 
 
+@single_flight
 async def fetch_bulk_odds_for_date(date_str: str, timeout_sec: int = 25, headless: bool = True) -> Dict[str, Any]:
     """
     Belirli bir tarih için (YYYY-MM-DD) toplu oranları döndürür.
@@ -186,30 +332,22 @@ async def fetch_bulk_odds_for_date(date_str: str, timeout_sec: int = 25, headles
     """
     api_url = f"https://www.sofascore.com/api/v1/sport/tennis/odds/1/{date_str}"
     try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=headless)
-            page = await browser.new_page()
-            await page.goto(api_url, wait_until="domcontentloaded", timeout=timeout_sec * 1000)
-            content = await page.inner_text("pre, body")
-            await browser.close()
-            
-            parsed_json = json.loads(content)
-            
-            if isinstance(parsed_json, dict) and "odds" in parsed_json and isinstance(parsed_json["odds"], dict):
-                odds_dict = parsed_json["odds"]
-                
-                odds_list = []
-                for event_id, odds_data in odds_dict.items():
-                    odds_data['id'] = int(event_id) 
-                    odds_list.append(odds_data)
-                
-                logger.info(f"{date_str} için {len(odds_list)} adet oran verisi başarıyla formatlandı.")
-                return {"odds": odds_list}
-            else:
-                logger.warning(f"Odds verisi beklenen {{\"odds\": {{...}} }} formatında değil: {api_url}")
-                return {"odds": []}
+        parsed_json = await _fetch_json(api_url, timeout_sec)
+
+        if isinstance(parsed_json, dict) and "odds" in parsed_json and isinstance(parsed_json["odds"], dict):
+            odds_dict = parsed_json["odds"]
+
+            odds_list = []
+            for event_id, odds_data in odds_dict.items():
+                odds_data['id'] = int(event_id)
+                odds_list.append(odds_data)
+
+            logger.info(f"{date_str} için {len(odds_list)} adet oran verisi başarıyla formatlandı.")
+            return {"odds": odds_list}
+        else:
+            logger.warning(f"Odds verisi beklenen {{\"odds\": {{...}} }} formatında değil: {api_url}")
+            return {"odds": []}
 
     except Exception as e:
         logger.error(f"fetch_bulk_odds_for_date KRİTİK HATA: {e}")
         return {"odds": []}
-        
\ No newline at end of file
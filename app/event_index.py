@@ -0,0 +1,48 @@
+# app/event_index.py
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+# Uygulamanın zaten yaptığı program/canlı maç çekimlerinden beslenen bellek içi maç indeksi.
+# Tahmin akışı maç detayını (oyuncular, zemin) buradan O(1) okur; tüm programı yeniden taramaz.
+MAX_EVENTS = 20000
+
+_EVENTS: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+_COUNTERS = {"hits": 0, "misses": 0, "indexed": 0}
+
+
+def event_summary(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Ham Sofascore event nesnesinden get_event_details formatındaki özet."""
+    home, away = event.get("homeTeam") or {}, event.get("awayTeam") or {}
+    return {
+        "home_team_id": home.get("id"),
+        "away_team_id": away.get("id"),
+        "home_team_name": home.get("name"),
+        "away_team_name": away.get("name"),
+        "ground_type": event.get("groundType"),
+        "best_of": event.get("defaultPeriodCount"),
+        "start_timestamp": event.get("startTimestamp"),
+        "status": (event.get("status") or {}).get("type"),
+    }
+
+
+def index_events(events: Iterable[Dict[str, Any]]):
+    """Event listesini indekse ekler/günceller (en son görülen en yeni)."""
+    for event in events:
+        if not isinstance(event, dict) or not event.get("id") or not event.get("homeTeam"):
+            continue
+        event_id = event["id"]
+        _EVENTS[event_id] = event_summary(event)
+        _EVENTS.move_to_end(event_id)
+        _COUNTERS["indexed"] += 1
+    while len(_EVENTS) > MAX_EVENTS:
+        _EVENTS.popitem(last=False)
+
+
+def lookup_event(event_id: int) -> Optional[Dict[str, Any]]:
+    summary = _EVENTS.get(event_id)
+    _COUNTERS["hits" if summary is not None else "misses"] += 1
+    return summary
+
+
+def event_index_stats() -> Dict[str, int]:
+    return {"size": len(_EVENTS), **_COUNTERS}
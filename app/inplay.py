@@ -0,0 +1,263 @@
+# app/inplay.py
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from app.markov import FORMATS, load_or_build_table
+
+# Canlı skor -> maç kazanma olasılığı. Her format için (set, oyun, sayı, servisçi) durumları düz bir indekse
+# dizilir; tablo[p_home kovası, p_away kovası, durum] = P(ev sahibi kazanır). Tablo float16 olarak diskte
+# tutulur ve memory-map ile açılır; skor güncellemesi başına tek okuma yapılır.
+
+LIVE_GRID_MIN = 0.40
+LIVE_GRID_MAX = 0.90
+LIVE_GRID_STEP = 0.02
+LIVE_GRID = np.round(np.arange(LIVE_GRID_MIN, LIVE_GRID_MAX + LIVE_GRID_STEP / 2, LIVE_GRID_STEP), 6)
+
+# Normal oyunda sayı durumları 0, 15, 30, 40 (eşitlik 40-40, avantaj 40-30 ile aynı olasılıktadır)
+GAME_POINTS = 4
+_POINT_VALUES = {"0": 0, "15": 1, "30": 2, "40": 3, "A": 4}
+_GAMES_BLOCK = 7 * 7 * GAME_POINTS * GAME_POINTS * 2
+
+
+def _tb_side(final_set_tiebreak: int) -> int:
+    # Tiebreak sayıları 0..T+1 (uzayan tiebreak, servis sırası korunarak bu aralığa indirilir)
+    return max(7, final_set_tiebreak) + 2
+
+
+def _set_block(final_set_tiebreak: int) -> int:
+    side = _tb_side(final_set_tiebreak)
+    return _GAMES_BLOCK + side * side * 2
+
+
+def state_count(best_of: int, final_set_tiebreak: int) -> int:
+    sets_to_win = best_of // 2 + 1
+    return sets_to_win * sets_to_win * _set_block(final_set_tiebreak)
+
+
+def state_index(best_of: int, final_set_tiebreak: int, sets_home: int, sets_away: int, games_home: int, games_away: int,
+                points_home: int, points_away: int, home_serving: bool) -> int:
+    """Normalize edilmiş durumun düz indeksi. 6-6'da sayılar tiebreak sayılarıdır."""
+    sets_to_win = best_of // 2 + 1
+    base = (sets_home * sets_to_win + sets_away) * _set_block(final_set_tiebreak)
+    server = 0 if home_serving else 1
+    if games_home == 6 and games_away == 6:
+        side = _tb_side(final_set_tiebreak)
+        return base + _GAMES_BLOCK + (points_home * side + points_away) * 2 + server
+    return base + (((games_home * 7 + games_away) * GAME_POINTS + points_home) * GAME_POINTS + points_away) * 2 + server
+
+
+def _game_from_points(p) -> Dict[Tuple[int, int], Any]:
+    """Servisçinin (servisçi sayısı, karşılayan sayısı) durumundan oyunu kazanma olasılığı."""
+    q = 1.0 - p
+    g: Dict[Tuple[int, int], Any] = {(3, 3): p * p / (p * p + q * q)}
+    for total in range(5, -1, -1):
+        for a in range(min(total, 3), -1, -1):
+            b = total - a
+            if b > 3 or (a, b) in g:
+                continue
+            win = 1.0 if a == 3 else g[(a + 1, b)]
+            lose = 0.0 if b == 3 else g[(a, b + 1)]
+            g[(a, b)] = p * win + q * lose
+    return g
+
+
+def build_inplay_table(best_of: int, final_set_tiebreak: int) -> np.ndarray:
+    """Tüm ızgara için geriye doğru tümevarım; (kova, kova, durum) float16 tablo."""
+    size = LIVE_GRID.size
+    p_home = np.broadcast_to(LIVE_GRID[:, None], (size, size)).astype(np.float64)
+    p_away = np.broadcast_to(LIVE_GRID[None, :], (size, size)).astype(np.float64)
+    one, zero = np.ones((size, size)), np.zeros((size, size))
+    sets_to_win = best_of // 2 + 1
+    hold = {True: _game_from_points(p_home), False: _game_from_points(p_away)}
+    # Tiebreak eşitliğinden sonra her iki sayıda bir kez iki oyuncu da servis atar
+    a_both, b_both = p_home * (1.0 - p_away), (1.0 - p_home) * p_away
+    tb_from_tie = a_both / (a_both + b_both)
+    memo: Dict[tuple, np.ndarray] = {}
+
+    def set_start(sh: int, sa: int, home_serves: bool) -> np.ndarray:
+        if sh == sets_to_win:
+            return one
+        if sa == sets_to_win:
+            return zero
+        return game_start(sh, sa, 0, 0, home_serves)
+
+    def after_game(sh: int, sa: int, gh: int, ga: int, home_served: bool) -> np.ndarray:
+        if max(gh, ga) >= 6 and abs(gh - ga) >= 2:
+            return set_start(sh + (gh > ga), sa + (ga > gh), not home_served)
+        if gh == 6 and ga == 6:
+            return tiebreak(sh, sa, 0, 0, not home_served)
+        return game_start(sh, sa, gh, ga, not home_served)
+
+    def point_value(sh: int, sa: int, gh: int, ga: int, ph: int, pa: int, home_serves: bool) -> np.ndarray:
+        g = hold[home_serves][(ph, pa) if home_serves else (pa, ph)]
+        home_game = g if home_serves else 1.0 - g
+        return home_game * after_game(sh, sa, gh + 1, ga, home_serves) + (1.0 - home_game) * after_game(sh, sa, gh, ga + 1, home_serves)
+
+    def game_start(sh: int, sa: int, gh: int, ga: int, home_serves: bool) -> np.ndarray:
+        key = ("g", sh, sa, gh, ga, home_serves)
+        if key not in memo:
+            memo[key] = point_value(sh, sa, gh, ga, 0, 0, home_serves)
+        return memo[key]
+
+    def tiebreak(sh: int, sa: int, a: int, b: int, home_serving: bool) -> np.ndarray:
+        key = ("t", sh, sa, a, b, home_serving)
+        if key in memo:
+            return memo[key]
+        target = final_set_tiebreak if sh + sa == best_of - 1 else 7
+        n = a + b
+        # Servis sırası A, BB, AA, ...: tiebreak'i açan ve sonraki seti açacak oyuncu
+        first_home = home_serving if ((n + 1) // 2) % 2 == 0 else not home_serving
+        if a >= target and a - b >= 2:
+            value = set_start(sh + 1, sa, not first_home)
+        elif b >= target and b - a >= 2:
+            value = set_start(sh, sa + 1, not first_home)
+        elif a == b and a >= target - 1:
+            value = tb_from_tie * set_start(sh + 1, sa, not first_home) + (1.0 - tb_from_tie) * set_start(sh, sa + 1, not first_home)
+        else:
+            p = p_home if home_serving else 1.0 - p_away
+            next_home = (not home_serving) if n % 2 == 0 else home_serving
+            value = p * tiebreak(sh, sa, a + 1, b, next_home) + (1.0 - p) * tiebreak(sh, sa, a, b + 1, next_home)
+        memo[key] = value
+        return value
+
+    table = np.full((size, size, state_count(best_of, final_set_tiebreak)), np.nan, dtype=np.float16)
+    side = _tb_side(final_set_tiebreak)
+    for sh in range(sets_to_win):
+        for sa in range(sets_to_win):
+            for home_serves in (True, False):
+                for gh in range(7):
+                    for ga in range(7):
+                        if gh == 6 and ga == 6:
+                            for a in range(side):
+                                for b in range(side):
+                                    idx = state_index(best_of, final_set_tiebreak, sh, sa, gh, ga, a, b, home_serves)
+                                    table[:, :, idx] = tiebreak(sh, sa, a, b, home_serves)
+                            continue
+                        if max(gh, ga) >= 6 and abs(gh - ga) >= 2:
+                            continue  # set bitmiş; canlı skor bir sonraki sete geçer
+                        for ph in range(GAME_POINTS):
+                            for pa in range(GAME_POINTS):
+                                idx = state_index(best_of, final_set_tiebreak, sh, sa, gh, ga, ph, pa, home_serves)
+                                table[:, :, idx] = point_value(sh, sa, gh, ga, ph, pa, home_serves)
+    return table
+
+
+def load_inplay_table(best_of: int, final_set_tiebreak: int) -> np.ndarray:
+    name = f"inplay_bo{best_of}_tb{final_set_tiebreak}_{LIVE_GRID_MIN:.2f}_{LIVE_GRID_MAX:.2f}_{LIVE_GRID_STEP:.3f}"
+    shape = (LIVE_GRID.size, LIVE_GRID.size, state_count(best_of, final_set_tiebreak))
+    return load_or_build_table(name, shape, lambda: build_inplay_table(best_of, final_set_tiebreak))
+
+
+def load_inplay_tables():
+    for best_of, final_set_tiebreak in FORMATS:
+        load_inplay_table(best_of, final_set_tiebreak)
+
+
+def _bucket(p: float) -> int:
+    return int(round((min(max(p, LIVE_GRID_MIN), LIVE_GRID_MAX) - LIVE_GRID_MIN) / LIVE_GRID_STEP))
+
+
+def _normalize_points(points_home: int, points_away: int, tiebreak: bool, target: int) -> Tuple[int, int]:
+    if not tiebreak:
+        # 40-40 ve sonrası: eşitlik 40-40, avantaj 40-30 olarak okunur
+        if points_home >= 3 and points_away >= 3:
+            return (3, 3) if points_home == points_away else ((3, 2) if points_home > points_away else (2, 3))
+        return min(points_home, 3), min(points_away, 3)
+    # Uzayan tiebreak: servis sırası değişmesin diye iki sayı (her oyuncudan ikişer) birden geri alınır
+    low = min(points_home, points_away)
+    if low >= target - 1:
+        shift = (low - (target - 1)) // 2 * 2
+        return points_home - shift, points_away - shift
+    return points_home, points_away
+
+
+def _current_server(event: Dict[str, Any], sets_played: int, games_home: int, games_away: int,
+                    points_home: int, points_away: int, tiebreak: bool) -> Optional[bool]:
+    """
+    O anki sayının servisçisi (True = ev sahibi). `firstToServe` maçın ilk oyununu açan oyuncudur (1 = ev
+    sahibi); servis her oyunda el değiştirir (tiebreak da bir oyun sayılır). Tiebreak içinde ilk sayıyı
+    açan atar, sonra ikişer sayıda bir el değiştirir. Belirlenemezse None.
+    """
+    first = event.get("firstToServe")
+    if first not in (1, 2):
+        return None
+    home_score, away_score = event.get("homeScore") or {}, event.get("awayScore") or {}
+    games_played = games_home + games_away
+    try:
+        for n in range(1, sets_played + 1):
+            games_played += int(home_score[f"period{n}"]) + int(away_score[f"period{n}"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    home_serving = (first == 1) == (games_played % 2 == 0)
+    if tiebreak and ((points_home + points_away + 1) // 2) % 2 == 1:
+        home_serving = not home_serving
+    return home_serving
+
+
+def live_score_state(event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Sofascore canlı event'inden skor durumu: set, oyun, sayı ve o anki servisçi (bkz. _current_server).
+    Okunamayan skorlar için None döner.
+    """
+    home_score, away_score = event.get("homeScore") or {}, event.get("awayScore") or {}
+    best_of = 5 if event.get("defaultPeriodCount") == 5 else 3
+    final_set_tiebreak = 10 if best_of == 5 else 7
+    try:
+        sets_home, sets_away = int(home_score.get("current") or 0), int(away_score.get("current") or 0)
+        current = sets_home + sets_away + 1
+        games_home = int(home_score.get(f"period{current}") or 0)
+        games_away = int(away_score.get(f"period{current}") or 0)
+        tiebreak = games_home == 6 and games_away == 6
+        raw_home, raw_away = str(home_score.get("point") or "0"), str(away_score.get("point") or "0")
+        if tiebreak:
+            points_home, points_away = int(raw_home), int(raw_away)
+        else:
+            points_home, points_away = _POINT_VALUES[raw_home], _POINT_VALUES[raw_away]
+    except (KeyError, TypeError, ValueError):
+        return None
+    sets_to_win = best_of // 2 + 1
+    if max(sets_home, sets_away) > sets_to_win or not (0 <= games_home <= 7 and 0 <= games_away <= 7):
+        return None
+    if tiebreak:
+        # Hatalı ya da sete henüz işlenmemiş tiebreak skoru tablonun tiebreak bloğunun dışına düşer
+        target = final_set_tiebreak if sets_home + sets_away == best_of - 1 else 7
+        normalized = _normalize_points(points_home, points_away, True, target)
+        if min(normalized) < 0 or max(normalized) >= _tb_side(target):
+            return None
+    return {
+        "best_of": best_of,
+        "final_set_tiebreak": final_set_tiebreak,
+        "sets": [sets_home, sets_away],
+        "games": [games_home, games_away],
+        "points": [points_home, points_away],
+        "tiebreak": tiebreak,
+        "home_serving": _current_server(event, current - 1, games_home, games_away, points_home, points_away, tiebreak),
+    }
+
+
+def live_win_prob(state: Dict[str, Any], p_home: float, p_away: float) -> float:
+    """Skor durumu ve servis sayısı olasılıklarından ev sahibinin kazanma olasılığı (tablodan tek okuma)."""
+    best_of, final_set_tiebreak = state["best_of"], state["final_set_tiebreak"]
+    sets_home, sets_away = state["sets"]
+    sets_to_win = best_of // 2 + 1
+    if sets_home >= sets_to_win or sets_away >= sets_to_win:
+        return 1.0 if sets_home >= sets_to_win else 0.0
+    games_home, games_away = state["games"]
+    if max(games_home, games_away) >= 6 and abs(games_home - games_away) >= 2 or max(games_home, games_away) == 7:
+        # Set bitti ama set sayısı henüz güncellenmedi
+        sets_home, sets_away = sets_home + (games_home > games_away), sets_away + (games_away > games_home)
+        if sets_home >= sets_to_win or sets_away >= sets_to_win:
+            return 1.0 if sets_home >= sets_to_win else 0.0
+        games_home = games_away = 0
+        state = {**state, "points": [0, 0], "tiebreak": False}
+    target = final_set_tiebreak if sets_home + sets_away == best_of - 1 else 7
+    points = _normalize_points(*state["points"], state["tiebreak"], target)
+    table = load_inplay_table(best_of, final_set_tiebreak)
+    i, j = _bucket(p_home), _bucket(p_away)
+    servers = (True, False) if state["home_serving"] is None else (state["home_serving"],)
+    values = [
+        float(table[i, j, state_index(best_of, final_set_tiebreak, sets_home, sets_away, games_home, games_away, *points, server)])
+        for server in servers
+    ]
+    return sum(values) / len(values)
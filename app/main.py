@@ -1,28 +1,29 @@
 # app/main.py
 
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 import asyncio
 from pathlib import Path
 import sys
-import requests
 from contextlib import suppress
 
 try:
     from app.collector import (
         fetch_live_events_via_page, fetch_all_event_details, fetch_player_profile,
         fetch_player_matches, fetch_rankings_via_page, fetch_scheduled_events_for_dates,
-        fetch_bulk_odds_for_date
+        fetch_player_last_events, fetch_player_tournament_statistics,
+        collector_stats
     )
-    from app.tgs_calculator import get_match_prediction
+    from app.tgs_calculator import get_match_prediction, get_match_predictions, iter_match_predictions, get_simulation_prediction, get_markov_prediction, get_live_win_probabilities, cache_stats, memo_stats
 except ImportError:
     from collector import (
         fetch_live_events_via_page, fetch_all_event_details, fetch_player_profile,
         fetch_player_matches, fetch_rankings_via_page, fetch_scheduled_events_for_dates,
-        fetch_bulk_odds_for_date
+        fetch_player_last_events, fetch_player_tournament_statistics,
+        collector_stats
     )
-    from tgs_calculator import get_match_prediction
+    from tgs_calculator import get_match_prediction, get_match_predictions, iter_match_predictions, get_simulation_prediction, get_markov_prediction, get_live_win_probabilities, cache_stats, memo_stats
 
 if sys.platform.startswith("win"):
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
@@ -32,55 +33,153 @@ app = FastAPI(title="Tennis Live Dashboard - MVP")
 BASE_DIR = Path(__file__).resolve().parent
 templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
 
-LIVE_CACHE = {"data": {"events": []}, "ts": 0}
-ALL_CACHE = {"data": {"events": []}, "ts": 0}
-ODDS_CACHE = {"data": {}, "key": "", "ts": 0}
+LIVE_CACHE = {"data": {"events": []}, "ts": 0, "task": None}
+ALL_CACHE = {"data": {"events": []}, "ts": 0, "task": None}
 PREDICTION_CACHE = {"data": {}, "ts": {}}
 
 import os
 import json
 from datetime import datetime
-from app.pred_store import read_predictions, write_predictions
+from app.pred_store import (
+    compact_predictions, flush_predictions, pred_store_stats, prediction_body_async, predictions_body_async,
+    queue_predictions, read_predictions_async, run_pred_compaction,
+)
 from app.agent import run_agent_loop
+from app.cache import get_cache
+from app.browser_pool import get_browser_pool, start_browser_pool, close_browser_pool
+from app.transport import get_transport, close_transport
+from app.ratelimit import get_governor
+from app.odds import get_odds_for_date
+from app.player_profiles import profile_stats
+from app.event_index import event_index_stats
+from app.markov import load_markov_tables
+from app.inplay import load_inplay_tables
+from app.snapshots import event_trajectory, snapshot_stats
 
-async def _get_live_events_cached(ttl: int = 15):
-    now = asyncio.get_event_loop().time()
-    if (now - LIVE_CACHE["ts"]) < ttl and LIVE_CACHE["data"].get("events"):
-        return LIVE_CACHE["data"]
+# --- Stale-while-revalidate snapshot'lar ---
+# İstekler her zaman eldeki snapshot'ı hemen alır; tazeleme arka planda yapılır.
+# Her cache için aynı anda en fazla bir tazeleme task'ı çalışır (stampede koruması).
+LIVE_REFRESH_SEC = int(os.getenv("LIVE_REFRESH_SEC", "10"))
+ALL_REFRESH_SEC = int(os.getenv("ALL_REFRESH_SEC", "60"))
+
+
+async def _fetch_live_snapshot():
+    return await fetch_live_events_via_page(timeout_sec=25, headless=True)
+
+
+async def _fetch_all_snapshot():
+    # Sadece bugün için planlanan tüm maçları toplayalım (yerel güne göre, UTC yerine)
+    today = datetime.now().date()
+    return await fetch_scheduled_events_for_dates([today.strftime("%Y-%m-%d")])
+
+
+async def _do_refresh(cache: dict, fetcher, label: str):
     try:
-        data = await fetch_live_events_via_page(timeout_sec=25, headless=True)
+        data = await fetcher()
     except Exception as e:
-        print("fetch_live_events hata:", e)
-        return LIVE_CACHE["data"]
+        print(f"{label} hata:", e)
+        return cache["data"]
     if data and data.get("events"):
-        LIVE_CACHE["data"] = data
-        LIVE_CACHE["ts"] = now
-    return data
+        cache["data"] = data
+        cache["ts"] = asyncio.get_event_loop().time()
+    return cache["data"]
+
+
+def _refresh_snapshot(cache: dict, fetcher, label: str) -> asyncio.Task:
+    """Devam eden tazeleme varsa onu, yoksa yenisini döndürür."""
+    task = cache.get("task")
+    if task is None or task.done():
+        task = asyncio.ensure_future(_do_refresh(cache, fetcher, label))
+        cache["task"] = task
+    return task
+
+
+async def _get_snapshot(cache: dict, fetcher, label: str, ttl: int):
+    if not cache["data"].get("events"):
+        # Soğuk başlangıç: gösterilecek bir şey yok, (tek) tazelemeyi bekle
+        return await asyncio.shield(_refresh_snapshot(cache, fetcher, label))
+    if snapshot_age(cache) >= ttl:
+        _refresh_snapshot(cache, fetcher, label)
+    return cache["data"]
+
+
+def snapshot_age(cache: dict) -> float:
+    if not cache["ts"]:
+        return 0.0
+    return max(0.0, asyncio.get_event_loop().time() - cache["ts"])
+
+
+def _age_headers(cache: dict) -> dict:
+    return {"X-Cache-Age": f"{snapshot_age(cache):.1f}"}
+
+
+async def _get_live_events_cached(ttl: int = 15):
+    return await _get_snapshot(LIVE_CACHE, _fetch_live_snapshot, "fetch_live_events", ttl)
+
 
 async def _get_all_events_cached(ttl: int = 60):
-    now = asyncio.get_event_loop().time()
-    if (now - ALL_CACHE["ts"]) < ttl and ALL_CACHE["data"].get("events"):
-        return ALL_CACHE["data"]
-    try:
-        # Sadece bugün için planlanan tüm maçları toplayalım
-        from datetime import datetime
-        # Yerel güne göre filtrele (UTC yerine)
-        today = datetime.now().date()
-        dates = [today.strftime("%Y-%m-%d")]
-        data = await fetch_scheduled_events_for_dates(dates)
-    except Exception as e:
-        print("fetch_all_events hata:", e)
-        return ALL_CACHE["data"]
-    if data and data.get("events"):
-        ALL_CACHE["data"] = data
-        ALL_CACHE["ts"] = now
-    return data
+    return await _get_snapshot(ALL_CACHE, _fetch_all_snapshot, "fetch_all_events", ttl)
+
+
+async def _snapshot_refresher(cache: dict, fetcher, label: str, interval: int):
+    """Snapshot'ı istek gelmesini beklemeden belirli aralıklarla sıcak tutar."""
+    while True:
+        try:
+            await asyncio.shield(_refresh_snapshot(cache, fetcher, label))
+        except Exception as e:
+            print(f"{label} refresher hata:", e)
+        await asyncio.sleep(interval)
 
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 
+@app.on_event("startup")
+async def _startup_browser_pool():
+    if not get_transport().uses_browser:
+        # replay modunda upstream'e (ve tarayıcıya) hiç gidilmez
+        return
+    try:
+        await start_browser_pool()
+        print("Browser pool started.")
+    except Exception as e:
+        # Havuz ilk kullanımda tekrar başlatmayı dener
+        print("Browser pool start error:", e)
+
+@app.on_event("shutdown")
+async def _shutdown_browser_pool():
+    # Kuyruktaki tahminler ve bekleyen cache yazmaları kapanmadan önce diske yazılır
+    await flush_predictions()
+    await asyncio.to_thread(get_cache().flush)
+    await close_transport()
+    await close_browser_pool()
+
+@app.on_event("startup")
+async def _startup_refreshers():
+    loop = asyncio.get_event_loop()
+    loop.create_task(_snapshot_refresher(LIVE_CACHE, _fetch_live_snapshot, "fetch_live_events", LIVE_REFRESH_SEC))
+    loop.create_task(_snapshot_refresher(ALL_CACHE, _fetch_all_snapshot, "fetch_all_events", ALL_REFRESH_SEC))
+
+@app.on_event("startup")
+async def _startup_markov_tables():
+    # Markov ve canlı (in-play) olasılık tabloları diskten memory-map ile açılır (yoksa bir kez üretilir)
+    try:
+        await asyncio.to_thread(load_markov_tables)
+        await asyncio.to_thread(load_inplay_tables)
+    except Exception as e:
+        print("Markov tables load error:", e)
+
+@app.on_event("startup")
+async def _startup_pred_store():
+    # Tahmin deposunu açar (ilk açılışta JSON dosyaları içeri aktarılır) ve WAL'ı kısaltır
+    try:
+        await asyncio.to_thread(compact_predictions)
+    except Exception as e:
+        print("Prediction store open error:", e)
+    # Kapanmış günleri arşivleyen ve eski ham dosyaları silen periyodik iş
+    asyncio.get_event_loop().create_task(run_pred_compaction())
+
 @app.on_event("startup")
 async def _startup_agent():
     try:
@@ -95,7 +194,19 @@ async def api_live_matches():
     data = await _get_live_events_cached()
     if not data or not data.get("events"):
         return JSONResponse(content={"events": []}, status_code=503)
-    return JSONResponse(content=data)
+    return JSONResponse(content=data, headers=_age_headers(LIVE_CACHE))
+
+@app.get("/api/live-win-probabilities")
+async def api_live_win_probabilities():
+    """LIVE_CACHE'teki tüm canlı maçlar için anlık skordan kazanma olasılıkları (tek çağrı)."""
+    data = await _get_live_events_cached()
+    events = (data or {}).get("events") or []
+    try:
+        results = await get_live_win_probabilities(events)
+    except Exception as e:
+        print(f"api_live_win_probabilities hata: {e}")
+        return JSONResponse(content={"error": "Canlı olasılıklar hesaplanırken hata oluştu.", "detail": str(e)}, status_code=500)
+    return JSONResponse(content={"matches": {str(eid): r for eid, r in results.items()}}, headers=_age_headers(LIVE_CACHE))
 
 @app.get("/api/matches")
 async def api_matches(filter: str = "live"):
@@ -108,7 +219,7 @@ async def api_matches(filter: str = "live"):
     try:
         if filter == "live":
             data = await _get_live_events_cached()
-            return JSONResponse(content=data or {"events": []})
+            return JSONResponse(content=data or {"events": []}, headers=_age_headers(LIVE_CACHE))
 
         # Scheduled (today) üzerinden filtreleme
         scheduled = await _get_all_events_cached()
@@ -126,24 +237,16 @@ async def api_matches(filter: str = "live"):
             ]
         else:
             filtered = events
-        return JSONResponse(content={"events": filtered})
+        return JSONResponse(content={"events": filtered}, headers=_age_headers(ALL_CACHE))
     except Exception as e:
         print("api_matches hata:", e)
         return JSONResponse(content={"events": []}, status_code=500)
 
 @app.get("/api/odds/date/{date}")
 async def api_bulk_odds_by_date(date: str):
-    """Belirli bir tarih için toplu oranlar (cache'li). date: YYYY-MM-DD"""
+    """Belirli bir tarih için toplu oranlar (tarih bazlı cache'li). date: YYYY-MM-DD"""
     try:
-        now = asyncio.get_event_loop().time()
-        cache_key = date
-        if ODDS_CACHE["key"] == cache_key and (now - ODDS_CACHE["ts"]) < 120 and ODDS_CACHE["data"]:
-            return JSONResponse(content=ODDS_CACHE["data"])    
-        data = await fetch_bulk_odds_for_date(date)
-        if data:
-            ODDS_CACHE["data"] = data
-            ODDS_CACHE["key"] = cache_key
-            ODDS_CACHE["ts"] = now
+        data = await get_odds_for_date(date)
         return JSONResponse(content=data or {})
     except Exception as e:
         print("api_bulk_odds_by_date hata:", e)
@@ -210,13 +313,11 @@ async def get_player_rankings(team_id: int):
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
 @app.get("/api/player/{team_id}/active-tournament-stats")
-def get_active_tournament_stats(team_id: int):
+async def get_active_tournament_stats(team_id: int):
     try:
-        headers = {"User-Agent": "Mozilla/5.0"}
-        url_last = f"https://www.sofascore.com/api/v1/team/{team_id}/events/last/0"
-        resp_last = requests.get(url_last, headers=headers, timeout=10)
-        resp_last.raise_for_status()
-        last_data = resp_last.json()
+        last_data = await fetch_player_last_events(team_id)
+        if not last_data:
+            return JSONResponse(content={"error": "İstatistik sunucusuna ulaşılamadı."}, status_code=503)
         events = last_data.get("events", [])
         if not events:
             return JSONResponse(content={"error": "Son maç bulunamadı"}, status_code=404)
@@ -228,32 +329,43 @@ def get_active_tournament_stats(team_id: int):
         season_id = season.get("id")
         if not tournament_id or not season_id:
             return JSONResponse(content={"error": "Turnuva veya sezon bilgisi bulunamadı"}, status_code=404)
-        url_stats = (f"https://www.sofascore.com/api/v1/team/{team_id}/unique-tournament/"
-                     f"{tournament_id}/season/{season_id}/statistics/overall")
-        resp_stats = requests.get(url_stats, headers=headers, timeout=10)
-        resp_stats.raise_for_status()
-        stats_data = resp_stats.json()
+        stats_data = await fetch_player_tournament_statistics(team_id, tournament_id, season_id)
+        if not stats_data:
+            return JSONResponse(content={"error": "İstatistik sunucusuna ulaşılamadı."}, status_code=503)
         stats_data["tournamentName"] = unique_tournament.get("name", "Bilinmeyen Turnuva")
         stats_data["seasonName"] = season.get("name", "")
         stats_data["tournamentId"] = tournament_id
         stats_data["seasonId"] = season_id
         return JSONResponse(content=stats_data)
-    except requests.exceptions.RequestException as e:
-        print(f"active_tournament_stats (requests) hata: {e}")
-        return JSONResponse(content={"error": "İstatistik sunucusuna ulaşılamadı."}, status_code=503)
     except Exception as e:
         print(f"active_tournament_stats (genel) hata: {e}")
         return JSONResponse(content={"error": "Beklenmedik bir hata oluştu."}, status_code=500)
     
 @app.get("/api/match-prediction/{event_id}")
-async def api_match_prediction(event_id: int):
+async def api_match_prediction(event_id: int, engine: str = "tgs"):
+    if engine == "simulation":
+        try:
+            sim = await get_simulation_prediction(event_id)
+            return JSONResponse(content=sim, status_code=404 if "error" in sim else 200)
+        except Exception as e:
+            print(f"api_match_prediction simulation (event_id: {event_id}) hata: {e}")
+            return JSONResponse(content={"error": "Simülasyon hesaplanırken hata oluştu.", "detail": str(e)}, status_code=500)
+    if engine == "markov":
+        try:
+            exact = await get_markov_prediction(event_id)
+            return JSONResponse(content=exact, status_code=404 if "error" in exact else 200)
+        except Exception as e:
+            print(f"api_match_prediction markov (event_id: {event_id}) hata: {e}")
+            return JSONResponse(content={"error": "Markov tahmini hesaplanırken hata oluştu.", "detail": str(e)}, status_code=500)
+    if engine != "tgs":
+        return JSONResponse(content={"error": "engine 'tgs', 'simulation' ya da 'markov' olmalı."}, status_code=400)
     try:
-        # First try to read from today's precomputed file
+        # First try today's precomputed prediction (in-memory view, pre-encoded body)
         today = datetime.now().strftime("%Y-%m-%d")
-        all_preds = read_predictions(today)
         key = str(event_id)
-        if key in all_preds:
-            return JSONResponse(content=all_preds[key])
+        stored = await prediction_body_async(today, key)
+        if stored is not None:
+            return Response(content=stored, media_type="application/json")
 
         # Fallback: compute on-demand (slower) and persist into file
         prediction_data = await get_match_prediction(event_id)
@@ -261,9 +373,8 @@ async def api_match_prediction(event_id: int):
         if "error" in prediction_data:
             return JSONResponse(content=prediction_data, status_code=404)
 
-        # Write back to today's file atomically
-        all_preds[key] = prediction_data
-        write_predictions(today, all_preds)
+        # Queue for today's store (write-behind; unchanged fingerprints are not rewritten)
+        queue_predictions(today, {key: prediction_data})
         return JSONResponse(content=prediction_data)
 
     except Exception as e:
@@ -274,15 +385,120 @@ async def api_match_prediction(event_id: int):
         )
 
 
+@app.get("/api/match-prediction/{event_id}/trajectory")
+async def api_match_prediction_trajectory(event_id: int, date: str = None):
+    """Agent'ın maç öncesi offset'lerde aldığı tahmin görüntüleri (olasılık ve metrik skorları), zaman sırasıyla."""
+    date = date or datetime.now().strftime("%Y-%m-%d")
+    try:
+        datetime.strptime(date, "%Y-%m-%d")
+    except ValueError:
+        return JSONResponse(content={"error": "date YYYY-MM-DD biçiminde olmalı."}, status_code=400)
+    try:
+        points = await asyncio.to_thread(event_trajectory, event_id, date)
+    except Exception as e:
+        print(f"api_match_prediction_trajectory (event_id: {event_id}) hata: {e}")
+        return JSONResponse(content={"error": "Tahmin yörüngesi okunamadı.", "detail": str(e)}, status_code=500)
+    return JSONResponse(content={"event_id": event_id, "date": date, "points": points})
+
+
+# Tek istekte kabul edilen en fazla maç sayısı
+MAX_BATCH_PREDICTIONS = int(os.getenv("MAX_BATCH_PREDICTIONS", "200"))
+
+
+@app.post("/api/match-predictions")
+async def api_match_predictions(request: Request, stream: bool = False):
+    """
+    Body: {"event_ids": [..]} (ya da düz liste). Depoda olanlar tek okumayla döner,
+    eksikler birlikte hesaplanıp depoya yazılır. stream=true ile sonuçlar hazır oldukça NDJSON satırı olarak gelir.
+    """
+    try:
+        body = await request.json()
+    except Exception:
+        return JSONResponse(content={"error": "Geçersiz JSON gövdesi."}, status_code=400)
+    raw_ids = body.get("event_ids") if isinstance(body, dict) else body
+    try:
+        # Sadece liste: string ya da sözlük de yinelenebilir ama karakterleri/anahtarları id değildir
+        if not isinstance(raw_ids, list):
+            raise TypeError("event_ids liste değil")
+        event_ids = list(dict.fromkeys(int(eid) for eid in raw_ids))
+    except (TypeError, ValueError):
+        return JSONResponse(content={"error": "event_ids bir tamsayı listesi olmalı."}, status_code=400)
+    if len(event_ids) > MAX_BATCH_PREDICTIONS:
+        return JSONResponse(content={"error": f"En fazla {MAX_BATCH_PREDICTIONS} maç istenebilir."}, status_code=400)
+
+    today = datetime.now().strftime("%Y-%m-%d")
+    try:
+        all_preds = await read_predictions_async(today, event_ids)
+    except Exception as e:
+        print(f"api_match_predictions depo okuma hatası: {e}")
+        return JSONResponse(
+            content={"error": "Kayıtlı tahminler okunamadı.", "detail": str(e)},
+            status_code=500
+        )
+    stored = {eid: all_preds[str(eid)] for eid in event_ids if str(eid) in all_preds}
+    missing = [eid for eid in event_ids if eid not in stored]
+
+    if stream:
+        async def ndjson():
+            for eid, pred in stored.items():
+                yield json.dumps({"event_id": eid, "source": "store", "prediction": pred}, ensure_ascii=False) + "\n"
+            computed = {}
+            try:
+                async for eid, pred in iter_match_predictions(missing):
+                    if "error" in pred:
+                        yield json.dumps({"event_id": eid, **pred}, ensure_ascii=False) + "\n"
+                        continue
+                    computed[str(eid)] = pred
+                    yield json.dumps({"event_id": eid, "source": "computed", "prediction": pred}, ensure_ascii=False) + "\n"
+            finally:
+                queue_predictions(today, computed)
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    try:
+        results = await get_match_predictions(missing) if missing else {}
+    except Exception as e:
+        print(f"api_match_predictions genel hata: {e}")
+        return JSONResponse(
+            content={"error": "Tahminler hesaplanırken beklenmedik bir sunucu hatası oluştu.", "detail": str(e)},
+            status_code=500
+        )
+    computed = {str(eid): pred for eid, pred in results.items() if "error" not in pred}
+    queue_predictions(today, computed)
+    return JSONResponse(content={
+        "date": today,
+        "predictions": {str(eid): stored[eid] if eid in stored else computed[str(eid)] for eid in event_ids if eid in stored or str(eid) in computed},
+        "errors": {str(eid): pred for eid, pred in results.items() if "error" in pred},
+        "from_store": len(stored),
+        "computed": len(computed),
+    })
+
+
 @app.get("/api/predictions/today")
 async def api_predictions_today():
     try:
         today = datetime.now().strftime("%Y-%m-%d")
-        data = read_predictions(today)
-        return JSONResponse(content=data or {})
+        # Gövde bellekteki görünümden gelir; tahminler değişmedikçe yeniden kodlanmaz
+        return Response(content=await predictions_body_async(today), media_type="application/json")
     except Exception as e:
         print("api_predictions_today error:", e)
         return JSONResponse(content={}, status_code=500)
 
 
+@app.get("/api/collector/stats")
+async def api_collector_stats():
+    return JSONResponse(content={
+        "browser_pool": get_browser_pool().stats(),
+        "transport": get_transport().stats(),
+        "governor": get_governor().stats(),
+        "cache": cache_stats(),
+        "player_profiles": profile_stats(),
+        "event_index": event_index_stats(),
+        "prediction_memo": memo_stats(),
+        "prediction_store": pred_store_stats(),
+        "prediction_snapshots": snapshot_stats(),
+        **collector_stats(),
+    })
+
+
 # Moved to app/pred_store.py
\ No newline at end of file
@@ -0,0 +1,215 @@
+# app/markov.py
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("markov")
+logger.setLevel(logging.INFO)
+
+# Servis sayısı olasılıklarından kesin (Markov zinciri) oyun, tiebreak, set ve maç olasılıkları.
+# Tüm fonksiyonlar NumPy dizileriyle de çalışır; böylece aynı DP hem tek maç için hem de
+# olasılık ızgarasının tamamı için (tablo üretimi) tek seferde hesaplanır.
+
+BASE_DIR = Path(__file__).resolve().parent
+DEFAULT_TABLE_DIR = BASE_DIR.parent / "data" / "tables"
+
+# Izgara: servis sayısı olasılığı GRID_MIN..GRID_MAX, GRID_STEP adımla
+GRID_MIN = 0.30
+GRID_MAX = 0.90
+GRID_STEP = 0.0025
+GRID = np.round(np.arange(GRID_MIN, GRID_MAX + GRID_STEP / 2, GRID_STEP), 6)
+
+# (best_of, son set tiebreak hedefi)
+FORMATS = ((3, 7), (5, 10))
+
+
+def hold_prob(p):
+    """Servis sayısı olasılığı p olan oyuncunun servis oyununu kazanma olasılığı."""
+    q = 1.0 - p
+    deuce = p * p / (1.0 - 2.0 * p * q)
+    return p ** 4 * (1.0 + 4.0 * q + 10.0 * q * q) + 20.0 * p ** 3 * q ** 3 * deuce
+
+
+def tiebreak_prob(p_first, p_second, target: int = 7):
+    """
+    İlk servisi atan oyuncunun tiebreak kazanma olasılığı. p_first/p_second: ilk ve ikinci servisçinin
+    kendi servisinde sayı kazanma olasılığı. Servis sırası A, BB, AA, ...; `target` sayıya 2 farkla.
+    """
+    dp = {(0, 0): 1.0}
+    win = 0.0
+    tie = 0.0
+    for n in range(2 * (target - 1) + 1):
+        nxt: Dict[tuple, Any] = {}
+        first_serves = ((n + 1) // 2) % 2 == 0
+        p_a = p_first if first_serves else 1.0 - p_second
+        for (a, b), prob in dp.items():
+            if a == target - 1 and b == target - 1:
+                tie = tie + prob
+                continue
+            for da, pr in ((1, p_a), (0, 1.0 - p_a)):
+                na, nb = a + da, b + (1 - da)
+                if na == target and nb <= target - 2:
+                    win = win + prob * pr
+                elif nb == target and na <= target - 2:
+                    continue
+                else:
+                    nxt[(na, nb)] = nxt.get((na, nb), 0.0) + prob * pr
+        dp = nxt
+        if not dp:
+            break
+    # Eşitlikten sonra her iki sayıda bir kez A, bir kez B servis atar
+    a_both = p_first * (1.0 - p_second)
+    b_both = (1.0 - p_first) * p_second
+    with np.errstate(divide="ignore", invalid="ignore"):
+        from_tie = np.where(a_both + b_both > 0, a_both / (a_both + b_both), 0.5)
+    result = win + tie * from_tie
+    return float(result) if np.ndim(result) == 0 else result
+
+
+def set_score_probs(hold_first, hold_second, tb_first) -> Dict[Tuple[int, int], Any]:
+    """
+    Seti ilk servisle açan oyuncunun bakışından son set skorlarının olasılıkları {(ilk, ikinci): p}.
+    hold_*: oyuncuların servis oyunu kazanma olasılığı, tb_first: 6-6'da tiebreak'i ilk servisçinin alma olasılığı.
+    """
+    dp = {(0, 0): 1.0}
+    final: Dict[Tuple[int, int], Any] = {}
+    for k in range(12):
+        p_first_wins = hold_first if k % 2 == 0 else 1.0 - hold_second
+        nxt: Dict[Tuple[int, int], Any] = {}
+        for (i, j), prob in dp.items():
+            for di, pr in ((1, p_first_wins), (0, 1.0 - p_first_wins)):
+                ni, nj = i + di, j + (1 - di)
+                if max(ni, nj) >= 6 and abs(ni - nj) >= 2:
+                    final[(ni, nj)] = final.get((ni, nj), 0.0) + prob * pr
+                else:
+                    nxt[(ni, nj)] = nxt.get((ni, nj), 0.0) + prob * pr
+        dp = nxt
+    tie = dp.get((6, 6), 0.0)
+    final[(7, 6)] = tie * tb_first
+    final[(6, 7)] = tie * (1.0 - tb_first)
+    return final
+
+
+def match_distribution(p_home, p_away, best_of: int = 3, final_set_tiebreak: int = 7, with_games: bool = False) -> Dict[str, Any]:
+    """
+    Kesin maç olasılıkları: ev sahibinin maçı kazanma olasılığı, set skoru dağılımı ve (with_games ile)
+    toplam oyun dağılımı. İlk servis bilinmediği için iki durumun ortalaması alınır.
+    """
+    hold_h, hold_a = hold_prob(p_home), hold_prob(p_away)
+    set_probs = {}
+    for target in {7, final_set_tiebreak}:
+        tb_home_first = tiebreak_prob(p_home, p_away, target)
+        tb_away_first = tiebreak_prob(p_away, p_home, target)
+        home_first = set_score_probs(hold_h, hold_a, tb_home_first)
+        away_first = {(h, a): p for (a, h), p in set_score_probs(hold_a, hold_h, tb_away_first).items()}
+        set_probs[target] = {True: home_first, False: away_first}
+
+    sets_to_win = best_of // 2 + 1
+    # durum: (ev set, deplasman set, setin ilk servisçisi ev sahibi mi, toplam oyun) -> olasılık
+    states: Dict[tuple, Any] = {(0, 0, True, 0): 0.5, (0, 0, False, 0): 0.5}
+    win = 0.0
+    set_scores: Dict[str, Any] = {}
+    total_games: Dict[int, Any] = {}
+    while states:
+        nxt: Dict[tuple, Any] = {}
+        for (sh, sa, home_first, games), prob in states.items():
+            target = final_set_tiebreak if sh + sa == best_of - 1 else 7
+            for (h, a), p_set in set_probs[target][home_first].items():
+                nsh, nsa = (sh + 1, sa) if h > a else (sh, sa + 1)
+                ngames = games + h + a if with_games else 0
+                reach = prob * p_set
+                if nsh == sets_to_win or nsa == sets_to_win:
+                    key = f"{nsh}-{nsa}"
+                    set_scores[key] = set_scores.get(key, 0.0) + reach
+                    if nsh == sets_to_win:
+                        win = win + reach
+                    if with_games:
+                        total_games[ngames] = total_games.get(ngames, 0.0) + reach
+                    continue
+                state = (nsh, nsa, home_first ^ ((h + a) % 2 == 1), ngames)
+                nxt[state] = nxt.get(state, 0.0) + reach
+        states = nxt
+
+    result = {"home_win_prob": win, "set_scores": set_scores, "hold_probs": {"home": hold_h, "away": hold_a}}
+    if with_games:
+        result["total_games"] = dict(sorted(total_games.items()))
+        result["expected_total_games"] = sum(g * p for g, p in total_games.items())
+    return result
+
+
+def match_win_prob(p_home: float, p_away: float, best_of: int = 3, final_set_tiebreak: int = 7) -> float:
+    """Izgara dışı, doğrudan DP ile kesin maç kazanma olasılığı."""
+    return float(match_distribution(p_home, p_away, best_of, final_set_tiebreak)["home_win_prob"])
+
+
+# --- Izgara tabloları (diskte .npy, açılışta memory-map) ---
+_TABLES: Dict[str, np.ndarray] = {}
+_TABLE_LOCK = threading.Lock()
+
+
+def table_dir() -> Path:
+    return Path(os.getenv("MARKOV_TABLE_DIR", str(DEFAULT_TABLE_DIR)))
+
+
+def load_or_build_table(name: str, shape: Tuple[int, ...], builder: Callable[[], np.ndarray]) -> np.ndarray:
+    """`name`.npy tablosunu memory-map ile açar; yoksa (ya da boyutu uymuyorsa) builder ile üretip atomik olarak yazar."""
+    table = _TABLES.get(name)
+    if table is not None:
+        return table
+    with _TABLE_LOCK:
+        table = _TABLES.get(name)
+        if table is not None:
+            return table
+        path = table_dir() / f"{name}.npy"
+        try:
+            table = np.load(path, mmap_mode="r")
+            if table.shape != shape:
+                raise ValueError(f"beklenmeyen tablo boyutu {table.shape}")
+        except (OSError, ValueError) as e:
+            if path.exists():
+                logger.warning("Tablo okunamadı (%s), yeniden üretiliyor: %s", path, e)
+            table = builder()
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_suffix(".tmp.npy")
+                np.save(tmp, table)
+                tmp.replace(path)
+                table = np.load(path, mmap_mode="r")
+            except OSError as e:
+                logger.warning("Tablo diske yazılamadı (%s): %s", path, e)
+        _TABLES[name] = table
+        return table
+
+
+def build_table(best_of: int, final_set_tiebreak: int) -> np.ndarray:
+    """table[i, j] = P(ev sahibi kazanır | p_home = GRID[i], p_away = GRID[j]); tüm ızgara tek DP geçişinde."""
+    p_home = np.broadcast_to(GRID[:, None], (GRID.size, GRID.size))
+    p_away = np.broadcast_to(GRID[None, :], (GRID.size, GRID.size))
+    return np.ascontiguousarray(match_distribution(p_home, p_away, best_of, final_set_tiebreak)["home_win_prob"])
+
+
+def load_table(best_of: int, final_set_tiebreak: int) -> np.ndarray:
+    name = f"markov_bo{best_of}_tb{final_set_tiebreak}_{GRID_MIN:.3f}_{GRID_MAX:.3f}_{GRID_STEP:.4f}"
+    return load_or_build_table(name, (GRID.size, GRID.size), lambda: build_table(best_of, final_set_tiebreak))
+
+
+def load_markov_tables():
+    """Bilinen formatların tablolarını önceden açar (uygulama açılışında thread'de çağrılır)."""
+    for best_of, final_set_tiebreak in FORMATS:
+        load_table(best_of, final_set_tiebreak)
+
+
+def lookup_match_win_prob(p_home: float, p_away: float, best_of: int = 3, final_set_tiebreak: int = 7) -> float:
+    """Tablodan iki doğrusal (bilinear) ara değerle maç kazanma olasılığı; ızgara dışı değerler kenara kırpılır."""
+    table = load_table(best_of, final_set_tiebreak)
+    x = (min(max(p_home, GRID_MIN), GRID_MAX) - GRID_MIN) / GRID_STEP
+    y = (min(max(p_away, GRID_MIN), GRID_MAX) - GRID_MIN) / GRID_STEP
+    i, j = min(int(x), GRID.size - 2), min(int(y), GRID.size - 2)
+    fx, fy = x - i, y - j
+    top = table[i, j] * (1 - fy) + table[i, j + 1] * fy
+    bottom = table[i + 1, j] * (1 - fy) + table[i + 1, j + 1] * fy
+    return float(top * (1 - fx) + bottom * fx)
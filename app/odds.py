@@ -0,0 +1,70 @@
+# app/odds.py
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from app.cache import get_cache
+from app.collector import fetch_bulk_odds_for_date
+from app.event_index import lookup_event
+
+# Tarih bazlı toplu oran cache'i. Geçmiş günlerin oranları değişmez, uzun süre tutulur;
+# bugünün oranları sık tazelenir. Her tarih için event id -> market indeksi tutulur.
+PAST_ODDS_TTL = 30 * 24 * 3600
+TODAY_ODDS_TTL = 120
+FUTURE_ODDS_TTL = 600
+EMPTY_ODDS_TTL = 60
+
+_CACHE = get_cache().namespace("odds", ttl=TODAY_ODDS_TTL, max_entries=60)
+
+# date -> (payload, {event_id: market}); payload cache'ten farklı bir nesne dönerse indeks yeniden kurulur
+_INDEX: Dict[str, tuple] = {}
+
+
+def odds_ttl_for(date_str: str) -> int:
+    today = datetime.now().strftime("%Y-%m-%d")
+    if date_str < today:
+        return PAST_ODDS_TTL
+    if date_str == today:
+        return TODAY_ODDS_TTL
+    return FUTURE_ODDS_TTL
+
+
+def _index_for(date_str: str, payload: Dict[str, Any]) -> Dict[int, Dict[str, Any]]:
+    entry = _INDEX.get(date_str)
+    if entry is not None and entry[0] is payload:
+        return entry[1]
+    by_id = {m["id"]: m for m in payload.get("odds", []) if isinstance(m, dict) and m.get("id") is not None}
+    _INDEX[date_str] = (payload, by_id)
+    # Sadece cache'te yaşayan tarihlerin indeksini tut
+    if len(_INDEX) > 60:
+        _INDEX.pop(next(iter(_INDEX)))
+    return by_id
+
+
+async def get_odds_for_date(date_str: str) -> Dict[str, Any]:
+    """{"odds": [...]} formatında toplu oranlar (tarih bazlı TTL ile cache'li)."""
+    cached = await _CACHE.get_async("odds", date_str)
+    if cached is not None:
+        return cached
+    data = await fetch_bulk_odds_for_date(date_str)
+    if data:
+        ttl = odds_ttl_for(date_str) if data.get("odds") else EMPTY_ODDS_TTL
+        _CACHE.put("odds", date_str, data, ttl=ttl)
+    return data
+
+
+def event_date(event_id: int, start_timestamp: Optional[int] = None) -> str:
+    """Maçın kendi başlangıç günü (startTimestamp, yoksa indeks); ikisi de yoksa bugün."""
+    if not start_timestamp:
+        start_timestamp = (lookup_event(event_id) or {}).get("start_timestamp")
+    if start_timestamp:
+        return datetime.fromtimestamp(start_timestamp).strftime("%Y-%m-%d")
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+async def get_event_odds(event_id: int, date_str: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Tek bir maçın toplu oran marketi; tarih verilmezse maçın başlangıç günü. İlk yüklemeden sonra O(1)."""
+    date_str = date_str or event_date(event_id)
+    payload = await get_odds_for_date(date_str)
+    if not payload:
+        return None
+    return _index_for(date_str, payload).get(event_id)
@@ -0,0 +1,165 @@
+# app/player_profiles.py
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.cache import get_cache, NO_EXPIRY
+
+# Oyuncu + zemin başına maç geçmişinden çıkarılan özet (form, son 10 maç, zemin formu,
+# rakip kalitesi, tiebreak, rakip bazında h2h). Profil en son işlenen maçın id'siyle
+# etiketlenir; yeni biten maç geldiğinde geçmiş yeniden taranmadan sadece yeni maçlar eklenir.
+RECENT_MATCHES = 10
+
+_CACHE = get_cache().namespace("player_profiles", ttl=NO_EXPIRY, max_entries=5000)
+
+_STAT_KEYS = ("total", "wins", "quality_score", "quality_wins", "surface_total", "surface_wins", "tb_played", "tb_wins")
+
+_COUNTERS = {"hits": 0, "incremental": 0, "rebuilds": 0, "matches_applied": 0}
+
+
+def _summarize(event: Dict[str, Any], player_id: int, surface: Optional[str]) -> Tuple:
+    """Tek maçın profile katkısı: (kazandı mı, rakip kalitesi, zeminde mi, tb oynanan, tb kazanılan, h2h)."""
+    winner_code = event.get('winnerCode')
+    is_home = (event.get('homeTeam', {}).get('id') == player_id)
+    is_away = (event.get('awayTeam', {}).get('id') == player_id)
+    is_winner = (is_home and winner_code == 1) or (is_away and winner_code == 2)
+    quality = None
+    if is_winner:
+        opponent = event.get('awayTeam') if is_home else event.get('homeTeam')
+        opponent_rank = opponent.get('ranking', 1000)
+        if opponent_rank and opponent_rank > 0:
+            quality = 1000 / opponent_rank
+    on_surface = event.get('groundType') == surface
+    tb_played = tb_wins = 0
+    for i in range(1, 6):
+        tb_key = f'period{i}TieBreak'
+        if tb_key in event.get('homeScore', {}) and tb_key in event.get('awayScore', {}):
+            tb_played += 1
+            home_tb, away_tb = event['homeScore'][tb_key], event['awayScore'][tb_key]
+            if (is_home and home_tb > away_tb) or (is_away and away_tb > home_tb):
+                tb_wins += 1
+
+    # h2h: oyuncu kimliği string olarak karşılaştırılır, sadece bu zemindeki maçlar sayılır
+    h2h = None
+    if on_surface:
+        if str(event.get('homeTeam', {}).get('id')) == str(player_id):
+            h2h = (str(event.get('awayTeam', {}).get('id')), winner_code == 1)
+        elif str(event.get('awayTeam', {}).get('id')) == str(player_id):
+            h2h = (str(event.get('homeTeam', {}).get('id')), winner_code == 2)
+    return is_winner, quality, on_surface, tb_played, tb_wins, h2h
+
+
+def _empty_profile(player_id: int, surface: Optional[str]) -> Dict[str, Any]:
+    return {
+        "player_id": player_id,
+        "surface": surface,
+        "latest_event_id": None,
+        "matches": 0,
+        "stats": {key: 0 for key in _STAT_KEYS},
+        "recent": [],  # son maçların kazanma bayrakları, en yeni başta
+        "h2h": {},  # rakip id -> [galibiyet, mağlubiyet]
+    }
+
+
+def _apply(profile: Dict[str, Any], event: Dict[str, Any], newest: bool):
+    """Maçı profile ekler. newest=True: bilinen tüm maçlardan yeni; False: hepsinden eski (ilk kurulum)."""
+    is_winner, quality, on_surface, tb_played, tb_wins, h2h = _summarize(event, profile["player_id"], profile["surface"])
+    stats = profile["stats"]
+    stats['total'] += 1
+    if is_winner:
+        stats['wins'] += 1
+        if quality is not None:
+            stats['quality_score'] += quality
+            stats['quality_wins'] += 1
+    if on_surface:
+        stats['surface_total'] += 1
+        if is_winner: stats['surface_wins'] += 1
+    stats['tb_played'] += tb_played
+    stats['tb_wins'] += tb_wins
+    if h2h is not None:
+        record = profile["h2h"].setdefault(h2h[0], [0, 0])
+        record[0 if h2h[1] else 1] += 1
+
+    recent = profile["recent"]
+    if newest:
+        recent.insert(0, 1 if is_winner else 0)
+        del recent[RECENT_MATCHES:]
+    elif len(recent) < RECENT_MATCHES:
+        recent.append(1 if is_winner else 0)
+    profile["matches"] += 1
+    if newest or profile["latest_event_id"] is None:
+        profile["latest_event_id"] = event.get("id")
+
+
+def build_profile(matches: List[Dict[str, Any]], player_id: int, surface: Optional[str]) -> Dict[str, Any]:
+    """Profili en yeni maçtan başlayarak (yeni -> eski sıralı liste) sıfırdan kurar."""
+    profile = _empty_profile(player_id, surface)
+    for event in matches:
+        _apply(profile, event, newest=False)
+    return profile
+
+
+def _profile_key(player_id: int, surface: Optional[str]) -> Tuple[int, str]:
+    return player_id, surface or ""
+
+
+async def preload_profiles(surface: Optional[str], player_ids: List[int]):
+    """Profilleri (gerekirse diskten, thread'de) belleğe alır; ardından get_player_profile loop'u bloklamaz."""
+    for player_id in player_ids:
+        await _CACHE.get_async("player_profiles", _profile_key(player_id, surface))
+
+
+def _copy_profile(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Cache'teki profile dokunmadan güncellemek için kopya (stats, recent ve h2h dahil)."""
+    return {
+        **profile,
+        "stats": dict(profile["stats"]),
+        "recent": list(profile["recent"]),
+        "h2h": {opponent: list(record) for opponent, record in profile["h2h"].items()},
+    }
+
+
+def get_player_profile(player_id: int, surface: Optional[str], matches: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Oyuncunun bu zemin için güncel profili. `matches` yeni -> eski sıralı biten maçlardır.
+    Profil son maçla güncelse O(1); son işlenen maç listede bulunursa sadece ondan yeni
+    maçlar eklenir (pencereden düşen eski maçlar profilde kalır); bulunamazsa profil yeniden kurulur.
+    """
+    key = _profile_key(player_id, surface)
+    latest_id = matches[0].get("id") if matches else None
+    profile = _CACHE.get("player_profiles", key)
+    if profile is not None and latest_id is not None and profile["latest_event_id"] == latest_id:
+        _COUNTERS["hits"] += 1
+        return profile
+
+    new_count = None
+    if profile is not None and profile["latest_event_id"] is not None:
+        for index, event in enumerate(matches):
+            if event.get("id") == profile["latest_event_id"]:
+                new_count = index
+                break
+    if new_count is not None:
+        profile = _copy_profile(profile)
+        for event in reversed(matches[:new_count]):
+            _apply(profile, event, newest=True)
+        _COUNTERS["incremental"] += 1
+        _COUNTERS["matches_applied"] += new_count
+    else:
+        profile = build_profile(matches, player_id, surface)
+        _COUNTERS["rebuilds"] += 1
+        _COUNTERS["matches_applied"] += len(matches)
+    _CACHE.put("player_profiles", key, profile)
+    return profile
+
+
+def recent_form(profile: Dict[str, Any]) -> Tuple[int, int]:
+    """Son RECENT_MATCHES maçtaki (galibiyet, maç) sayısı."""
+    return sum(profile["recent"]), len(profile["recent"])
+
+
+def h2h_record(profile: Dict[str, Any], opponent_id: Any) -> Tuple[int, int]:
+    """Bu zeminde rakibe karşı (galibiyet, mağlubiyet)."""
+    wins, losses = profile["h2h"].get(str(opponent_id), (0, 0))
+    return wins, losses
+
+
+def profile_stats() -> Dict[str, int]:
+    return dict(_COUNTERS)
@@ -0,0 +1,207 @@
+import os
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("pred_archive")
+logger.setLevel(logging.INFO)
+
+BASE_DIR = Path(__file__).resolve().parent
+DEFAULT_ARCHIVE_DIR = BASE_DIR.parent / "data" / "predictions" / "archive"
+
+# Kapanmış günler gün başına tek .pack dosyasına yazılır: başta (sıkıştırılmış) ortak bir zlib sözlüğü, ardından
+# her tahmin o sözlükle ayrı ayrı sıkıştırılmış blok olarak. Manifest (SQLite) her (tarih, maç) için
+# bloğun konumunu tutar; tek maç okuması dosya taramadan tek seek + tek decompress'tir.
+_ZDICT_MAX = 32 * 1024
+_ZDICT_SAMPLES = 8
+_ZDICT_CACHE = 16
+
+
+def archive_dir() -> Path:
+    return Path(os.getenv("PRED_ARCHIVE_DIR", str(DEFAULT_ARCHIVE_DIR)))
+
+
+def _zdict(encoded: List[bytes]) -> bytes:
+    # Aynı günün tahminleri aynı anahtarları ve benzer değerleri taşır; ilk birkaç kayıt iyi bir sözlük olur.
+    # zlib sözlüğün sonundaki baytları tercih ettiğinden sözlük pencereye (32 KB) sığacak şekilde sondan kesilir.
+    return b"".join(encoded[:_ZDICT_SAMPLES])[-_ZDICT_MAX:]
+
+
+def _compress(raw: bytes, zdict: bytes) -> bytes:
+    c = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=zdict) if zdict else zlib.compressobj(9, zlib.DEFLATED, -15)
+    return c.compress(raw) + c.flush()
+
+
+def _decompress(blob: bytes, zdict: bytes) -> bytes:
+    d = zlib.decompressobj(-15, zdict=zdict) if zdict else zlib.decompressobj(-15)
+    return d.decompress(blob) + d.flush()
+
+
+class PredictionArchive:
+    """Kapanmış günlerin sıkıştırılmış, okuma için düzenlenmiş arşivi ve manifest indeksi."""
+
+    def __init__(self, root: Optional[Path] = None):
+        self.root = Path(root) if root is not None else archive_dir()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+        # Tarih -> (dosya adı, sıkıştırılmış sözlük boyu, arşivlenme zamanı); her okumada manifest sorgusu yapılmaz.
+        # Arşivi sadece bu süreç (sıkıştırma işi) yazar.
+        self._days: Dict[str, Tuple[str, int, float]] = {}
+        self._zdicts: "OrderedDict[Tuple[str, float], bytes]" = OrderedDict()
+        self.counters = {"event_reads": 0, "day_reads": 0, "archived_days": 0, "dropped_days": 0}
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.root.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.root / "manifest.sqlite3"), isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS days ("
+                " date TEXT PRIMARY KEY, file TEXT NOT NULL, dict_len INTEGER NOT NULL, count INTEGER NOT NULL,"
+                " raw_bytes INTEGER NOT NULL, packed_bytes INTEGER NOT NULL, archived_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                " date TEXT NOT NULL, event_id TEXT NOT NULL, offset INTEGER NOT NULL, length INTEGER NOT NULL,"
+                " PRIMARY KEY (date, event_id))"
+            )
+            self._days = {
+                date: (name, dict_len, archived_at)
+                for date, name, dict_len, archived_at in conn.execute("SELECT date, file, dict_len, archived_at FROM days")
+            }
+            self._conn = conn
+        return self._conn
+
+    def days(self) -> List[str]:
+        with self._lock:
+            self._db()
+            return sorted(self._days)
+
+    def day_token(self, date_str: str) -> Optional[float]:
+        """Günün arşivlenme zamanı (arşivde yoksa None); gün yeniden arşivlenince değişir."""
+        with self._lock:
+            self._db()
+            day = self._days.get(date_str)
+        return day[2] if day else None
+
+    def archive_day(self, date_str: str, preds: Dict[str, dict]) -> int:
+        """Günün tahminlerini (varsa eski arşivin yerine) yazar; paket boyutunu döndürür."""
+        keys = [str(key) for key in preds]
+        encoded = [json.dumps(pred, ensure_ascii=False, separators=(",", ":")).encode("utf-8") for pred in preds.values()]
+        zdict = _zdict(encoded)
+        blobs = [_compress(raw, zdict) for raw in encoded]
+        name = f"{date_str}.pack"
+        path = self.root / name
+        with self._lock:
+            db = self._db()
+            tmp = path.with_suffix(".pack.tmp")
+            header = zlib.compress(zdict, 9)
+            with tmp.open("wb") as f:
+                f.write(header)
+                for blob in blobs:
+                    f.write(blob)
+                f.flush()
+                os.fsync(f.fileno())
+            rows, offset = [], len(header)
+            for key, blob in zip(keys, blobs):
+                rows.append((date_str, key, offset, len(blob)))
+                offset += len(blob)
+            # Paket yerine konduktan sonra manifest tek işlemde güncellenir; arada okuyan yeni paketi eski
+            # konumlarla okumasın diye ikisi de manifest kilidi altında
+            tmp.replace(path)
+            archived_at = time.time()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute("DELETE FROM events WHERE date = ?", (date_str,))
+                db.executemany("INSERT INTO events (date, event_id, offset, length) VALUES (?, ?, ?, ?)", rows)
+                db.execute(
+                    "INSERT OR REPLACE INTO days (date, file, dict_len, count, raw_bytes, packed_bytes, archived_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (date_str, name, len(header), len(rows), sum(map(len, encoded)), offset, archived_at),
+                )
+                db.execute("COMMIT")
+            except sqlite3.Error:
+                db.execute("ROLLBACK")
+                raise
+            self._days[date_str] = (name, len(header), archived_at)
+            self.counters["archived_days"] += 1
+        return offset
+
+    def _read_blocks(self, date_str: str, locations: List[Tuple[str, int, int]]) -> Dict[str, dict]:
+        name, dict_len, archived_at = self._days[date_str]
+        result: Dict[str, dict] = {}
+        with (self.root / name).open("rb") as f:
+            zdict = self._zdicts.get((date_str, archived_at))
+            if zdict is None:
+                zdict = self._zdicts[(date_str, archived_at)] = zlib.decompress(f.read(dict_len))
+                while len(self._zdicts) > _ZDICT_CACHE:
+                    self._zdicts.popitem(last=False)
+            else:
+                self._zdicts.move_to_end((date_str, archived_at))
+            for key, offset, length in locations:
+                f.seek(offset)
+                result[key] = json.loads(_decompress(f.read(length), zdict))
+        return result
+
+    def read_day(self, date_str: str) -> Dict[str, dict]:
+        with self._lock:
+            db = self._db()
+            if date_str not in self._days:
+                return {}
+            locations = db.execute(
+                "SELECT event_id, offset, length FROM events WHERE date = ? ORDER BY offset", (date_str,)
+            ).fetchall()
+            self.counters["day_reads"] += 1
+            return self._read_blocks(date_str, locations)
+
+    def read_many(self, date_str: str, event_ids: Iterable[str]) -> Dict[str, dict]:
+        keys = list(dict.fromkeys(str(key) for key in event_ids))
+        with self._lock:
+            db = self._db()
+            if date_str not in self._days or not keys:
+                return {}
+            locations = []
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                locations += db.execute(
+                    f"SELECT event_id, offset, length FROM events WHERE date = ? AND event_id IN ({','.join('?' * len(chunk))})",
+                    (date_str, *chunk),
+                ).fetchall()
+            self.counters["event_reads"] += len(locations)
+            found = self._read_blocks(date_str, sorted(locations, key=lambda row: row[1])) if locations else {}
+        return {key: found[key] for key in keys if key in found}
+
+    def drop_day(self, date_str: str):
+        with self._lock:
+            db = self._db()
+            day = self._days.pop(date_str, None)
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("DELETE FROM events WHERE date = ?", (date_str,))
+            db.execute("DELETE FROM days WHERE date = ?", (date_str,))
+            db.execute("COMMIT")
+            if day:
+                (self.root / day[0]).unlink(missing_ok=True)
+                self.counters["dropped_days"] += 1
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            days, events, raw, packed = self._db().execute(
+                "SELECT COUNT(*), COALESCE(SUM(count), 0), COALESCE(SUM(raw_bytes), 0), COALESCE(SUM(packed_bytes), 0) FROM days"
+            ).fetchone()
+        return {"path": str(self.root), "days": days, "events": events, "raw_bytes": raw, "packed_bytes": packed, **self.counters}
+
+
+_ARCHIVE: Optional[PredictionArchive] = None
+
+
+def get_pred_archive() -> PredictionArchive:
+    global _ARCHIVE
+    if _ARCHIVE is None:
+        _ARCHIVE = PredictionArchive()
+    return _ARCHIVE
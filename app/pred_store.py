@@ -1,11 +1,29 @@
 import os
 import json
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
 from pathlib import Path
+from collections import OrderedDict
 from contextlib import contextmanager
-from typing import Dict
+from typing import Dict, Iterable, List, Optional, Tuple
 
+from app.pred_archive import get_pred_archive
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger("pred_store")
+logger.setLevel(logging.INFO)
 
 BASE_DIR = Path(__file__).resolve().parent
+DEFAULT_PRED_DB_PATH = BASE_DIR.parent / "data" / "predictions" / "predictions.sqlite3"
 
 
 def pred_dir_for(date_str: str) -> Path:
@@ -18,6 +36,18 @@ def pred_file_for(date_str: str) -> Path:
     return pred_dir_for(date_str) / f"{date_str}.json"
 
 
+def _raw_day_files() -> Dict[str, Path]:
+    """data/predictions altındaki gün dosyaları (YYYY-MM-DD.json), tarihe göre."""
+    files = {}
+    for path in pred_dir_for("").glob("*.json"):
+        try:
+            datetime.strptime(path.stem, "%Y-%m-%d")
+        except ValueError:
+            continue
+        files[path.stem] = path
+    return files
+
+
 def _atomic_write_json(path: Path, data_obj: dict):
     tmp = path.with_suffix(".json.tmp")
     with tmp.open("w", encoding="utf-8") as f:
@@ -27,43 +57,715 @@ def _atomic_write_json(path: Path, data_obj: dict):
     tmp.replace(path)
 
 
-@contextmanager
-def _file_lock(lock_path: Path):
-    import time
+def _lock_fd(fd: int):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
     while True:
         try:
-            fd = os.open(str(lock_path), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
-            os.close(fd)
-            break
-        except FileExistsError:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return
+        except OSError:
             time.sleep(0.05)
+
+
+def _unlock_fd(fd: int):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def _file_lock(lock_path: Path):
+    """
+    Çekirdek kilidi (fcntl.flock, Windows'ta msvcrt.locking). Kilit dosyanın varlığına değil açık
+    tanıtıcıya bağlıdır: yazan süreç çökse de çekirdek kilidi bırakır, geride kalan .lock dosyası
+    (eski sürümlerden kalanlar dahil) kimseyi bekletmez. Bekleme bloklayıcıdır; event loop dışında çağrılmalıdır.
+    """
+    fd = os.open(str(lock_path), os.O_CREAT | os.O_RDWR)
     try:
-        yield
+        _lock_fd(fd)
+        try:
+            yield
+        finally:
+            _unlock_fd(fd)
     finally:
+        os.close(fd)
+
+
+def _fingerprint_hash(pred) -> str:
+    fp = pred.get("fingerprint") if isinstance(pred, dict) else None
+    return fp.get("hash") if isinstance(fp, dict) else None
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+class JsonPredictionStore:
+    """Gün başına tek JSON dosyası (eski biçim). Her yazma dosyanın tamamını yeniden yazar."""
+
+    name = "json"
+
+    def read_day(self, date_str: str) -> Dict[str, dict]:
+        p = pred_file_for(date_str)
+        if not p.exists():
+            return {}
+        try:
+            with p.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+                if isinstance(data, dict):
+                    return data
+                return {}
+        except Exception:
+            return {}
+
+    def read_many(self, date_str: str, event_ids: Iterable[str]) -> Dict[str, dict]:
+        data = self.read_day(date_str)
+        return {key: data[key] for key in event_ids if key in data}
+
+    def write_day(self, date_str: str, data_obj: Dict[str, dict]):
+        """Günü yazar; kilit altında alınan (yazma öncesi, yazma sonrası) belirteçleri döndürür."""
+        p = pred_file_for(date_str)
+        with _file_lock(p.with_suffix(".lock")):
+            before = self.version_token(date_str)
+            _atomic_write_json(p, data_obj)
+            return before, self.version_token(date_str)
+
+    def version_token(self, date_str: str):
+        """Dosya değişince değişen belirteç (mtime, boyut); dosya yoksa None."""
         try:
-            os.unlink(str(lock_path))
+            st = pred_file_for(date_str).stat()
         except FileNotFoundError:
-            pass
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def upsert(self, date_str: str, new_preds: Dict[str, dict]) -> Tuple[Dict[str, dict], Optional[tuple]]:
+        p = pred_file_for(date_str)
+        tokens = None
+        # Oku-değiştir-yaz tek kilit altında: eşzamanlı yazıcıların güncellemeleri kaybolmaz
+        with _file_lock(p.with_suffix(".lock")):
+            all_preds = self.read_day(date_str)
+            changed = {
+                key: pred for key, pred in new_preds.items()
+                if _fingerprint_hash(pred) is None or _fingerprint_hash(all_preds.get(key)) != _fingerprint_hash(pred)
+            }
+            if changed:
+                before = self.version_token(date_str)
+                all_preds.update(changed)
+                _atomic_write_json(p, all_preds)
+                tokens = before, self.version_token(date_str)
+        return changed, tokens
+
+    def dates(self) -> List[str]:
+        return sorted(_raw_day_files())
+
+    def drop_day(self, date_str: str, token) -> bool:
+        """Gün dosyasını siler; dosya belirteç alındıktan sonra değiştiyse dokunmaz ve False döndürür."""
+        p = pred_file_for(date_str)
+        with _file_lock(p.with_suffix(".lock")):
+            if self.version_token(date_str) != token:
+                return False
+            p.unlink(missing_ok=True)
+        p.with_suffix(".lock").unlink(missing_ok=True)
+        return True
+
+    def compact(self, vacuum: bool = False):
+        pass
+
+    def stats(self) -> Dict[str, object]:
+        return {"backend": self.name}
+
+
+class SqlitePredictionStore:
+    """
+    Tahminler SQLite (WAL) tablosunda (tarih, maç) anahtarıyla tutulur: tek maç okuma/yazma O(1),
+    günün tamamı tek sorgu. İlk açılışta data/predictions/*.json dosyaları içeri aktarılır; dosya
+    sonradan değişirse (mtime) yeniden aktarılır ve sadece daha eski kayıtların üzerine yazar.
+    """
+
+    name = "sqlite"
+    # Bu kadar yazmada bir WAL dosyası ana dosyaya aktarılıp kısaltılır
+    CHECKPOINT_EVERY = 1000
+    _CHUNK = 500
+
+    def __init__(self, path: Path = DEFAULT_PRED_DB_PATH, json_dir: Optional[Path] = None):
+        self.path = Path(path)
+        self.json_dir = json_dir
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+        self._writes_since_checkpoint = 0
+        # Bu süreçteki yazmalar için gün başına sürüm; başka bağlantıların yazmaları PRAGMA data_version ile görülür
+        self._versions: Dict[str, int] = {}
+        self.counters = {"reads": 0, "writes": 0, "skipped": 0, "imported": 0, "checkpoints": 0}
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                " date TEXT NOT NULL, event_id TEXT NOT NULL, fingerprint TEXT, updated_at REAL NOT NULL,"
+                " value TEXT NOT NULL, PRIMARY KEY (date, event_id))"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS imported_files (name TEXT PRIMARY KEY, mtime REAL NOT NULL)")
+            self._conn = conn
+            try:
+                self.migrate_json(self.json_dir if self.json_dir is not None else pred_dir_for(""))
+            except sqlite3.Error as e:
+                logger.warning("JSON tahmin dosyaları aktarılamadı: %s", e)
+        return self._conn
+
+    def migrate_json(self, json_dir: Path) -> int:
+        """Gün dosyalarını (YYYY-MM-DD.json) içeri aktarır; aktarılan kayıt sayısını döndürür."""
+        imported = 0
+        with self._lock:
+            db = self._db()
+            done = dict(db.execute("SELECT name, mtime FROM imported_files").fetchall())
+            for path in sorted(Path(json_dir).glob("*.json")):
+                try:
+                    mtime = path.stat().st_mtime
+                    if done.get(path.name) == mtime:
+                        continue
+                    with path.open("r", encoding="utf-8") as f:
+                        data = json.load(f)
+                except (OSError, ValueError) as e:
+                    logger.warning("Tahmin dosyası aktarılamadı (%s): %s", path, e)
+                    continue
+                if not isinstance(data, dict):
+                    continue
+                rows = [(path.stem, str(key), _fingerprint_hash(pred), mtime, _dumps(pred)) for key, pred in data.items()]
+                db.execute("BEGIN")
+                try:
+                    db.executemany(
+                        "INSERT INTO predictions (date, event_id, fingerprint, updated_at, value) VALUES (?, ?, ?, ?, ?)"
+                        " ON CONFLICT (date, event_id) DO UPDATE SET fingerprint = excluded.fingerprint,"
+                        " updated_at = excluded.updated_at, value = excluded.value"
+                        " WHERE predictions.updated_at < excluded.updated_at",
+                        rows,
+                    )
+                    db.execute("INSERT OR REPLACE INTO imported_files (name, mtime) VALUES (?, ?)", (path.name, mtime))
+                    db.execute("COMMIT")
+                except sqlite3.Error:
+                    db.execute("ROLLBACK")
+                    raise
+                imported += len(rows)
+            self.counters["imported"] += imported
+        if imported:
+            logger.info("%d tahmin JSON dosyalarından aktarıldı.", imported)
+        return imported
+
+    def read_day(self, date_str: str) -> Dict[str, dict]:
+        with self._lock:
+            rows = self._db().execute("SELECT event_id, value FROM predictions WHERE date = ? ORDER BY rowid", (date_str,)).fetchall()
+            self.counters["reads"] += 1
+        return {key: json.loads(value) for key, value in rows}
+
+    def read_many(self, date_str: str, event_ids: Iterable[str]) -> Dict[str, dict]:
+        keys = list(dict.fromkeys(event_ids))
+        found: Dict[str, dict] = {}
+        with self._lock:
+            db = self._db()
+            for i in range(0, len(keys), self._CHUNK):
+                chunk = keys[i:i + self._CHUNK]
+                rows = db.execute(
+                    f"SELECT event_id, value FROM predictions WHERE date = ? AND event_id IN ({','.join('?' * len(chunk))})",
+                    (date_str, *chunk),
+                ).fetchall()
+                found.update((key, json.loads(value)) for key, value in rows)
+            self.counters["reads"] += 1
+        return {key: found[key] for key in keys if key in found}
+
+    def _fingerprints(self, db: sqlite3.Connection, date_str: str, keys: List[str]) -> Dict[str, Optional[str]]:
+        result: Dict[str, Optional[str]] = {}
+        for i in range(0, len(keys), self._CHUNK):
+            chunk = keys[i:i + self._CHUNK]
+            result.update(db.execute(
+                f"SELECT event_id, fingerprint FROM predictions WHERE date = ? AND event_id IN ({','.join('?' * len(chunk))})",
+                (date_str, *chunk),
+            ).fetchall())
+        return result
+
+    def _write_rows(self, db: sqlite3.Connection, date_str: str, preds: Dict[str, dict]):
+        now = time.time()
+        db.executemany(
+            "INSERT INTO predictions (date, event_id, fingerprint, updated_at, value) VALUES (?, ?, ?, ?, ?)"
+            " ON CONFLICT (date, event_id) DO UPDATE SET fingerprint = excluded.fingerprint,"
+            " updated_at = excluded.updated_at, value = excluded.value",
+            [(date_str, str(key), _fingerprint_hash(pred), now, _dumps(pred)) for key, pred in preds.items()],
+        )
+
+    def version_token(self, date_str: str):
+        """(data_version, gün sürümü): başka süreç ya da bu süreç günü yazdığında değişir."""
+        with self._lock:
+            data_version = self._db().execute("PRAGMA data_version").fetchone()[0]
+            return data_version, self._versions.get(date_str, 0)
+
+    def _after_write(self, date_str: str, count: int):
+        self._versions[date_str] = self._versions.get(date_str, 0) + 1
+        self.counters["writes"] += count
+        self._writes_since_checkpoint += count
+        if self._writes_since_checkpoint >= self.CHECKPOINT_EVERY:
+            self.compact()
+
+    def _write_tokens(self, db: sqlite3.Connection, date_str: str) -> tuple:
+        # Yazma işlemi içinde okunur: kilit bizdeyken başka bağlantı commit edemez ve kendi
+        # commit'imiz data_version'ı değiştirmez; sonrası sadece gün sürümünün artmasıdır
+        data_version = db.execute("PRAGMA data_version").fetchone()[0]
+        version = self._versions.get(date_str, 0)
+        return (data_version, version), (data_version, version + 1)
+
+    def write_day(self, date_str: str, data_obj: Dict[str, dict]):
+        """Günü yazar; yazma işlemi içinde alınan (yazma öncesi, yazma sonrası) belirteçleri döndürür."""
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                tokens = self._write_tokens(db, date_str)
+                db.execute("DELETE FROM predictions WHERE date = ?", (date_str,))
+                self._write_rows(db, date_str, data_obj)
+                db.execute("COMMIT")
+            except sqlite3.Error:
+                db.execute("ROLLBACK")
+                raise
+            self._after_write(date_str, len(data_obj))
+        return tokens
+
+    def upsert(self, date_str: str, new_preds: Dict[str, dict]) -> Tuple[Dict[str, dict], Optional[tuple]]:
+        """
+        Parmak izi değişen (ya da parmak izi olmayan) tahminleri yazar; (yazılanlar, belirteçler) döndürür.
+        Belirteçler write_day'deki gibidir; hiçbir şey yazılmadıysa None.
+        """
+        tokens = None
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                tokens = self._write_tokens(db, date_str)
+                stored = self._fingerprints(db, date_str, [str(key) for key in new_preds])
+                changed = {
+                    key: pred for key, pred in new_preds.items()
+                    if _fingerprint_hash(pred) is None or stored.get(str(key)) != _fingerprint_hash(pred)
+                }
+                if changed:
+                    self._write_rows(db, date_str, changed)
+                db.execute("COMMIT")
+            except sqlite3.Error:
+                db.execute("ROLLBACK")
+                raise
+            self.counters["skipped"] += len(new_preds) - len(changed)
+            if changed:
+                self._after_write(date_str, len(changed))
+        return changed, tokens if changed else None
+
+    def dates(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._db().execute("SELECT DISTINCT date FROM predictions ORDER BY date")]
+
+    def drop_day(self, date_str: str, token) -> bool:
+        """Günün kayıtlarını siler; belirteç alındıktan sonra gün (ya da depo) yazıldıysa dokunmaz ve False döndürür."""
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                if self.version_token(date_str) != token:
+                    db.execute("ROLLBACK")
+                    return False
+                db.execute("DELETE FROM predictions WHERE date = ?", (date_str,))
+                db.execute("COMMIT")
+            except sqlite3.Error:
+                db.execute("ROLLBACK")
+                raise
+            self._versions[date_str] = self._versions.get(date_str, 0) + 1
+        return True
+
+    def compact(self, vacuum: bool = False):
+        """WAL'ı ana dosyaya aktarıp kısaltır; vacuum=True ile silinen sayfalar da geri verilir."""
+        with self._lock:
+            db = self._db()
+            db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            if vacuum:
+                db.execute("VACUUM")
+            self._writes_since_checkpoint = 0
+            self.counters["checkpoints"] += 1
+
+    def stats(self) -> Dict[str, object]:
+        return {"backend": self.name, "path": str(self.path), **self.counters}
+
+
+def make_pred_store():
+    """PRED_STORE_BACKEND=sqlite (varsayılan) ya da json; PRED_DB_PATH ile SQLite dosyası."""
+    backend = os.getenv("PRED_STORE_BACKEND", "sqlite").lower()
+    if backend == "json":
+        return JsonPredictionStore()
+    if backend != "sqlite":
+        logger.warning("Bilinmeyen PRED_STORE_BACKEND=%s, sqlite kullanılıyor.", backend)
+    return SqlitePredictionStore(Path(os.getenv("PRED_DB_PATH", str(DEFAULT_PRED_DB_PATH))))
+
+
+_STORE = None
+
+
+def get_pred_store():
+    global _STORE
+    if _STORE is None:
+        _STORE = make_pred_store()
+    return _STORE
+
+
+# --- Bellek içi okuma görünümü ---
+# Günün tahminleri bellekte tutulur; depo belirteci (SQLite data_version + gün sürümü ya da dosya mtime)
+# değişmedikçe okuma diske gitmez. /api/predictions/today gövdesi ve tek maç gövdeleri bir kez kodlanır.
+# Bu süreçteki yazmalar görünüme doğrudan işlenir (yeniden okuma yok). Görünümdeki sözlükler salt okunurdur.
+# Arşivlenmiş günlerde görünüm arşivin üzerine depodaki (geç gelen) kayıtları bindirir.
+MAX_VIEWS = 7
+
+
+class _DayView:
+    __slots__ = ("token", "data", "body", "bodies")
+
+    def __init__(self, token, data: Dict[str, dict], bodies: Optional[Dict[str, bytes]] = None):
+        self.token = token
+        self.data = data
+        self.body: Optional[bytes] = None
+        self.bodies: Dict[str, bytes] = bodies or {}
+
+
+_VIEWS: "OrderedDict[str, _DayView]" = OrderedDict()
+_VIEW_LOCK = threading.Lock()
+_VIEW_COUNTERS = {"hits": 0, "loads": 0, "write_through": 0}
 
 
-def read_predictions(date_str: str) -> Dict[str, dict]:
-    p = pred_file_for(date_str)
-    if not p.exists():
+def _encode(value) -> bytes:
+    # JSONResponse ile aynı kodlama
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def _token(date_str: str):
+    return get_pred_store().version_token(date_str), get_pred_archive().day_token(date_str)
+
+
+def _view(date_str: str) -> _DayView:
+    store = get_pred_store()
+    token = _token(date_str)
+    with _VIEW_LOCK:
+        view = _VIEWS.get(date_str)
+        if view is not None and view.token == token:
+            _VIEWS.move_to_end(date_str)
+            _VIEW_COUNTERS["hits"] += 1
+            return view
+    # Belirteç okumadan önce alındı; arada yazma olursa bir sonraki okuma görünümü yeniler
+    data = store.read_day(date_str)
+    if token[1] is not None:
+        data = {**get_pred_archive().read_day(date_str), **data}
+    view = _DayView(token, data)
+    with _VIEW_LOCK:
+        _VIEWS[date_str] = view
+        _VIEWS.move_to_end(date_str)
+        while len(_VIEWS) > MAX_VIEWS:
+            _VIEWS.popitem(last=False)
+        _VIEW_COUNTERS["loads"] += 1
+    return view
+
+
+def _write_through(date_str: str, store_tokens: tuple, changed: Dict[str, dict], replace: bool = False):
+    """
+    Yazılan kayıtları güncel görünüme işler. store_tokens deponun yazma sırasında (kilit altında)
+    aldığı (önce, sonra) belirteçleridir; görünüm tam yazmadan önceki hali değilse atılır.
+    """
+    archive_token = get_pred_archive().day_token(date_str)
+    token_before, token_after = (store_tokens[0], archive_token), (store_tokens[1], archive_token)
+    with _VIEW_LOCK:
+        view = _VIEWS.get(date_str)
+        if view is None:
+            return
+        if view.token != token_before:
+            del _VIEWS[date_str]
+            return
+        changed = {str(key): pred for key, pred in changed.items()}
+        data = changed if replace else {**view.data, **changed}
+        bodies = {} if replace else {key: body for key, body in view.bodies.items() if key not in changed}
+        _VIEWS[date_str] = _DayView(token_after, data, bodies)
+        _VIEW_COUNTERS["write_through"] += 1
+
+
+def _cold(date_str: str) -> bool:
+    # Görünümde olmayan arşivlenmiş gün: tek tek maç okumaları için günün tamamı açılmaz
+    return date_str not in _VIEWS and get_pred_archive().day_token(date_str) is not None
+
+
+def _cold_many(date_str: str, keys: List[str]) -> Dict[str, dict]:
+    """Arşivden manifest ile (dosya taramadan) okur; depoda geç yazılmış kayıt varsa o geçerlidir."""
+    found = get_pred_archive().read_many(date_str, keys)
+    found.update(get_pred_store().read_many(date_str, keys))
+    return {key: found[key] for key in keys if key in found}
+
+
+def read_predictions(date_str: str, event_ids: Optional[Iterable[str]] = None) -> Dict[str, dict]:
+    """Günün tahminleri; event_ids verilirse sadece o maçlar."""
+    if event_ids is not None and _cold(date_str):
+        return _cold_many(date_str, [str(key) for key in event_ids])
+    data = _view(date_str).data
+    if event_ids is None:
+        return dict(data)
+    return {str(key): data[str(key)] for key in event_ids if str(key) in data}
+
+
+def read_prediction(date_str: str, event_id) -> Optional[dict]:
+    if _cold(date_str):
+        return _cold_many(date_str, [str(event_id)]).get(str(event_id))
+    return _view(date_str).data.get(str(event_id))
+
+
+def predictions_body(date_str: str) -> bytes:
+    """Günün tüm tahminlerinin JSON gövdesi; görünüm değişmedikçe yeniden kodlanmaz."""
+    view = _view(date_str)
+    if view.body is None:
+        view.body = _encode(view.data)
+    return view.body
+
+
+def prediction_body(date_str: str, event_id) -> Optional[bytes]:
+    """Tek maçın JSON gövdesi (yoksa None)."""
+    if _cold(date_str):
+        pred = read_prediction(date_str, event_id)
+        return None if pred is None else _encode(pred)
+    view = _view(date_str)
+    key = str(event_id)
+    body = view.bodies.get(key)
+    if body is None:
+        pred = view.data.get(key)
+        if pred is None:
+            return None
+        body = view.bodies[key] = _encode(pred)
+    return body
+
+
+def write_predictions(date_str: str, data_obj: Dict[str, dict]):
+    tokens = get_pred_store().write_day(date_str, data_obj)
+    _write_through(date_str, tokens, data_obj, replace=True)
+
+
+def upsert_predictions(date_str: str, new_preds: Dict[str, dict]) -> int:
+    """
+    Tahminleri günün kayıtlarına ekler/günceller. Girdi parmak izi kayıtlıyla aynı olanlar
+    yeniden yazılmaz; hiçbiri değişmediyse depoya dokunulmaz. Yazılan kayıt sayısını döndürür.
+    """
+    if not new_preds:
+        return 0
+    changed, tokens = get_pred_store().upsert(date_str, new_preds)
+    if changed:
+        _write_through(date_str, tokens, changed)
+    return len(changed)
+
+
+def compact_predictions(vacuum: bool = False):
+    get_pred_store().compact(vacuum)
+
+
+def pred_store_stats() -> Dict[str, object]:
+    return {
+        **get_pred_store().stats(), "views": len(_VIEWS), **_VIEW_COUNTERS,
+        "pending": sum(len(preds) for preds in _PENDING.values()), **_WRITE_BEHIND_COUNTERS,
+        "archive": get_pred_archive().stats(), "compaction": dict(_COMPACTION),
+    }
+
+
+# --- Arşivleme, saklama süresi ve sıkıştırma ---
+# Kapanmış günler (PRED_ARCHIVE_AFTER_DAYS günden eski) arşive taşınıp depodan silinir. Ham gün dosyaları
+# (data/predictions/*.json) arşivlendikten PRED_RAW_RETENTION_DAYS gün sonra silinir (JSON deposunda ham
+# dosya deponun kendisidir, arşivlenince silinir). PRED_ARCHIVE_RETENTION_DAYS > 0 ise arşiv de budanır.
+ARCHIVE_AFTER_DAYS = int(os.getenv("PRED_ARCHIVE_AFTER_DAYS", "2"))
+RAW_RETENTION_DAYS = int(os.getenv("PRED_RAW_RETENTION_DAYS", "14"))
+ARCHIVE_RETENTION_DAYS = int(os.getenv("PRED_ARCHIVE_RETENTION_DAYS", "0"))
+COMPACT_INTERVAL_SEC = int(os.getenv("PRED_COMPACT_INTERVAL_SEC", "3600"))
+
+_COMPACTION = {"runs": 0, "archived_days": 0, "raw_deleted": 0, "archive_dropped": 0, "last_run": None}
+
+
+def _days_before(today, days: int) -> str:
+    return (today - timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+def archive_closed_days(today=None) -> Dict[str, int]:
+    """Bir sıkıştırma turu (bloklayıcı; thread'de çağrılır). Bu turda yapılanları döndürür."""
+    today = today or datetime.now().date()
+    store, archive = get_pred_store(), get_pred_archive()
+    report = {"archived_days": 0, "raw_deleted": 0, "archive_dropped": 0}
+
+    cutoff = _days_before(today, ARCHIVE_AFTER_DAYS)
+    for date_str in store.dates():
+        if date_str >= cutoff or date_str in _PENDING or date_str in _FLUSHING:
+            continue
+        token = store.version_token(date_str)
+        merged = {**archive.read_day(date_str), **store.read_day(date_str)}
+        if merged:
+            archive.archive_day(date_str, merged)
+        # Arada gelen geç yazma varsa gün depoda kalır; bir sonraki tur onu da arşive katar
+        if store.drop_day(date_str, token):
+            report["archived_days"] += 1
+
+    raw_cutoff = _days_before(today, RAW_RETENTION_DAYS)
+    for date_str, path in _raw_day_files().items():
+        if date_str < raw_cutoff and archive.day_token(date_str) is not None:
+            path.unlink(missing_ok=True)
+            path.with_suffix(".lock").unlink(missing_ok=True)
+            report["raw_deleted"] += 1
+
+    if ARCHIVE_RETENTION_DAYS > 0:
+        archive_cutoff = _days_before(today, ARCHIVE_RETENTION_DAYS)
+        for date_str in archive.days():
+            if date_str < archive_cutoff:
+                archive.drop_day(date_str)
+                report["archive_dropped"] += 1
+
+    if report["archived_days"]:
+        store.compact(vacuum=True)
+    for key, value in report.items():
+        _COMPACTION[key] += value
+    _COMPACTION["runs"] += 1
+    _COMPACTION["last_run"] = time.time()
+    if any(report.values()):
+        logger.info("Tahmin sıkıştırma: %s", report)
+    return report
+
+
+async def run_pred_compaction(interval: int = COMPACT_INTERVAL_SEC):
+    while True:
+        try:
+            await asyncio.to_thread(archive_closed_days)
+        except Exception as e:
+            logger.warning("Tahmin sıkıştırma hatası: %s", e)
+        await asyncio.sleep(interval)
+
+
+# --- Event loop için: thread'de I/O ve write-behind kuyruğu ---
+# Async handler'lar depoya thread üzerinden erişir. Tahmin yazmaları kuyrukta birleştirilir ve
+# PRED_FLUSH_MS içinde gelenlerin hepsi tek işlemde (tek dayanıklı yazma) depoya aktarılır.
+# Kuyruktaki ve yazılmakta olan kayıtlar okumalarda depodakilerin üzerine bindirilir.
+FLUSH_INTERVAL_MS = int(os.getenv("PRED_FLUSH_MS", "200"))
+# Yazma hatasında yeniden deneme beklemesi her seferinde ikiye katlanır, bu sınıra kadar
+FLUSH_RETRY_MAX_SEC = float(os.getenv("PRED_FLUSH_RETRY_MAX_SEC", "30"))
+
+_PENDING: Dict[str, Dict[str, dict]] = {}
+_FLUSHING: Dict[str, Dict[str, dict]] = {}
+_FLUSH_TASK: Optional[asyncio.Task] = None
+_FLUSH_LOCK: Optional[asyncio.Lock] = None
+_FLUSH_LOCK_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_WRITE_BEHIND_COUNTERS = {"queued": 0, "flushes": 0, "flushed": 0, "flush_errors": 0}
+
+
+def _overlay(date_str: str) -> Dict[str, dict]:
+    pending, flushing = _PENDING.get(date_str), _FLUSHING.get(date_str)
+    if not pending and not flushing:
         return {}
+    return {**(flushing or {}), **(pending or {})}
+
+
+def _flush_lock() -> asyncio.Lock:
+    global _FLUSH_LOCK, _FLUSH_LOCK_LOOP
+    loop = asyncio.get_running_loop()
+    # asyncio.Lock ilk beklemede loop'a bağlanır; loop değişince (ör. ikinci asyncio.run) yenisi kurulur
+    if _FLUSH_LOCK is None or _FLUSH_LOCK_LOOP is not loop:
+        _FLUSH_LOCK, _FLUSH_LOCK_LOOP = asyncio.Lock(), loop
+    return _FLUSH_LOCK
+
+
+def _schedule_flush():
+    global _FLUSH_TASK
+    loop = asyncio.get_running_loop()
+    # Kapanmış bir loop'ta kalmış görev bir daha çalışmaz; o durumda yenisi kurulur
+    if _FLUSH_TASK is None or _FLUSH_TASK.done() or _FLUSH_TASK.get_loop() is not loop:
+        _FLUSH_TASK = loop.create_task(_flush_later())
+
+
+async def _flush_later():
+    # Görev kuyruk boşalana kadar yaşar: bu görev çalışırken _schedule_flush yeni görev kurmaz,
+    # bu yüzden başarısız yazmaların ve yazma sırasında gelenlerin yeniden denemesi burada yapılır
+    delay = FLUSH_INTERVAL_MS / 1000
+    while True:
+        await asyncio.sleep(delay)
+        errors_before = _WRITE_BEHIND_COUNTERS["flush_errors"]
+        await flush_predictions()
+        if not _PENDING:
+            return
+        if _WRITE_BEHIND_COUNTERS["flush_errors"] > errors_before:
+            delay = min(max(delay * 2, 0.1), FLUSH_RETRY_MAX_SEC)
+        else:
+            delay = FLUSH_INTERVAL_MS / 1000
+
+
+def queue_predictions(date_str: str, new_preds: Dict[str, dict]):
+    """
+    Tahminleri write-behind kuyruğuna ekler (aynı maçın sonraki tahmini öncekinin yerini alır).
+    Çalışan bir event loop yoksa doğrudan yazar.
+    """
+    if not new_preds:
+        return
     try:
-        with p.open("r", encoding="utf-8") as f:
-            data = json.load(f)
-            if isinstance(data, dict):
-                return data
-            return {}
-    except Exception:
-        return {}
+        asyncio.get_running_loop()
+    except RuntimeError:
+        upsert_predictions(date_str, new_preds)
+        return
+    _PENDING.setdefault(date_str, {}).update((str(key), pred) for key, pred in new_preds.items())
+    _WRITE_BEHIND_COUNTERS["queued"] += len(new_preds)
+    _schedule_flush()
 
 
-def write_predictions(date_str: str, data_obj: Dict[str, dict]):
-    p = pred_file_for(date_str)
-    lock = p.with_suffix(".lock")
-    with _file_lock(lock):
-        _atomic_write_json(p, data_obj)
+def _flush_batch(batch: Dict[str, Dict[str, dict]]) -> int:
+    return sum(upsert_predictions(date_str, preds) for date_str, preds in batch.items())
+
+
+async def flush_predictions() -> int:
+    """Kuyruğu depoya yazar (kapanışta da çağrılır); yazılan kayıt sayısını döndürür."""
+    global _FLUSHING
+    written = 0
+    async with _flush_lock():
+        while _PENDING:
+            batch = dict(_PENDING)
+            _PENDING.clear()
+            _FLUSHING = batch
+            try:
+                written += await asyncio.to_thread(_flush_batch, batch)
+                _WRITE_BEHIND_COUNTERS["flushes"] += 1
+            except Exception as e:
+                logger.warning("Tahmin kuyruğu yazılamadı, tekrar denenecek: %s", e)
+                _WRITE_BEHIND_COUNTERS["flush_errors"] += 1
+                # Bu arada gelen daha yeni tahminler korunur
+                for date_str, preds in batch.items():
+                    pending = _PENDING.setdefault(date_str, {})
+                    for key, pred in preds.items():
+                        pending.setdefault(key, pred)
+                # _flush_later içinden çağrıldıysa yeniden denemeyi o görev yapar; değilse (ör. kapanış) yeni görev kurulur
+                _schedule_flush()
+                break
+            finally:
+                _FLUSHING = {}
+    _WRITE_BEHIND_COUNTERS["flushed"] += written
+    return written
+
+
+async def read_predictions_async(date_str: str, event_ids: Optional[Iterable[str]] = None) -> Dict[str, dict]:
+    data = await asyncio.to_thread(read_predictions, date_str, event_ids)
+    overlay = _overlay(date_str)
+    if overlay:
+        keys = overlay.keys() if event_ids is None else [str(key) for key in event_ids if str(key) in overlay]
+        data.update((key, overlay[key]) for key in keys)
+    return data
+
+
+async def prediction_body_async(date_str: str, event_id) -> Optional[bytes]:
+    queued = _overlay(date_str).get(str(event_id))
+    if queued is not None:
+        return _encode(queued)
+    return await asyncio.to_thread(prediction_body, date_str, event_id)
 
 
+async def predictions_body_async(date_str: str) -> bytes:
+    if _overlay(date_str):
+        return _encode(await read_predictions_async(date_str))
+    return await asyncio.to_thread(predictions_body, date_str)
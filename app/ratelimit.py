@@ -0,0 +1,360 @@
+# app/ratelimit.py
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("ratelimit")
+logger.setLevel(logging.INFO)
+
+# Küçük sayı = yüksek öncelik
+PRIORITIES = {"interactive": 0, "agent": 1, "bulk": 2}
+
+_CURRENT_PRIORITY: contextvars.ContextVar[str] = contextvars.ContextVar("upstream_priority", default="interactive")
+
+
+class SharedPriority:
+    """
+    Birden çok çağıranın beklediği tek işin (single-flight) önceliği. Daha öncelikli bir çağıran katılınca
+    `raise_to` ile yükseltilir; işin kuyrukta bekleyen istekleri de yeni sınıfın kuyruğuna taşınır.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._sites = set()  # bu önceliğin beklediği kuyruklar (governor, PrioritySemaphore)
+
+    def raise_to(self, name: str) -> bool:
+        if PRIORITIES.get(name, 0) >= PRIORITIES[self.name]:
+            return False
+        self.name = name
+        for site in list(self._sites):
+            site._promote(self)
+        return True
+
+
+_CURRENT_SHARED: contextvars.ContextVar[Optional[SharedPriority]] = contextvars.ContextVar("upstream_shared_priority", default=None)
+
+
+@contextmanager
+def upstream_priority(name: str):
+    """Bu blok (ve içinde oluşturulan task'lar) içindeki collector çağrılarının öncelik sınıfı."""
+    if name not in PRIORITIES:
+        raise ValueError(f"Bilinmeyen öncelik sınıfı: {name}")
+    token = _CURRENT_PRIORITY.set(name)
+    shared_token = _CURRENT_SHARED.set(None)
+    try:
+        yield
+    finally:
+        _CURRENT_SHARED.reset(shared_token)
+        _CURRENT_PRIORITY.reset(token)
+
+
+@contextmanager
+def shared_priority(shared: SharedPriority):
+    """Bloktaki çağrılar paylaşılan önceliği izler (yükseltilirse sonraki ve bekleyen istekler de yükselir)."""
+    token = _CURRENT_SHARED.set(shared)
+    try:
+        yield
+    finally:
+        _CURRENT_SHARED.reset(token)
+
+
+def current_priority() -> str:
+    shared = _CURRENT_SHARED.get()
+    return shared.name if shared is not None else _CURRENT_PRIORITY.get()
+
+
+def _parse_reservations(spec: str) -> Dict[str, int]:
+    """"interactive=3,agent=1,bulk=0" -> {"interactive": 3, "agent": 1, "bulk": 0}"""
+    out = {name: 0 for name in PRIORITIES}
+    for part in spec.split(","):
+        if "=" in part:
+            name, value = part.split("=", 1)
+            if name.strip() in out:
+                out[name.strip()] = max(0, int(value))
+    return out
+
+
+class PrioritySemaphore:
+    """asyncio.Semaphore gibi; boşalan yer en yüksek öncelikli (sonra en eski) bekleyene verilir."""
+
+    def __init__(self, value: int):
+        self._value = value
+        self._waiters: List[tuple] = []
+        self._seq = itertools.count()
+
+    async def acquire(self, priority: Optional[str] = None):
+        if self._value > 0 and not any(not w[2].done() for w in self._waiters):
+            self._value -= 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        shared = None if priority else _CURRENT_SHARED.get()
+        if shared is not None:
+            shared._sites.add(self)
+        heapq.heappush(self._waiters, (PRIORITIES.get(priority or current_priority(), 0), next(self._seq), fut, shared))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release()
+            raise
+
+    def _promote(self, shared: SharedPriority):
+        prio = PRIORITIES[shared.name]
+        self._waiters = [
+            (min(w[0], prio), w[1], w[2], w[3]) if w[3] is shared and not w[2].done() else w for w in self._waiters
+        ]
+        heapq.heapify(self._waiters)
+
+    def release(self):
+        while self._waiters:
+            _prio, _seq, fut, _shared = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self._value += 1
+
+
+class UpstreamGovernor:
+    """
+    Tüm upstream çağrılarının geçtiği paylaşılan token bucket + eşzamanlılık sınırı.
+
+    Her öncelik sınıfının (interactive > agent > bulk) kendine ayrılmış `reservations` kadar
+    eşzamanlı yeri vardır; kalan `max_concurrency - sum(reservations)` yer ortak havuzdur.
+    Token'lar her zaman önce yüksek öncelikli kuyruğa verilir, böylece agent/bulk patlamaları
+    sırasında interaktif istekler beklemeden geçer.
+    403/429 ya da boş JSON görülünce hız yarıya iner ve kısa bir süre tüm çağrılar durdurulur;
+    başarılı yanıtlarla hız kademeli olarak `max_rate`'e geri çıkar.
+    """
+
+    def __init__(self, rate: float = 8.0, burst: int = 16, max_concurrency: int = 8,
+                 reservations: Optional[Dict[str, int]] = None,
+                 min_rate: float = 0.5, backoff_factor: float = 0.5, recovery_step: float = 0.2,
+                 penalty_sec: float = 15.0, max_penalty_sec: float = 300.0):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.reservations = {name: 0 for name in PRIORITIES}
+        self.reservations.update(reservations or {"interactive": 3, "agent": 1})
+        self.max_concurrency = max(max_concurrency, sum(self.reservations.values()))
+        self.shared_slots = self.max_concurrency - sum(self.reservations.values())
+        self.min_rate = min_rate
+        self.backoff_factor = backoff_factor
+        self.recovery_step = recovery_step
+        self.penalty_sec = penalty_sec
+        self.max_penalty_sec = max_penalty_sec
+        self.tokens = float(burst)
+        self._last_refill: Optional[float] = None
+        self._pause_until = 0.0
+        self._consecutive_blocks = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reset_queues()
+        self.counters = {"requests": 0, "blocked": 0, "empty": 0, "backoffs": 0}
+
+    def _reset_queues(self):
+        self._queues: Dict[str, deque] = {name: deque() for name in PRIORITIES}
+        self._reserved_in_use = {name: 0 for name in PRIORITIES}
+        self._shared_in_use = 0
+        self._waits: Dict[str, deque] = {name: deque(maxlen=500) for name in PRIORITIES}
+
+    def _bind_loop(self) -> asyncio.AbstractEventLoop:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._timer = None
+            self._last_refill = None
+            self._pause_until = 0.0
+            self._reset_queues()
+        return loop
+
+    @property
+    def in_flight(self) -> int:
+        return self._shared_in_use + sum(self._reserved_in_use.values())
+
+    def _refill(self, now: float):
+        if self._last_refill is not None:
+            self.tokens = min(float(self.burst), self.tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def _schedule(self, delay: float):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = self._loop.call_later(max(delay, 0.001), self._pump)
+
+    def _free_slot(self, cls: str) -> Optional[str]:
+        if self._reserved_in_use[cls] < self.reservations[cls]:
+            return "reserved"
+        if self._shared_in_use < self.shared_slots:
+            return "shared"
+        return None
+
+    def _pump(self):
+        """Sınıfları öncelik sırasıyla dolaşıp yer ve token'ı olan bekleyenleri uyandırır."""
+        self._timer = None
+        now = self._loop.time()
+        self._refill(now)
+        if any(self._queues.values()) and now < self._pause_until:
+            self._schedule(self._pause_until - now)
+            return
+        for cls in sorted(PRIORITIES, key=PRIORITIES.get):
+            queue = self._queues[cls]
+            while queue:
+                need, fut, enqueued, _shared = queue[0]
+                if fut.done():
+                    queue.popleft()
+                    continue
+                kind = self._free_slot(cls)
+                if kind is None:
+                    break  # bu sınıfın yeri yok; alt sınıflar kendi ayrılmış yerlerini kullanabilir
+                need = min(float(need), float(self.burst))
+                if self.tokens < need:
+                    # Token'lar sıradaki en yüksek öncelikli bekleyene saklanır
+                    self._schedule((need - self.tokens) / self.rate)
+                    return
+                queue.popleft()
+                self.tokens -= need
+                if kind == "reserved":
+                    self._reserved_in_use[cls] += 1
+                else:
+                    self._shared_in_use += 1
+                self._waits[cls].append(now - enqueued)
+                fut.set_result((cls, kind))
+
+    async def acquire(self, tokens: int = 1, priority: Optional[str] = None) -> Tuple[str, str]:
+        """Yer ve token alınca (sınıf, "reserved"|"shared") kirasını döndürür; release'e verilmelidir."""
+        loop = self._bind_loop()
+        cls = priority or current_priority()
+        if cls not in PRIORITIES:
+            cls = "interactive"
+        shared = None if priority else _CURRENT_SHARED.get()
+        if shared is not None:
+            shared._sites.add(self)
+        fut = loop.create_future()
+        self._queues[cls].append((tokens, fut, loop.time(), shared))
+        self._pump()
+        try:
+            lease = await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release(fut.result())
+            raise
+        self.counters["requests"] += tokens
+        return lease
+
+    def _promote(self, shared: SharedPriority):
+        """Paylaşılan önceliği yükselen bekleyenleri yeni sınıfın kuyruğuna (bekleme sırasıyla) taşır."""
+        target = shared.name
+        moved = []
+        for cls, queue in self._queues.items():
+            if cls == target:
+                continue
+            keep = deque()
+            for entry in queue:
+                (moved if entry[3] is shared and not entry[1].done() else keep).append(entry)
+            self._queues[cls] = keep
+        if moved:
+            self._queues[target] = deque(sorted([*self._queues[target], *moved], key=lambda e: e[2]))
+            if self._loop is not None:
+                self._pump()
+
+    def release(self, lease: Tuple[str, str]):
+        cls, kind = lease
+        if kind == "reserved":
+            self._reserved_in_use[cls] = max(0, self._reserved_in_use[cls] - 1)
+        else:
+            self._shared_in_use = max(0, self._shared_in_use - 1)
+        if self._loop is not None:
+            self._pump()
+
+    @asynccontextmanager
+    async def slot(self, tokens: int = 1, priority: Optional[str] = None):
+        lease = await self.acquire(tokens, priority)
+        try:
+            yield
+        finally:
+            self.release(lease)
+
+    def observe(self, responses: List[Any]):
+        """Yanıtlara göre hızı ayarlar (AIMD): engel/boş JSON -> yavaşla, başarı -> hızlan."""
+        if self._loop is None:
+            return
+        blocked = sum(1 for r in responses if r.blocked)
+        empty = sum(1 for r in responses if r.empty)
+        self.counters["blocked"] += blocked
+        self.counters["empty"] += empty
+        if blocked or empty:
+            now = self._loop.time()
+            self.rate = max(self.min_rate, self.rate * self.backoff_factor)
+            self.counters["backoffs"] += 1
+            if blocked:
+                self._consecutive_blocks += 1
+                penalty = min(self.max_penalty_sec, self.penalty_sec * (2 ** (self._consecutive_blocks - 1)))
+                self._pause_until = max(self._pause_until, now + penalty)
+                logger.warning("Upstream engeli (%d yanıt); hız %.2f/s, %.0fs duraklatma.", blocked, self.rate, penalty)
+            return
+        if any(r.ok for r in responses):
+            self._consecutive_blocks = 0
+            self.rate = min(self.max_rate, self.rate + self.recovery_step)
+
+    def _wait_percentiles(self, cls: str) -> Dict[str, float]:
+        waits = sorted(self._waits[cls])
+        if not waits:
+            return {"p50_ms": 0.0, "p95_ms": 0.0}
+        return {
+            "p50_ms": round(waits[len(waits) // 2] * 1000, 1),
+            "p95_ms": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 1),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        now = self._loop.time() if self._loop is not None else 0.0
+        return {
+            "rate": round(self.rate, 3),
+            "max_rate": self.max_rate,
+            "tokens": round(self.tokens, 2),
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "shared_slots": self.shared_slots,
+            "paused_for_sec": round(max(0.0, self._pause_until - now), 1),
+            "classes": {
+                cls: {
+                    "reserved": self.reservations[cls],
+                    "reserved_in_use": self._reserved_in_use[cls],
+                    "waiting": sum(1 for w in self._queues[cls] if not w[1].done()),
+                    **self._wait_percentiles(cls),
+                }
+                for cls in PRIORITIES
+            },
+            **self.counters,
+        }
+
+
+# API ile aynı anda çalışan ayrı süreçler (scripts/) için varsayılan hız; API'nin 8/s'sinin yanında ~%25 ek yük
+SCRIPT_UPSTREAM_RATE = "2"
+
+_GOVERNOR: Optional[UpstreamGovernor] = None
+
+
+def get_governor() -> UpstreamGovernor:
+    """
+    UPSTREAM_RATE (istek/sn), UPSTREAM_BURST, UPSTREAM_CONCURRENCY ve sınıf bazında ayrılmış yerler için
+    UPSTREAM_RESERVED="interactive=3,agent=1,bulk=0" ile ayarlanır.
+
+    Sınır süreç başınadır: scripts/ altındaki veri toplama script'leri ayrı süreçte kendi governor'larını
+    kurar ve API ile aynı bütçeyi paylaşmaz (toplam upstream hızı süreçlerin toplamıdır). Bu yüzden
+    script'ler varsayılan olarak SCRIPT_UPSTREAM_RATE ile çalışır.
+    """
+    global _GOVERNOR
+    if _GOVERNOR is None:
+        _GOVERNOR = UpstreamGovernor(
+            rate=float(os.getenv("UPSTREAM_RATE", "8")),
+            burst=int(os.getenv("UPSTREAM_BURST", "16")),
+            max_concurrency=int(os.getenv("UPSTREAM_CONCURRENCY", "8")),
+            reservations=_parse_reservations(os.getenv("UPSTREAM_RESERVED", "interactive=3,agent=1,bulk=0")),
+        )
+    return _GOVERNOR
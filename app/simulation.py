@@ -0,0 +1,140 @@
+# app/simulation.py
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from app.markov import hold_prob, tiebreak_prob
+
+# Sayı -> oyun -> set -> maç simülasyonu. Oyun ve tiebreak kazanma olasılıkları sayı olasılığından
+# kesin formülle (app.markov) hesaplanır; setler simülasyonlar boyunca vektörel (N x 12 oyun matrisi, 12 bitlik kod) oynanır.
+
+# Servis sayısı kazanma oranı için tur ortalaması ve az veride ortalamaya çekme ağırlığı (sayı)
+TOUR_AVG_SERVE_POINTS = 0.62
+PRIOR_SERVE_POINTS = 200
+DEFAULT_SIMULATIONS = 100_000
+
+
+def serve_point_prob(stats: Dict[str, Any], prior: float = TOUR_AVG_SERVE_POINTS, prior_points: int = PRIOR_SERVE_POINTS) -> float:
+    """year-statistics toplamlarından servis sayısı kazanma olasılığı (1. + 2. servis), tur ortalamasına çekilmiş."""
+    won = (stats.get("firstServePointsScored") or 0) + (stats.get("secondServePointsScored") or 0)
+    total = (stats.get("firstServePointsTotal") or 0) + (stats.get("secondServePointsTotal") or 0)
+    if total <= 0 or won < 0 or won > total:
+        return prior
+    return (won + prior * prior_points) / (total + prior_points)
+
+
+def matchup_serve_probs(home_serve: float, away_serve: float) -> tuple:
+    """
+    Barnett-Clarke birleştirmesi: f_ab = f_a - (g_b - g_ort). Veride dönüş sayısı istatistiği olmadığı için
+    rakibin dönüş gücü tur ortalaması kabul edilir, yani f_ab = f_a. Değerler (0.05, 0.95) aralığına kırpılır.
+    """
+    return float(np.clip(home_serve, 0.05, 0.95)), float(np.clip(away_serve, 0.05, 0.95))
+
+
+@lru_cache(maxsize=1)
+def _set_table() -> tuple:
+    """
+    12 oyunun sonucu 12 bitlik kodla (bit k = ev sahibi k. oyunu aldı) -> (ev oyun, deplasman oyun, bitti mi).
+    Set 6 oyuna 2 farkla ya da 7-5 ile biter; 12 oyunda bitmediyse skor 6-6'dır ve tiebreak oynanır.
+    """
+    home = np.zeros(4096, dtype=np.int8)
+    away = np.zeros(4096, dtype=np.int8)
+    decided = np.zeros(4096, dtype=bool)
+    for code in range(4096):
+        h = a = 0
+        for k in range(12):
+            if (code >> k) & 1:
+                h += 1
+            else:
+                a += 1
+            if max(h, a) >= 6 and abs(h - a) >= 2:
+                decided[code] = True
+                break
+        home[code], away[code] = h, a
+    return home, away, decided
+
+
+def _uniform16(rng: np.random.Generator, shape) -> np.ndarray:
+    # Olasılıklar 1/65536 çözünürlükle karşılaştırılır; her 64 bitlik ham çıktı 4 sayı verir (float'tan çok daha hızlı)
+    size = int(np.prod(shape))
+    raw = rng.bit_generator.random_raw((size + 3) // 4).view(np.uint16)
+    return raw[:size].reshape(shape)
+
+
+def _threshold(p: float) -> np.uint16:
+    return np.uint16(min(65535, max(0, round(p * 65536))))
+
+
+def simulate_match(p_home: float, p_away: float, best_of: int = 3, final_set_tiebreak: int = 7,
+                   simulations: int = DEFAULT_SIMULATIONS, seed: Optional[int] = None) -> Dict[str, Any]:
+    """
+    p_home/p_away: oyuncuların kendi servislerinde sayı kazanma olasılıkları.
+    final_set_tiebreak: son sette 6-6'da oynanan tiebreak'in hedef sayısı (7 ya da 10).
+    Kazanma olasılığı, set skoru ve toplam oyun dağılımlarını döndürür.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(simulations)
+    sets_to_win = best_of // 2 + 1
+    hold_h, hold_a = hold_prob(p_home), hold_prob(p_away)
+    table_home, table_away, table_decided = _set_table()
+    bit_weights = (1 << np.arange(12)).astype(np.uint16)
+    # Setin ilk servisçisine göre 12 oyunun ev sahibi tarafından kazanılma eşikleri
+    home_game = _threshold(hold_h)
+    away_game = _threshold(1.0 - hold_a)
+    game_thresholds = {
+        True: np.array([home_game if k % 2 == 0 else away_game for k in range(12)], dtype=np.uint16),
+        False: np.array([away_game if k % 2 == 0 else home_game for k in range(12)], dtype=np.uint16),
+    }
+    tb_thresholds = {
+        target: (_threshold(tiebreak_prob(p_home, p_away, target)), _threshold(1.0 - tiebreak_prob(p_away, p_home, target)))
+        for target in {7, final_set_tiebreak}
+    }
+
+    sets_home = np.zeros(n, dtype=np.int8)
+    sets_away = np.zeros(n, dtype=np.int8)
+    total_games = np.zeros(n, dtype=np.int16)
+    # İlk servis bilinmediği için kura ile
+    home_serves_first = _uniform16(rng, n) < 32768
+
+    for set_no in range(best_of):
+        live = (sets_home < sets_to_win) & (sets_away < sets_to_win)
+        if not live.any():
+            break
+        target = final_set_tiebreak if set_no == best_of - 1 else 7
+        set_server = home_serves_first.copy()
+        for home_first in (True, False):
+            idx = np.flatnonzero(live & (set_server == home_first))
+            if idx.size == 0:
+                continue
+            wins = _uniform16(rng, (idx.size, 12)) < game_thresholds[home_first]
+            code = wins.astype(np.uint16) @ bit_weights
+            h, a, decided = table_home[code], table_away[code], table_decided[code]
+
+            # 6-6: tiebreak (ilk servisi setin ilk servisçisi atar); 7-6 olarak sayılır
+            tb_home = _uniform16(rng, idx.size) < tb_thresholds[target][0 if home_first else 1]
+            h = np.where(decided, h, np.where(tb_home, 7, 6))
+            a = np.where(decided, a, np.where(tb_home, 6, 7))
+
+            total_games[idx] += h + a
+            home_won = h > a
+            sets_home[idx] += home_won
+            sets_away[idx] += ~home_won
+            # Servis sırası setler arasında sürer (tiebreak tek oyun sayılır)
+            home_serves_first[idx] = home_first ^ ((h + a) % 2 == 1)
+
+    home_wins = sets_home == sets_to_win
+    set_keys = sets_home.astype(np.int16) * 10 + sets_away
+    keys, counts = np.unique(set_keys, return_counts=True)
+    games, game_counts = np.unique(total_games, return_counts=True)
+    return {
+        "home_win_prob": float(home_wins.mean()),
+        "away_win_prob": float(1.0 - home_wins.mean()),
+        "set_scores": {f"{k // 10}-{k % 10}": c / n for k, c in zip(keys.tolist(), counts.tolist())},
+        "total_games": {int(g): c / n for g, c in zip(games.tolist(), game_counts.tolist())},
+        "expected_total_games": float(total_games.mean()),
+        "hold_probs": {"home": hold_h, "away": hold_a},
+        "simulations": n,
+        "best_of": best_of,
+        "final_set_tiebreak": final_set_tiebreak,
+    }
@@ -0,0 +1,168 @@
+# app/snapshots.py
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.batch_scoring import PAIR_METRICS, RATIO_METRICS
+
+logger = logging.getLogger("snapshots")
+logger.setLevel(logging.INFO)
+
+# Agent'ın maç öncesi (120/60/30/10/5 dk) tahmin anlık görüntüleri. Her görüntü sabit boyutlu bir kayıt
+# olarak günün .bin dosyasının sonuna eklenir (üzerine yazılmaz); okuma dosyanın memory-map'idir.
+# Çift (pair) metriklerde deplasman skoru = 1 - ev skoru olduğundan sadece ev skoru saklanır.
+
+BASE_DIR = Path(__file__).resolve().parent
+DEFAULT_SNAPSHOT_DIR = BASE_DIR.parent / "data" / "snapshots"
+
+SNAPSHOT_DTYPE = np.dtype(
+    [("event_id", "<i8"), ("ts", "<u4"), ("offset_min", "<i2"), ("home_win_prob", "<f4")]
+    + [(f"home:{name}", "<f2") for name in PAIR_METRICS]
+    + [(f"{side}:{name}", "<f2") for name in RATIO_METRICS for side in ("home", "away")]
+)
+# Şema (alan adları/tipleri) değişince dosya adı da değişir; eski dosyalar kendi şemasıyla okunur
+SCHEMA_ID = hashlib.sha1(json.dumps(SNAPSHOT_DTYPE.descr).encode("utf-8")).hexdigest()[:8]
+
+# Gün -> kaydedilmiş (maç, offset) çiftleri; agent aynı offset'i iki turda tetiklese de tek kayıt tutulur
+_SEEN: Dict[str, Set[Tuple[int, int]]] = {}
+# to_thread işçileri aynı anda yazar: küme kurulumu ve kontrol-ekle-işaretle bu kilit altında
+_SEEN_LOCK = threading.Lock()
+_COUNTERS = {"recorded": 0, "duplicates": 0}
+
+
+def snapshot_dir() -> Path:
+    return Path(os.getenv("SNAPSHOT_DIR", str(DEFAULT_SNAPSHOT_DIR)))
+
+
+def _paths(date_str: str, schema_id: str = SCHEMA_ID) -> Tuple[Path, Path]:
+    base = snapshot_dir() / f"{date_str}.{schema_id}"
+    return base.parent / f"{base.name}.bin", base.parent / f"{base.name}.json"
+
+
+def _read_file(path: Path) -> np.ndarray:
+    """Tek .bin dosyası, yanındaki şemayla; yarım kalmış son kayıt yok sayılır."""
+    with path.with_suffix(".json").open("r", encoding="utf-8") as f:
+        dtype = np.dtype([tuple(field) for field in json.load(f)["descr"]])
+    count = path.stat().st_size // dtype.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+
+
+def _to_current(arr: np.ndarray) -> np.ndarray:
+    if arr.dtype == SNAPSHOT_DTYPE:
+        return arr
+    out = np.zeros(arr.shape[0], dtype=SNAPSHOT_DTYPE)
+    for name in SNAPSHOT_DTYPE.names:
+        if name in arr.dtype.names:
+            out[name] = arr[name]
+        elif SNAPSHOT_DTYPE[name].kind == "f":
+            out[name] = np.nan
+    return out
+
+
+def load_snapshots(date_str: str) -> np.ndarray:
+    """Günün tüm görüntüleri (kayıt sırasıyla) tek yapılandırılmış dizide."""
+    parts = []
+    for path in sorted(snapshot_dir().glob(f"{date_str}.*.bin")):
+        try:
+            parts.append(_to_current(_read_file(path)))
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Görüntü dosyası okunamadı (%s): %s", path, e)
+    if not parts:
+        return np.zeros(0, dtype=SNAPSHOT_DTYPE)
+    return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+
+def _seen(date_str: str) -> Set[Tuple[int, int]]:
+    """Günün kayıtlı (maç, offset) kümesi; _SEEN_LOCK tutulurken çağrılır."""
+    seen = _SEEN.get(date_str)
+    if seen is None:
+        arr = load_snapshots(date_str)
+        seen = _SEEN[date_str] = set(zip(arr["event_id"].tolist(), arr["offset_min"].tolist()))
+        # Eski günlerin kümeleri tutulmaz
+        for old in [d for d in _SEEN if d < date_str]:
+            del _SEEN[old]
+    return seen
+
+
+def _encode_record(event_id: int, offset_min: int, pred: Dict[str, Any], ts: float) -> np.ndarray:
+    rec = np.zeros(1, dtype=SNAPSHOT_DTYPE)
+    rec["event_id"], rec["ts"], rec["offset_min"] = event_id, int(ts), offset_min
+    rec["home_win_prob"] = pred.get("home_win_prob", np.nan)
+    home, away = pred.get("scores", {}).get("home", {}), pred.get("scores", {}).get("away", {})
+    for name in PAIR_METRICS:
+        rec[f"home:{name}"] = home.get(name, np.nan)
+    for name in RATIO_METRICS:
+        rec[f"home:{name}"] = home.get(name, np.nan)
+        rec[f"away:{name}"] = away.get(name, np.nan)
+    return rec
+
+
+def record_snapshot(date_str: str, event_id: int, offset_min: int, pred: Dict[str, Any], ts: Optional[float] = None) -> bool:
+    """Görüntüyü günün dosyasına ekler; aynı (maç, offset) zaten kayıtlıysa False. Bloklayıcıdır (thread'de çağrılır)."""
+    key = (int(event_id), int(offset_min))
+    record = _encode_record(key[0], key[1], pred, time.time() if ts is None else ts).tobytes()
+    bin_path, schema_path = _paths(date_str)
+    with _SEEN_LOCK:
+        seen = _seen(date_str)
+        if key in seen:
+            _COUNTERS["duplicates"] += 1
+            return False
+        bin_path.parent.mkdir(parents=True, exist_ok=True)
+        if not schema_path.exists():
+            tmp = schema_path.parent / f"{schema_path.name}.tmp"
+            tmp.write_text(json.dumps({"descr": SNAPSHOT_DTYPE.descr}, ensure_ascii=False), encoding="utf-8")
+            tmp.replace(schema_path)
+        # O_APPEND ile tek write(): kayıt (itemsize bayt) dosyanın sonuna bütün olarak eklenir
+        fd = os.open(str(bin_path), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, record)
+        finally:
+            os.close(fd)
+        seen.add(key)
+        _COUNTERS["recorded"] += 1
+    return True
+
+
+def _num(value) -> Optional[float]:
+    value = float(value)
+    # float16/float32 kayıtların gürültü basamakları yanıtta taşınmaz
+    return None if np.isnan(value) else round(value, 6)
+
+
+def event_trajectory(event_id: int, date_str: str) -> List[Dict[str, Any]]:
+    """
+    Maçın olasılık yörüngesi: verilen gün ve bir önceki günün (gece yarısına yakın maçlar)
+    görüntüleri, zaman sırasıyla.
+    """
+    prev = (datetime.strptime(date_str, "%Y-%m-%d") - timedelta(days=1)).strftime("%Y-%m-%d")
+    rows = [arr[arr["event_id"] == event_id] for arr in (load_snapshots(prev), load_snapshots(date_str))]
+    rows = np.concatenate(rows)
+    rows = rows[np.argsort(rows["ts"], kind="stable")]
+    points = []
+    for row in rows:
+        home_prob = _num(row["home_win_prob"])
+        home = {name: _num(row[f"home:{name}"]) for name in PAIR_METRICS + RATIO_METRICS}
+        away = {name: (None if home[name] is None else round(1.0 - home[name], 6)) for name in PAIR_METRICS}
+        away.update({name: _num(row[f"away:{name}"]) for name in RATIO_METRICS})
+        points.append({
+            "offset_min": int(row["offset_min"]),
+            "ts": int(row["ts"]),
+            "home_win_prob": home_prob,
+            "away_win_prob": None if home_prob is None else round(1.0 - home_prob, 6),
+            "scores": {"home": home, "away": away},
+        })
+    return points
+
+
+def snapshot_stats() -> Dict[str, Any]:
+    return {"record_bytes": SNAPSHOT_DTYPE.itemsize, "schema": SCHEMA_ID, **_COUNTERS}
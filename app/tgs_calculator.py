@@ -1,28 +1,41 @@
 # app/tgs_calculator.py
 
 import asyncio
+import hashlib
 import json
-from typing import Any, Dict, Optional, List, Tuple
-from collections import defaultdict
+import os
+from typing import Any, AsyncIterator, Dict, Optional, List, Tuple
+from collections import OrderedDict, defaultdict
 from datetime import datetime, timedelta
 
+from app.batch_scoring import PAIR_METRICS, RATIO_METRICS, MetricInputs, score_batch
+from app.cache import get_cache, NO_EXPIRY
+from app.event_index import event_summary, lookup_event
+from app.inplay import live_score_state, live_win_prob
+from app.markov import lookup_match_win_prob, match_distribution
+from app.player_profiles import get_player_profile, h2h_record, preload_profiles, recent_form
+from app.simulation import DEFAULT_SIMULATIONS, matchup_serve_probs, serve_point_prob, simulate_match
+
 # Gerekli collector fonksiyonlarını import et
 try:
     from app.collector import (
         fetch_all_event_details,
+        fetch_event,
         fetch_player_matches,
         fetch_rankings_via_page,
         fetch_year_statistics,
-        fetch_scheduled_events_for_dates
     )
+    from app.odds import event_date, get_event_odds
 except (ImportError, ModuleNotFoundError):
     # Bu blok, script'i tek başına çalıştırırken veya collector bulunamadığında hata vermesini önler
     print("UYARI: 'app.collector' bulunamadı. Sahte (mock) fonksiyonlar kullanılıyor.")
+    async def get_event_odds(*args, **kwargs): return None
+    def event_date(*args, **kwargs): return datetime.now().strftime("%Y-%m-%d")
     async def fetch_all_event_details(*args, **kwargs): return [{"error": "mock"}]*2
+    async def fetch_event(*args, **kwargs): return {}
     async def fetch_player_matches(team_id, page=0): return {"events": [], "hasNextPage": False}
     async def fetch_rankings_via_page(*args, **kwargs): return {"rankings": []}
-    async def fetch_year_statistics(*args, **kwargs): return {"statistics": []}
-    async def fetch_scheduled_events_for_dates(*args, **kwargs): return {"events": []}
+    async def fetch_year_statistics(*args, **kwargs): return {"statistics": [], "fetch_error": True}
 
 # --- Model Ağırlıkları ---
 WEIGHTS = {
@@ -38,6 +51,8 @@ WEIGHTS = {
     "servis_hakimiyeti": 0.10,
     "kritik_anlar_puani": 0.075,
     "hucum_puani": 0.075,
+    # Servis sayısı olasılıklarından kesin Markov maç olasılığı; varsayılan olarak TGS'ye katılmaz
+    "markov": float(os.getenv("MARKOV_WEIGHT", "0")),
 }
 # Ağırlıkları normalize et
 total_weight = sum(WEIGHTS.values())
@@ -56,70 +71,77 @@ def fractional_to_decimal(fractional: str) -> float:
     except (ValueError, TypeError):
         return 2.0
 
-# --- Basit TTL Cache (in-memory) ---
-# Not: Uygulama yeniden başlatılınca temizlenir. Süreyi kısa tutuyoruz ki bayat veri riski olmasın.
-_CACHE_RANKINGS: Dict[int, Tuple[float, Dict[str, Any]]] = {}
-_CACHE_MATCHES: Dict[int, Tuple[float, Dict[str, Any]]] = {}
-_CACHE_YEAR_STATS: Dict[Tuple[int, int], Tuple[float, Dict[str, Any]]] = {}
-_CACHE_EVENT_DETAILS: Dict[int, Tuple[float, Optional[Dict[str, Any]]]] = {}
-_CACHE_PRE_MATCH: Dict[Tuple[int, int, int], Tuple[float, Dict[str, Any]]] = {}
-
-def _cache_get(cache: Dict, key, ttl_seconds: int):
-    now = asyncio.get_event_loop().time()
-    item = cache.get(key)
-    if not item:
-        return None
-    ts, value = item
-    if (now - ts) < ttl_seconds:
-        return value
-    return None
-
-def _cache_put(cache: Dict, key, value):
-    now = asyncio.get_event_loop().time()
-    cache[key] = (now, value)
+# --- Katmanlı TTL Cache (bellek LRU + SQLite) ---
+# Namespace başına TTL ve bellek sınırı; disk katmanı sayesinde yeniden başlatmada ısınmış veri korunur.
+_CACHE = (
+    get_cache()
+    .namespace("rankings", ttl=300, max_entries=2000)
+    .namespace("matches", ttl=300, max_entries=2000)
+    .namespace("year_stats", ttl=900, max_entries=3000)
+    # Kapanmış yılların istatistikleri değişmez: süresiz ve kalıcı
+    .namespace("year_stats_closed", ttl=NO_EXPIRY, max_entries=10000)
+    # Bulunamayan maç id'leri kısa süre tekrar sorulmaz
+    .namespace("event_missing", ttl=60, max_entries=2000, persist=False)
+    # Gün boyu sabit girdiler: oyuncu paketi (alttaki namespace'lerin birleşimi, diske yazılmaz)
+    # ve oyuncu çifti + zemin için çıkarılmış metrik girdileri. TTL put sırasında gece yarısına göre verilir.
+    .namespace("player_inputs", ttl=3600, max_entries=1000, persist=False)
+    .namespace("stable_inputs", ttl=3600, max_entries=5000)
+    .namespace("simulation", ttl=900, max_entries=2000, persist=False)
+)
+
+def cache_stats() -> Dict[str, Any]:
+    return _CACHE.stats()
 
 # --- Veri Toplama Fonksiyonları ---
+# Yeni yılın ilk günlerinde geçen yılın son maçları hâlâ işlenebilir
+CLOSED_YEAR_GRACE_DAYS = 7
+# Kapanmış yıl için boş gelen veri (o yıl maç yok) kalıcı yazılmaz, günde bir tekrar denenir
+EMPTY_CLOSED_YEAR_TTL = 24 * 3600
+# Upstream hatasında (boş yıl değil) sonuç kısa süre tutulur; oyuncunun gün boyu girdileri de yazılmaz
+YEAR_STATS_ERROR_TTL = 900
+
+def _is_closed_year(year: int) -> bool:
+    return year < (datetime.now() - timedelta(days=CLOSED_YEAR_GRACE_DAYS)).year
+
 async def get_player_stats_for_years(team_id: int, years: List[int]) -> Dict[str, List]:
-    # Yıllık istatistikleri kısa süre cache'leyelim (TTL ~ 15 dakika)
+    # Kapanmış yıllar kalıcı depodan, içinde bulunulan yıl kısa TTL ile (~15 dakika) gelir;
+    # ısınmış bir oyuncu için tahmin başına en fazla bir yıllık istatistik isteği yapılır.
     async def get_year(year: int) -> Dict[str, Any]:
-        cached = _cache_get(_CACHE_YEAR_STATS, (team_id, year), ttl_seconds=900)
+        namespace = "year_stats_closed" if _is_closed_year(year) else "year_stats"
+        cached = await _CACHE.get_async(namespace, (team_id, year))
         if cached is not None:
             return cached
         data = await fetch_year_statistics(team_id, year)
-        _cache_put(_CACHE_YEAR_STATS, (team_id, year), data)
+        if data.get("fetch_error"):
+            _CACHE.put(namespace, (team_id, year), data, ttl=YEAR_STATS_ERROR_TTL)
+        elif namespace == "year_stats_closed" and not data.get("statistics"):
+            _CACHE.put(namespace, (team_id, year), data, ttl=EMPTY_CLOSED_YEAR_TTL)
+        else:
+            _CACHE.put(namespace, (team_id, year), data)
         return data
 
     # Tüm istenen yılları koru (doğruluk için)
     results = await asyncio.gather(*[get_year(y) for y in years])
     all_yearly_stats = [stat for year_data in results for stat in year_data.get("statistics", [])]
-    return {"all_stats": all_yearly_stats}
+    fetch_errors = [year for year, year_data in zip(years, results) if year_data.get("fetch_error")]
+    return {"all_stats": all_yearly_stats, "fetch_errors": fetch_errors}
 
 async def get_event_details(event_id: int) -> Optional[Dict[str, Any]]:
-    cached = _cache_get(_CACHE_EVENT_DETAILS, event_id, ttl_seconds=30)
-    if cached is not None:
-        return cached
-    today = datetime.now()
-    yesterday = today - timedelta(days=1)
-    dates_to_check = [today.strftime("%Y-%m-%d"), yesterday.strftime("%Y-%m-%d")]
-    
-    scheduled_events_data = await fetch_scheduled_events_for_dates(dates_to_check, headless=True)
-    
-    for event in scheduled_events_data.get("events", []):
-        if event.get("id") == event_id:
-            result = {
-                "home_team_id": event.get("homeTeam", {}).get("id"),
-                "away_team_id": event.get("awayTeam", {}).get("id"),
-                "home_team_name": event.get("homeTeam", {}).get("name"),
-                "away_team_name": event.get("awayTeam", {}).get("name"),
-                "ground_type": event.get("groundType"),
-            }
-            _cache_put(_CACHE_EVENT_DETAILS, event_id, result)
-            return result
-    return None
+    # Program/canlı çekimlerinden beslenen indeks; yoksa tek maç endpoint'i (tüm program taranmaz)
+    summary = lookup_event(event_id)
+    if summary is None:
+        if _CACHE.get("event_missing", event_id):
+            return None
+        event = await fetch_event(event_id)
+        if not event:
+            _CACHE.put("event_missing", event_id, True)
+            return None
+        summary = event_summary(event)
+    return {key: summary.get(key) for key in ("home_team_id", "away_team_id", "home_team_name", "away_team_name", "ground_type", "best_of", "start_timestamp")}
 
 async def fetch_all_player_matches(team_id: int, max_pages: int = 0) -> Dict[str, Any]:
     # Oyuncu maçlarını kısa süre cache'le (TTL ~ 5 dakika)
-    cached = _cache_get(_CACHE_MATCHES, team_id, ttl_seconds=300)
+    cached = await _CACHE.get_async("matches", team_id)
     if cached is not None:
         return cached
 
@@ -135,71 +157,113 @@ async def fetch_all_player_matches(team_id: int, max_pages: int = 0) -> Dict[str
             break
     unique_events = {event['id']: event for event in all_events}.values()
     result = {"events": sorted(list(unique_events), key=lambda x: x.get('startTimestamp', 0), reverse=True)}
-    _cache_put(_CACHE_MATCHES, team_id, result)
+    _CACHE.put("matches", team_id, result)
     return result
 
-async def get_pre_match_data(event_id: int, home_team_id: int, away_team_id: int) -> Dict[str, Any]:
-    cached = _cache_get(_CACHE_PRE_MATCH, (event_id, home_team_id, away_team_id), ttl_seconds=60)
+async def get_player_rankings(team_id: int) -> Dict[str, Any]:
+    cached = await _CACHE.get_async("rankings", team_id)
     if cached is not None:
         return cached
+    data = await fetch_rankings_via_page(team_id)
+    _CACHE.put("rankings", team_id, data)
+    return data
+
+def _years_to_fetch() -> List[int]:
     current_year = datetime.now().year
-    years_to_fetch = [current_year, current_year - 1, current_year - 2]
-    
-    async def get_rankings_cached(tid: int):
-        cached_r = _cache_get(_CACHE_RANKINGS, tid, ttl_seconds=300)
-        if cached_r is not None:
-            return cached_r
-        data = await fetch_rankings_via_page(tid)
-        _cache_put(_CACHE_RANKINGS, tid, data)
-        return data
+    return [current_year, current_year - 1, current_year - 2]
+
+def _until_midnight() -> float:
+    now = datetime.now()
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return max(60.0, (midnight - now).total_seconds())
+
+def _player_inputs_complete(player: Dict[str, Any]) -> bool:
+    # Hatalı/boş gelen veri gün boyu tutulmaz; alttaki kısa TTL'li cache'ler tekrar denemeyi sağlar
+    return (
+        "error" not in player["rankings"] and bool(player["matches"].get("events"))
+        and not player["yearly_stats"].get("fetch_errors")
+    )
 
-    tasks = {
-        "home_rankings": get_rankings_cached(home_team_id),
-        "home_matches": fetch_all_player_matches(home_team_id),
-        "home_yearly_stats": get_player_stats_for_years(home_team_id, years_to_fetch),
-        "away_rankings": get_rankings_cached(away_team_id),
-        "away_matches": fetch_all_player_matches(away_team_id),
-        "away_yearly_stats": get_player_stats_for_years(away_team_id, years_to_fetch),
-    }
-    results = await asyncio.gather(*tasks.values())
-    data_map = dict(zip(tasks.keys(), results))
+def _player_inputs_key(team_id: int) -> Tuple[int, str]:
+    return team_id, datetime.now().strftime("%Y-%m-%d")
+
+async def get_player_inputs(team_id: int) -> Dict[str, Any]:
+    """Oyuncunun maç öncesi penceresinde değişmeyen girdileri (sıralama, maç geçmişi, yıllık istatistik); gün boyu cache'li."""
+    key = _player_inputs_key(team_id)
+    cached = _CACHE.get("player_inputs", key)
+    if cached is not None:
+        return cached
+    rankings, matches, yearly_stats = await asyncio.gather(
+        get_player_rankings(team_id), fetch_all_player_matches(team_id), get_player_stats_for_years(team_id, _years_to_fetch())
+    )
+    result = {"rankings": rankings, "matches": matches, "yearly_stats": yearly_stats}
+    if _player_inputs_complete(result):
+        _CACHE.put("player_inputs", key, result, ttl=_until_midnight())
+    return result
 
-    home_data = {"rankings": data_map["home_rankings"], "matches": data_map["home_matches"], "yearly_stats": data_map["home_yearly_stats"]}
-    away_data = {"rankings": data_map["away_rankings"], "matches": data_map["away_matches"], "yearly_stats": data_map["away_yearly_stats"]}
+async def prefetch_players(team_ids: List[int]):
+    """Birden çok maçta geçen oyuncuların verisini her oyuncu için bir kez çekip cache'i ısıtır."""
+    unique_ids = list(dict.fromkeys(tid for tid in team_ids if tid))
+    await asyncio.gather(*[get_player_inputs(tid) for tid in unique_ids], return_exceptions=True)
 
+async def get_market_data(event_id: int, start_timestamp: Optional[int] = None) -> Dict[str, Any]:
+    """Maça kadar değişen girdiler (oylar, oranlar); her çağrıda taze çekilir."""
     vote_details = await fetch_all_event_details(event_id, ["votes", "odds/1/all"])
     match_details = dict(zip(["votes", "oddsAll"], vote_details))
+    if not match_details["oddsAll"].get("markets"):
+        # Maça özel oran endpoint'i boş/hatalıysa günün toplu oranlarından (O(1) indeks) doldur
+        bulk_market = await get_event_odds(event_id, event_date(event_id, start_timestamp))
+        if bulk_market:
+            match_details["oddsAll"] = {"markets": [bulk_market]}
+    return match_details
 
-    result = {"match_details": match_details, "home_player": home_data, "away_player": away_data}
-    _cache_put(_CACHE_PRE_MATCH, (event_id, home_team_id, away_team_id), result)
-    return result
-
-# --- Skor Hesaplama Fonksiyonu ---
-def calculate_metric_scores(data: Dict[str, Any], home_team_id: int, away_team_id: int, ground_type: str) -> tuple[Dict[str, float], Dict[str, float]]:
-    home_scores, away_scores = {}, {}
-
-    def aggregate_stats_for_surface(all_stats: List[Dict], surface: str) -> Dict:
-        surface_stats = [s for s in all_stats if s.get("groundType") == surface]
-        stats_to_aggregate = surface_stats if surface_stats else all_stats
-        if not stats_to_aggregate: return defaultdict(float)
-        
-        aggregated = defaultdict(float)
-        for stat_group in stats_to_aggregate:
-            for key, value in stat_group.items():
-                if isinstance(value, (int, float)): aggregated[key] += value
-        return aggregated
-
-    home_yearly = aggregate_stats_for_surface(data['home_player']['yearly_stats']['all_stats'], ground_type)
-    away_yearly = aggregate_stats_for_surface(data['away_player']['yearly_stats']['all_stats'], ground_type)
-
-    def calculate_score(home_val, away_val):
-        total = home_val + away_val
-        return (0.5, 0.5) if total <= 0 else (home_val / total, away_val / total)
+async def get_pre_match_data(event_id: int, home_team_id: int, away_team_id: int) -> Dict[str, Any]:
+    home_data, away_data, match_details = await asyncio.gather(
+        get_player_inputs(home_team_id), get_player_inputs(away_team_id), get_market_data(event_id)
+    )
+    return {"match_details": match_details, "home_player": home_data, "away_player": away_data}
+
+# --- Skor Hesaplama Fonksiyonları ---
+def _aggregate_stats_for_surface(all_stats: List[Dict], surface: str) -> Dict:
+    surface_stats = [s for s in all_stats if s.get("groundType") == surface]
+    stats_to_aggregate = surface_stats if surface_stats else all_stats
+    if not stats_to_aggregate: return defaultdict(float)
+
+    aggregated = defaultdict(float)
+    for stat_group in stats_to_aggregate:
+        for key, value in stat_group.items():
+            if isinstance(value, (int, float)): aggregated[key] += value
+    return aggregated
+
+def _match_format(event_info: Dict[str, Any]) -> Tuple[int, int]:
+    """(best_of, son set tiebreak hedefi). Beş setlik maçlar Grand Slam'dir; son sette 6-6'da 10 sayılık tiebreak oynanır."""
+    best_of = 5 if event_info.get("best_of") == 5 else 3
+    return best_of, 10 if best_of == 5 else 7
+
+def _serve_probs(home_yearly: Dict, away_yearly: Dict) -> Tuple[float, float]:
+    """Zemine göre toplanmış yıllık istatistiklerden eşleşmenin servis sayısı olasılıkları."""
+    return matchup_serve_probs(serve_point_prob(home_yearly), serve_point_prob(away_yearly))
+
+def _pair(home_val, away_val) -> Tuple[float, float]:
+    # Sayısal olmayan değerler burada hata verir; toplamı <= 0 olan çift 0.5 skora karşılık gelir
+    if home_val + away_val <= 0:
+        return 0.0, 0.0
+    return float(home_val), float(away_val)
+
+def extract_player_inputs(data: Dict[str, Any], home_team_id: int, away_team_id: int, ground_type: str) -> Dict[str, Dict]:
+    """
+    Oyuncu verisinden gelen (maç öncesi penceresinde değişmeyen) ham girdiler:
+    {"pairs": metrik -> (ev, deplasman), "ratios": metrik -> ((pay, payda), (pay, payda))}.
+    Hesaplanamayan çiftler (0, 0) olur ve 0.5 skora karşılık gelir.
+    """
+    pairs: Dict[str, Tuple[float, float]] = {}
+    home_yearly = _aggregate_stats_for_surface(data['home_player']['yearly_stats']['all_stats'], ground_type)
+    away_yearly = _aggregate_stats_for_surface(data['away_player']['yearly_stats']['all_stats'], ground_type)
 
     # Metrik hesaplamaları (servis, kritik anlar, hücum vb.)
     home_serve_power = (home_yearly.get('aces', 0) * 1.5 + home_yearly.get('firstServePointsScored', 0) - home_yearly.get('doubleFaults', 0) * 2)
     away_serve_power = (away_yearly.get('aces', 0) * 1.5 + away_yearly.get('firstServePointsScored', 0) - away_yearly.get('doubleFaults', 0) * 2)
-    home_scores['servis_hakimiyeti'], away_scores['servis_hakimiyeti'] = calculate_score(home_serve_power, away_serve_power)
+    pairs['servis_hakimiyeti'] = _pair(home_serve_power, away_serve_power)
 
     h_tiebreak_total = home_yearly.get('tiebreaksWon', 0) + home_yearly.get('tiebreakLosses', 0)
     a_tiebreak_total = away_yearly.get('tiebreaksWon', 0) + away_yearly.get('tiebreakLosses', 0)
@@ -209,11 +273,16 @@ def calculate_metric_scores(data: Dict[str, Any], home_team_id: int, away_team_i
     a_bp_ratio = away_yearly.get('breakPointsScored', 0) / (away_yearly.get('breakPointsTotal') or 1)
     home_clutch = (h_tiebreak_ratio + h_bp_ratio) / 2
     away_clutch = (a_tiebreak_ratio + a_bp_ratio) / 2
-    home_scores['kritik_anlar_puani'], away_scores['kritik_anlar_puani'] = calculate_score(home_clutch, away_clutch)
+    pairs['kritik_anlar_puani'] = _pair(home_clutch, away_clutch)
 
     home_attack_ratio = home_yearly.get('winnersTotal', 0) / (home_yearly.get('unforcedErrorsTotal') or 1)
     away_attack_ratio = away_yearly.get('winnersTotal', 0) / (away_yearly.get('unforcedErrorsTotal') or 1)
-    home_scores['hucum_puani'], away_scores['hucum_puani'] = calculate_score(home_attack_ratio, away_attack_ratio)
+    pairs['hucum_puani'] = _pair(home_attack_ratio, away_attack_ratio)
+
+    # Kesin Markov maç olasılığı (ızgara tablosundan okunur): skor = p / (p + 1 - p) = p
+    p_home_serve, p_away_serve = _serve_probs(home_yearly, away_yearly)
+    markov_home = lookup_match_win_prob(p_home_serve, p_away_serve, *_match_format(data))
+    pairs['markov'] = _pair(markov_home, 1.0 - markov_home)
 
     try:
         ranks = {}
@@ -223,117 +292,371 @@ def calculate_metric_scores(data: Dict[str, Any], home_team_id: int, away_team_i
             utr = next((r['ranking'] for r in player_ranks if r.get('rankingClass') == 'utr'), None)
             valid_ranks = [1/r for r in [official, utr] if r is not None and r > 0]
             ranks[player_key] = (sum(valid_ranks) / len(valid_ranks)) if valid_ranks else 0
-        home_scores['sıralama'], away_scores['sıralama'] = calculate_score(ranks.get('home', 0), ranks.get('away', 0))
-    except Exception: home_scores['sıralama'], away_scores['sıralama'] = 0.5, 0.5
+        pairs['sıralama'] = _pair(ranks.get('home', 0), ranks.get('away', 0))
+    except Exception: pairs['sıralama'] = (0.0, 0.0)
 
-    try:
-        pre_market = next(m for m in data['match_details']['oddsAll'].get('markets', []) if not m.get('isLive') and m.get('marketName') == 'Full time')
-        home_odds = fractional_to_decimal(next(c for c in pre_market['choices'] if c['name'] == '1').get('fractionalValue', "2.0"))
-        away_odds = fractional_to_decimal(next(c for c in pre_market['choices'] if c['name'] == '2').get('fractionalValue', "2.0"))
-        home_prob, away_prob = 1 / home_odds, 1 / away_odds
-        home_scores['oran'], away_scores['oran'] = calculate_score(home_prob, away_prob)
-    except Exception: home_scores['oran'], away_scores['oran'] = 0.5, 0.5
-
-    try:
-        votes = data['match_details']['votes'].get('vote', {})
-        home_scores['sentiment'], away_scores['sentiment'] = calculate_score(votes.get('vote1', 0), votes.get('vote2', 0))
-    except Exception: home_scores['sentiment'], away_scores['sentiment'] = 0.5, 0.5
-    
     all_matches_home = data['home_player'].get('matches', {}).get('events', [])
     all_matches_away = data['away_player'].get('matches', {}).get('events', [])
-    home_player_name = data.get('home_team_name', '')
-    away_player_name = data.get('away_team_name', '')
+
+    # Form, zemin, rakip kalitesi, tiebreak ve h2h oyuncu profillerinden okunur (güncel profil için O(1))
+    home_profile = get_player_profile(home_team_id, ground_type, all_matches_home)
+    away_profile = get_player_profile(away_team_id, ground_type, all_matches_away)
+    home_stats_all, away_stats_all = home_profile["stats"], away_profile["stats"]
 
     try:
-        surface_h2h_home_wins, surface_h2h_away_wins = 0, 0
-        for match in all_matches_home:
-            opponent_id, is_home_in_past_match = (None, None)
-            if str(match.get('homeTeam', {}).get('id')) == str(home_team_id):
-                opponent_id, is_home_in_past_match = str(match.get('awayTeam', {}).get('id')), True
-            elif str(match.get('awayTeam', {}).get('id')) == str(home_team_id):
-                opponent_id, is_home_in_past_match = str(match.get('homeTeam', {}).get('id')), False
-            
-            if opponent_id == str(away_team_id) and match.get('groundType') == ground_type:
-                winner_code = match.get('winnerCode')
-                if (is_home_in_past_match and winner_code == 1) or (not is_home_in_past_match and winner_code == 2):
-                    surface_h2h_home_wins += 1
-                else:
-                    surface_h2h_away_wins += 1
-        home_scores['h2h'], away_scores['h2h'] = calculate_score(surface_h2h_home_wins, surface_h2h_away_wins)
-    except Exception: home_scores['h2h'], away_scores['h2h'] = 0.5, 0.5
-
-    def get_stats_from_matches(matches: List[Dict], player_id: int, player_name: str, limit: Optional[int] = None):
-        if limit and len(matches) > limit: matches = matches[:limit]
-        stats = defaultdict(float)
-        player_last_name = player_name.split(' ')[-1].lower() if player_name else ''
-        for event in matches:
-            stats['total'] += 1
-            winner_code = event.get('winnerCode')
-            is_home = (event.get('homeTeam', {}).get('id') == player_id)
-            is_away = (event.get('awayTeam', {}).get('id') == player_id)
-            is_winner = (is_home and winner_code == 1) or (is_away and winner_code == 2)
-            if is_winner:
-                stats['wins'] += 1
-                opponent = event.get('awayTeam') if is_home else event.get('homeTeam')
-                opponent_rank = opponent.get('ranking', 1000)
-                if opponent_rank and opponent_rank > 0:
-                    stats['quality_score'] += 1000 / opponent_rank
-                    stats['quality_wins'] += 1
-            if event.get('groundType') == ground_type:
-                stats['surface_total'] += 1
-                if is_winner: stats['surface_wins'] += 1
-            for i in range(1, 6):
-                tb_key = f'period{i}TieBreak'
-                if tb_key in event.get('homeScore', {}) and tb_key in event.get('awayScore', {}):
-                    stats['tb_played'] += 1
-                    home_tb, away_tb = event['homeScore'][tb_key], event['awayScore'][tb_key]
-                    if (is_home and home_tb > away_tb) or (is_away and away_tb > home_tb):
-                        stats['tb_wins'] += 1
-        return stats
-
-    home_stats_all = get_stats_from_matches(all_matches_home, home_team_id, home_player_name)
-    away_stats_all = get_stats_from_matches(all_matches_away, away_team_id, away_player_name)
-    home_stats_last10 = get_stats_from_matches(all_matches_home, home_team_id, home_player_name, limit=10)
-    away_stats_last10 = get_stats_from_matches(all_matches_away, away_team_id, away_player_name, limit=10)
-
-    home_scores['genel_form'] = home_stats_all['wins'] / home_stats_all['total'] if home_stats_all['total'] > 0 else 0.5
-    away_scores['genel_form'] = away_stats_all['wins'] / away_stats_all['total'] if away_stats_all['total'] > 0 else 0.5
-    home_scores['son_10_mac_formu'] = home_stats_last10['wins'] / home_stats_last10['total'] if home_stats_last10['total'] > 0 else 0.5
-    away_scores['son_10_mac_formu'] = away_stats_last10['wins'] / away_stats_last10['total'] if away_stats_last10['total'] > 0 else 0.5
-    home_scores['yuzey_formu'] = home_stats_all['surface_wins'] / home_stats_all['surface_total'] if home_stats_all['surface_total'] > 0 else 0.5
-    away_scores['yuzey_formu'] = away_stats_all['surface_wins'] / away_stats_all['surface_total'] if away_stats_all['surface_total'] > 0 else 0.5
+        pairs['h2h'] = _pair(*h2h_record(home_profile, away_team_id))
+    except Exception: pairs['h2h'] = (0.0, 0.0)
+
     home_quality_avg = home_stats_all['quality_score'] / home_stats_all['quality_wins'] if home_stats_all['quality_wins'] > 0 else 1
     away_quality_avg = away_stats_all['quality_score'] / away_stats_all['quality_wins'] if away_stats_all['quality_wins'] > 0 else 1
-    home_scores['rakip_kalitesi'], away_scores['rakip_kalitesi'] = calculate_score(home_quality_avg, away_quality_avg)
-    home_scores['tiebreak_psikolojisi'] = home_stats_all['tb_wins'] / home_stats_all['tb_played'] if home_stats_all['tb_played'] > 0 else 0.5
-    away_scores['tiebreak_psikolojisi'] = away_stats_all['tb_wins'] / away_stats_all['tb_played'] if away_stats_all['tb_played'] > 0 else 0.5
+    pairs['rakip_kalitesi'] = _pair(home_quality_avg, away_quality_avg)
+
+    def ratio(stats: Dict, num: str, den: str) -> Tuple[float, float]:
+        return stats[num], stats[den]
+
+    ratios = {
+        'genel_form': (ratio(home_stats_all, 'wins', 'total'), ratio(away_stats_all, 'wins', 'total')),
+        'son_10_mac_formu': (recent_form(home_profile), recent_form(away_profile)),
+        'yuzey_formu': (ratio(home_stats_all, 'surface_wins', 'surface_total'), ratio(away_stats_all, 'surface_wins', 'surface_total')),
+        'tiebreak_psikolojisi': (ratio(home_stats_all, 'tb_wins', 'tb_played'), ratio(away_stats_all, 'tb_wins', 'tb_played')),
+    }
+    # Profil sürümleri (son işlenen maç, maç sayısı) tahmin parmak izine girer
+    versions = {
+        "home": [home_profile["latest_event_id"], home_profile["matches"]],
+        "away": [away_profile["latest_event_id"], away_profile["matches"]],
+    }
+    return {"pairs": pairs, "ratios": ratios, "versions": versions}
+
+def extract_market_inputs(match_details: Dict[str, Any]) -> Dict[str, Tuple[float, float]]:
+    """Oran ve oy (sentiment) çiftleri; maç başlayana kadar değişen tek girdiler bunlardır."""
+    pairs: Dict[str, Tuple[float, float]] = {}
+    try:
+        pre_market = next(m for m in match_details['oddsAll'].get('markets', []) if not m.get('isLive') and m.get('marketName') == 'Full time')
+        home_odds = fractional_to_decimal(next(c for c in pre_market['choices'] if c['name'] == '1').get('fractionalValue', "2.0"))
+        away_odds = fractional_to_decimal(next(c for c in pre_market['choices'] if c['name'] == '2').get('fractionalValue', "2.0"))
+        pairs['oran'] = _pair(1 / home_odds, 1 / away_odds)
+    except Exception: pairs['oran'] = (0.0, 0.0)
+
+    try:
+        votes = match_details['votes'].get('vote', {})
+        pairs['sentiment'] = _pair(votes.get('vote1', 0), votes.get('vote2', 0))
+    except Exception: pairs['sentiment'] = (0.0, 0.0)
+
+    return pairs
+
+def combine_inputs(player_inputs: Dict[str, Dict], market_pairs: Dict[str, Tuple[float, float]]) -> MetricInputs:
+    """Sabit oyuncu girdileri ile piyasa girdilerini batch skorlayıcının beklediği sıraya dizer."""
+    pairs = {**player_inputs["pairs"], **market_pairs}
+    return [pairs[name] for name in PAIR_METRICS], [player_inputs["ratios"][name] for name in RATIO_METRICS]
+
+def extract_metric_inputs(data: Dict[str, Any], home_team_id: int, away_team_id: int, ground_type: str) -> MetricInputs:
+    """
+    Bir maçın ham metrik girdileri: PAIR_METRICS sırasıyla (ev, deplasman) değer çiftleri ve
+    RATIO_METRICS sırasıyla oyuncu başına (pay, payda). Skorlar app.batch_scoring'de vektörel hesaplanır.
+    """
+    return combine_inputs(
+        extract_player_inputs(data, home_team_id, away_team_id, ground_type),
+        extract_market_inputs(data['match_details']),
+    )
+
+# Çıkarılan girdilerin biçimi değiştiğinde artırılır; diskteki eski kayıtlar anahtar farkıyla devre dışı kalır
+STABLE_INPUTS_VERSION = 2
+
+async def get_stable_inputs(event_info: Dict[str, Any]) -> Dict[str, Dict]:
+    """Oyuncu çifti + zemin için çıkarılmış sabit girdiler; gün boyu cache'li, tekrar skorlamada yeniden hesaplanmaz."""
+    home_team_id, away_team_id, ground_type = event_info["home_team_id"], event_info["away_team_id"], event_info["ground_type"]
+    key = (STABLE_INPUTS_VERSION, home_team_id, away_team_id, ground_type, _match_format(event_info)[0], datetime.now().strftime("%Y-%m-%d"))
+    cached = await _CACHE.get_async("stable_inputs", key)
+    if cached is not None:
+        return cached
+    home_data, away_data, _ = await asyncio.gather(
+        get_player_inputs(home_team_id), get_player_inputs(away_team_id),
+        preload_profiles(ground_type, [home_team_id, away_team_id]),
+    )
+    data = {**event_info, "home_player": home_data, "away_player": away_data}
+    result = extract_player_inputs(data, home_team_id, away_team_id, ground_type)
+    if _player_inputs_complete(home_data) and _player_inputs_complete(away_data):
+        _CACHE.put("stable_inputs", key, result, ttl=_until_midnight())
+    return result
+
+def score_matches(inputs: List[MetricInputs]) -> List[Dict[str, Any]]:
+    """Birden çok maçın metrik skorlarını ve TGS olasılıklarını tek vektörel geçişte hesaplar."""
+    return score_batch(inputs, WEIGHTS)
+
+def calculate_metric_scores(data: Dict[str, Any], home_team_id: int, away_team_id: int, ground_type: str) -> tuple[Dict[str, float], Dict[str, float]]:
+    scored = score_matches([extract_metric_inputs(data, home_team_id, away_team_id, ground_type)])[0]
+    return scored["home"], scored["away"]
+
+# --- Ana Çağrılabilir Fonksiyonlar ---
+# --- Girdi parmak izi ile tahmin memoization'ı ---
+# Aynı girdilerle (oran, oy, profil sürümleri, oyuncu girdileri, ağırlıklar) tekrar hesaplama yapılmaz;
+# değişiklik varsa hangi girdilerin değiştiği sonuca yazılır.
+MEMO_MAX_EVENTS = 5000
+_MEMO: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+_MEMO_COUNTERS = {"hits": 0, "misses": 0}
+
+def _digest(value: Any) -> str:
+    return hashlib.sha1(json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+def input_fingerprint(stable: Dict[str, Dict], market_pairs: Dict[str, Tuple[float, float]]) -> Dict[str, Any]:
+    components = {
+        "odds": _digest(market_pairs["oran"]),
+        "votes": _digest(market_pairs["sentiment"]),
+        "profiles": _digest(stable.get("versions")),
+        "player_stats": _digest([stable["pairs"], stable["ratios"]]),
+        "weights": _digest(WEIGHTS),
+    }
+    return {"hash": _digest(components), "components": components}
+
+def _memo_lookup(event_id: int, fingerprint: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """(aynı parmak izli önceki sonuç | None, değişen girdiler)."""
+    previous = _MEMO.get(event_id)
+    if previous is None:
+        _MEMO_COUNTERS["misses"] += 1
+        return None, sorted(fingerprint["components"])
+    old = previous["fingerprint"]
+    if old["hash"] == fingerprint["hash"]:
+        _MEMO.move_to_end(event_id)
+        _MEMO_COUNTERS["hits"] += 1
+        return {**previous, "changed_inputs": []}, []
+    _MEMO_COUNTERS["misses"] += 1
+    return None, sorted(k for k, v in fingerprint["components"].items() if old["components"].get(k) != v)
+
+def _memo_store(event_id: int, result: Dict[str, Any]):
+    _MEMO[event_id] = result
+    _MEMO.move_to_end(event_id)
+    while len(_MEMO) > MEMO_MAX_EVENTS:
+        _MEMO.popitem(last=False)
+
+def memo_stats() -> Dict[str, int]:
+    return {"size": len(_MEMO), **_MEMO_COUNTERS}
+
+async def _assemble_match(event_id: int, event_info: Optional[Dict[str, Any]]) -> Tuple[Optional[Dict[str, Any]], Any]:
+    """(event_info, (metrik girdileri, parmak izi)) ya da maç bulunamazsa (None, hata sözlüğü)."""
+    if not event_info or not all(key in event_info for key in ["home_team_id", "away_team_id"]):
+        return None, {"error": f"{event_id} ID'li maç detayı bulunamadı."}
+
+    # Tekrar skorlamada sabit girdiler cache'ten gelir; sadece oylar ve oranlar çekilir
+    stable, match_details = await asyncio.gather(get_stable_inputs(event_info), get_market_data(event_id, event_info.get("start_timestamp")))
+    market_pairs = extract_market_inputs(match_details)
+    return event_info, (combine_inputs(stable, market_pairs), input_fingerprint(stable, market_pairs))
 
-    return home_scores, away_scores
+def _prediction_result(event_id: int, event_info: Dict[str, Any], scored: Dict[str, Any],
+                       fingerprint: Dict[str, Any], changed: List[str]) -> Dict[str, Any]:
+    result = {
+        "home_player_name": event_info["home_team_name"],
+        "away_player_name": event_info["away_team_name"],
+        "home_win_prob": scored["home_win_prob"],
+        "away_win_prob": scored["away_win_prob"],
+        "scores": {"home": scored["home"], "away": scored["away"]},
+        # Ağırlığı 0 olan metrikler (ör. varsayılan MARKOV_WEIGHT) TGS'ye girmez; skorları yine döner
+        "weights": {key: weight for key, weight in WEIGHTS.items() if weight},
+        "fingerprint": fingerprint,
+        "changed_inputs": changed,
+    }
+    _memo_store(event_id, result)
+    return result
+
+def _score_assembled(items: List[Tuple[int, Dict[str, Any], Any]]) -> List[Dict[str, Any]]:
+    """Birleştirilmiş maçları skorlar; parmak izi değişmeyenler memo'dan gelir, kalanlar tek vektörel geçişte."""
+    results: List[Optional[Dict[str, Any]]] = []
+    pending = []
+    for index, (event_id, event_info, (inputs, fingerprint)) in enumerate(items):
+        memoized, changed = _memo_lookup(event_id, fingerprint)
+        results.append(memoized)
+        if memoized is None:
+            pending.append((index, event_id, event_info, inputs, fingerprint, changed))
+    scored = score_matches([p[3] for p in pending])
+    for (index, event_id, event_info, _inputs, fingerprint, changed), match_scores in zip(pending, scored):
+        results[index] = _prediction_result(event_id, event_info, match_scores, fingerprint, changed)
+    return results
 
-# --- Ana Çağrılabilir Fonksiyon ---
 async def get_match_prediction(event_id: int) -> Dict[str, Any]:
     """Ana tahmin fonksiyonu: Tüm verileri toplar, hesaplar ve sonucu döndürür."""
-    
-    # Fonksiyona parametre olarak gelen event_id'nin kullanıldığından emin olun.
+    event_info, assembled = await _assemble_match(event_id, await get_event_details(event_id))
+    if event_info is None:
+        return assembled
+    return _score_assembled([(event_id, event_info, assembled)])[0]
+
+def _batch_error(event_id: int, exc: BaseException) -> Dict[str, Any]:
+    return {"error": f"{event_id} ID'li maç için tahmin hesaplanamadı.", "detail": str(exc)}
+
+async def _prepare_batch(event_ids: List[int]) -> List[Any]:
+    # Maç detayları indeksten (eksikler tek maç endpoint'inden), tekil oyuncu verileri bir kez çekilir
+    infos = await asyncio.gather(*[get_event_details(eid) for eid in event_ids], return_exceptions=True)
+    await prefetch_players([
+        info.get(key) for info in infos if isinstance(info, dict) for key in ("home_team_id", "away_team_id")
+    ])
+    return infos
+
+async def get_match_predictions(event_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """
+    Birden çok maçın tahmini: ortak veriler (program, oyuncular, toplu oranlar) tekrar çekilmez,
+    tüm maçlar tek vektörel geçişte skorlanır. Bulunamayan/hatalı maçlar için {"error": ...} döner.
+    """
+    event_ids = list(dict.fromkeys(event_ids))
+    infos = await _prepare_batch(event_ids)
+
+    async def assemble(eid: int, info: Any):
+        if isinstance(info, BaseException):
+            raise info
+        return await _assemble_match(eid, info)
+
+    assembled = await asyncio.gather(*[assemble(eid, info) for eid, info in zip(event_ids, infos)], return_exceptions=True)
+
+    results: Dict[int, Dict[str, Any]] = {}
+    ready = []
+    for eid, item in zip(event_ids, assembled):
+        if isinstance(item, BaseException):
+            results[eid] = _batch_error(eid, item)
+        elif item[0] is None:
+            results[eid] = item[1]
+        else:
+            ready.append((eid, item[0], item[1]))
+    for (eid, _info, _assembled), result in zip(ready, _score_assembled(ready)):
+        results[eid] = result
+    return {eid: results[eid] for eid in event_ids}
+
+async def iter_match_predictions(event_ids: List[int]) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """get_match_predictions gibi, ancak her maçın sonucu hazır oldukça (event_id, tahmin) olarak verilir."""
+    event_ids = list(dict.fromkeys(event_ids))
+    infos = await _prepare_batch(event_ids)
+
+    async def one(eid: int, info: Any):
+        try:
+            if isinstance(info, BaseException):
+                raise info
+            event_info, assembled = await _assemble_match(eid, info)
+            if event_info is None:
+                return eid, assembled
+            return eid, _score_assembled([(eid, event_info, assembled)])[0]
+        except Exception as e:
+            return eid, _batch_error(eid, e)
+
+    for next_done in asyncio.as_completed([one(eid, info) for eid, info in zip(event_ids, infos)]):
+        yield await next_done
+
+# --- Simülasyon ve Markov motorları ---
+async def _serve_model_inputs(event_id: int) -> Tuple[Dict[str, Any], Optional[Tuple[float, float]]]:
+    """(event_info, (p_home, p_away)) ya da maç bulunamazsa (hata sözlüğü, None)."""
     event_info = await get_event_details(event_id)
     if not event_info or not all(key in event_info for key in ["home_team_id", "away_team_id"]):
-        return {"error": f"{event_id} ID'li maç detayı bulunamadı."}
+        return {"error": f"{event_id} ID'li maç detayı bulunamadı."}, None
+    return event_info, await get_serve_probs(event_info)
+
+async def _serve_yearly_stats(team_id: int) -> Dict[str, List]:
+    """
+    Servis olasılığı sadece yıllık istatistiklerden hesaplanır: oyuncunun günlük girdileri zaten cache'teyse
+    oradan, yoksa yıl cache'lerinden okunur (maç geçmişi ve sıralama çekilmez). Çekilemeyen yıllar boş kalır,
+    serve_point_prob o durumda tur ortalamasına döner.
+    """
+    cached = _CACHE.get("player_inputs", _player_inputs_key(team_id))
+    if cached is not None:
+        return cached["yearly_stats"]
+    return await get_player_stats_for_years(team_id, _years_to_fetch())
 
-    all_data = {**event_info, **await get_pre_match_data(event_id, event_info["home_team_id"], event_info["away_team_id"])}
-    
-    home_scores, away_scores = calculate_metric_scores(all_data, event_info["home_team_id"], event_info["away_team_id"], event_info["ground_type"])
+async def get_serve_probs(event_info: Dict[str, Any]) -> Tuple[float, float]:
+    """Maçın servis sayısı olasılıkları; yıllık istatistikler cache'li olduğundan tekrar çağrı ucuzdur."""
+    home_stats, away_stats = await asyncio.gather(
+        _serve_yearly_stats(event_info["home_team_id"]), _serve_yearly_stats(event_info["away_team_id"])
+    )
+    ground_type = event_info["ground_type"]
+    return _serve_probs(
+        _aggregate_stats_for_surface(home_stats["all_stats"], ground_type),
+        _aggregate_stats_for_surface(away_stats["all_stats"], ground_type),
+    )
 
-    home_tgs = sum(WEIGHTS[key] * home_scores.get(key, 0.5) for key in WEIGHTS)
-    away_tgs = sum(WEIGHTS[key] * away_scores.get(key, 0.5) for key in WEIGHTS)
-    total_tgs = home_tgs + away_tgs
-    home_prior = home_tgs / total_tgs if total_tgs > 0 else 0.5
-    away_prior = away_tgs / total_tgs if total_tgs > 0 else 0.5
+def _markov_summary(p_home: float, p_away: float, best_of: int, final_set_tiebreak: int) -> Dict[str, Any]:
+    exact = match_distribution(p_home, p_away, best_of, final_set_tiebreak, with_games=True)
+    return {
+        "home_win_prob": exact["home_win_prob"],
+        "away_win_prob": 1.0 - exact["home_win_prob"],
+        "set_scores": exact["set_scores"],
+        "total_games": exact["total_games"],
+        "expected_total_games": exact["expected_total_games"],
+        "hold_probs": exact["hold_probs"],
+    }
+
+async def get_markov_prediction(event_id: int) -> Dict[str, Any]:
+    """Servis sayısı olasılıklarından kesin Markov zinciri tahmini (kazanma, set skoru, toplam oyun dağılımı)."""
+    event_info, serve_probs = await _serve_model_inputs(event_id)
+    if serve_probs is None:
+        return event_info
+    best_of, final_set_tiebreak = _match_format(event_info)
+    return {
+        "engine": "markov",
+        "home_player_name": event_info["home_team_name"],
+        "away_player_name": event_info["away_team_name"],
+        "serve_point_probs": {"home": serve_probs[0], "away": serve_probs[1]},
+        **_markov_summary(*serve_probs, best_of, final_set_tiebreak),
+        "best_of": best_of,
+        "final_set_tiebreak": final_set_tiebreak,
+    }
 
+async def get_simulation_prediction(event_id: int, simulations: int = DEFAULT_SIMULATIONS) -> Dict[str, Any]:
+    """
+    Sayı -> oyun -> set -> maç Monte Carlo tahmini. Servis sayısı olasılıkları, TGS ile aynı
+    (zemine göre toplanmış) yıllık istatistiklerden gelir. Set skoru ve toplam oyun dağılımı da döner.
+    """
+    event_info, serve_probs = await _serve_model_inputs(event_id)
+    if serve_probs is None:
+        return event_info
+    p_home, p_away = serve_probs
+    best_of, final_set_tiebreak = _match_format(event_info)
+
+    key = (event_id, round(p_home, 6), round(p_away, 6), best_of, simulations)
+    sim = _CACHE.get("simulation", key)
+    if sim is None:
+        # Simülasyon CPU'da ~30 ms sürer; event loop'u bloklamamak için thread'de koşar
+        sim = await asyncio.to_thread(
+            simulate_match, p_home, p_away, best_of, final_set_tiebreak, simulations, event_id
+        )
+        _CACHE.put("simulation", key, sim)
     return {
+        "engine": "simulation",
         "home_player_name": event_info["home_team_name"],
         "away_player_name": event_info["away_team_name"],
-        "home_win_prob": home_prior,
-        "away_win_prob": away_prior,
-        "scores": {"home": home_scores, "away": away_scores},
-        "weights": WEIGHTS
-    }
\ No newline at end of file
+        "serve_point_probs": {"home": p_home, "away": p_away},
+        **sim,
+        # Aynı girdilerle kesin sonuç: simülasyon hatası doğrudan görülebilir
+        "markov": _markov_summary(p_home, p_away, best_of, final_set_tiebreak),
+    }
+
+# --- Canlı kazanma olasılığı ---
+async def get_live_win_probabilities(events: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    """
+    Canlı maçların anlık skorundan kazanma olasılıkları (app.inplay tablosundan tek okuma).
+    Servis sayısı olasılıkları maç öncesi modelle aynı yıllık istatistiklerden gelir; maç geçmişi ve sıralama çekilmez.
+    """
+    results: Dict[int, Dict[str, Any]] = {}
+    live = []
+    order = []
+    for event in events:
+        if not isinstance(event, dict) or not event.get("id"):
+            continue
+        order.append(event["id"])
+        info, state = event_summary(event), live_score_state(event)
+        if state is None or not info["home_team_id"] or not info["away_team_id"]:
+            results[event["id"]] = {"error": "Canlı skor okunamadı."}
+            continue
+        live.append((event["id"], info, state))
+    serve_probs = await asyncio.gather(*[get_serve_probs(info) for _eid, info, _state in live], return_exceptions=True)
+    for (eid, info, state), probs in zip(live, serve_probs):
+        if isinstance(probs, BaseException):
+            results[eid] = _batch_error(eid, probs)
+            continue
+        try:
+            home_prob = live_win_prob(state, *probs)
+        except Exception as e:
+            # Tek bir maçın okunamayan durumu tüm listeyi düşürmez
+            results[eid] = _batch_error(eid, e)
+            continue
+        results[eid] = {
+            "home_player_name": info["home_team_name"],
+            "away_player_name": info["away_team_name"],
+            "home_win_prob": home_prob,
+            "away_win_prob": 1.0 - home_prob,
+            "serve_point_probs": {"home": probs[0], "away": probs[1]},
+            "state": state,
+        }
+    return {eid: results[eid] for eid in order}
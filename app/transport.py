@@ -0,0 +1,387 @@
+# app/transport.py
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from app.browser_pool import get_browser_pool
+from app.ratelimit import get_governor
+
+try:
+    import h2  # noqa: F401  (httpx[http2])
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+logger = logging.getLogger("transport")
+logger.setLevel(logging.INFO)
+
+# Tek URL ve çoklu URL için sayfa içi fetch. Her URL'nin kendi timeout'u vardır;
+# sonuçlar girdi sırasıyla {"status", "data"} ya da {"status", "error"} olarak döner.
+_FETCH_JSON_BATCH_JS = """async ([urls, timeoutMs]) => {
+    const one = async (url) => {
+        const ctrl = new AbortController();
+        const timer = setTimeout(() => ctrl.abort(), timeoutMs);
+        try {
+            const r = await fetch(url, { signal: ctrl.signal });
+            const text = await r.text();
+            try {
+                return { status: r.status, data: JSON.parse(text) };
+            } catch (e) {
+                return { status: r.status, error: "invalid json" };
+            }
+        } finally {
+            clearTimeout(timer);
+        }
+    };
+    const settled = await Promise.allSettled(urls.map(one));
+    return settled.map((s) => s.status === "fulfilled"
+        ? s.value
+        : { status: 0, error: (s.reason && s.reason.name === "AbortError") ? "timeout" : String((s.reason && s.reason.message) || s.reason) });
+}"""
+
+# Bu durum kodları upstream'in bizi engellediğini / kısıtladığını gösterir
+BLOCKED_STATUSES = (403, 429)
+
+
+class UpstreamResponse:
+    __slots__ = ("url", "status", "data", "error", "transport")
+
+    def __init__(self, url: str, status: int = 0, data: Any = None, error: Optional[str] = None, transport: str = ""):
+        self.url = url
+        self.status = status
+        self.data = data
+        self.error = error
+        self.transport = transport
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def blocked(self) -> bool:
+        """403/429 ya da JSON yerine boş/HTML gövde: engellenmiş sayılır."""
+        return self.status in BLOCKED_STATUSES or (self.error is not None and self.error.startswith("invalid json"))
+
+    @property
+    def empty(self) -> bool:
+        """200 döndüğü halde gövde boş JSON ({} / null): upstream'in yumuşak kısıtlama işareti."""
+        return self.ok and self.status == 200 and self.data in (None, {}, [])
+
+
+class BrowserTransport:
+    """JSON çağrılarını havuzdaki ısıtılmış Chromium sayfaları içinden yapar."""
+    name = "browser"
+    uses_browser = True
+    rate_limited = True
+
+    async def fetch_many(self, urls: List[str], timeout_sec: int = 20) -> List[UpstreamResponse]:
+        if not urls:
+            return []
+        try:
+            async with get_browser_pool().page(timeout_sec) as page:
+                raw = await page.evaluate(_FETCH_JSON_BATCH_JS, [urls, timeout_sec * 1000])
+        except Exception as e:
+            return [UpstreamResponse(u, 0, error=str(e), transport=self.name) for u in urls]
+        return [
+            UpstreamResponse(u, r.get("status", 0), r.get("data"), r.get("error"), transport=self.name)
+            for u, r in zip(urls, raw)
+        ]
+
+    async def fetch(self, url: str, timeout_sec: int = 20) -> UpstreamResponse:
+        return (await self.fetch_many([url], timeout_sec))[0]
+
+    async def close(self):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"name": self.name}
+
+
+class HttpxTransport:
+    """
+    Hızlı yol: cookie ve header'lar Playwright'tan bir kez alınır, JSON çağrıları
+    keep-alive + HTTP/2 destekli tek bir httpx.AsyncClient ile yapılır.
+    Upstream engellediğinde (403/429/boş gövde) istek tarayıcıya düşer ve
+    `cooldown_sec` boyunca tüm çağrılar tarayıcıdan gider; sonra cookie'ler yenilenir.
+    """
+    name = "httpx"
+    uses_browser = True
+    rate_limited = True
+
+    def __init__(self, fallback: BrowserTransport, cooldown_sec: float = 120.0, max_connections: int = 20):
+        self.fallback = fallback
+        self.cooldown_sec = cooldown_sec
+        self.max_connections = max_connections
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._bootstrap_lock: Optional[asyncio.Lock] = None
+        self._needs_bootstrap = True
+        self._blocked_until = 0.0
+        self.counters = {"fast": 0, "fallback": 0, "blocked": 0, "bootstraps": 0}
+
+    async def _bootstrap(self):
+        """Tarayıcı oturumundan cookie + User-Agent alıp client'ı (yeniden) kurar."""
+        headers = {
+            "Accept": "application/json, text/plain, */*",
+            "Referer": "https://www.sofascore.com/",
+            "Origin": "https://www.sofascore.com",
+        }
+        cookies = httpx.Cookies()
+        try:
+            async with get_browser_pool().page() as page:
+                headers["User-Agent"] = await page.evaluate("() => navigator.userAgent")
+                for c in await page.context.cookies():
+                    cookies.set(c["name"], c["value"], domain=c.get("domain", ""), path=c.get("path", "/"))
+        except Exception as e:
+            # Cookie alınamazsa da hızlı yolu deneriz; engellenirse tarayıcıya düşülür
+            logger.warning("httpx bootstrap için tarayıcı oturumu alınamadı: %s", e)
+            headers.setdefault("User-Agent", "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/128.0 Safari/537.36")
+        old = self._client
+        self._client = httpx.AsyncClient(
+            http2=_HTTP2_AVAILABLE,
+            headers=headers,
+            cookies=cookies,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections, keepalive_expiry=60),
+        )
+        self._needs_bootstrap = False
+        self.counters["bootstraps"] += 1
+        if old is not None:
+            try:
+                await old.aclose()
+            except Exception:
+                pass
+
+    async def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client_loop is not loop:
+            # Client başka bir event loop'a bağlı (ör. script'te ikinci asyncio.run)
+            self._client_loop = loop
+            self._bootstrap_lock = asyncio.Lock()
+            self._client, self._needs_bootstrap = None, True
+        if not self._needs_bootstrap:
+            return self._client
+        async with self._bootstrap_lock:
+            if self._needs_bootstrap:
+                await self._bootstrap()
+        return self._client
+
+    def _fast_path_open(self) -> bool:
+        return asyncio.get_running_loop().time() >= self._blocked_until
+
+    async def _fetch_fast(self, url: str, timeout_sec: int) -> UpstreamResponse:
+        client = await self._get_client()
+        try:
+            r = await client.get(url, timeout=timeout_sec)
+        except Exception as e:
+            return UpstreamResponse(url, 0, error=f"{type(e).__name__}: {e}", transport=self.name)
+        if r.status_code in BLOCKED_STATUSES:
+            return UpstreamResponse(url, r.status_code, error=f"blocked ({r.status_code})", transport=self.name)
+        try:
+            data = r.json()
+        except ValueError:
+            return UpstreamResponse(url, r.status_code, error="invalid json", transport=self.name)
+        return UpstreamResponse(url, r.status_code, data, transport=self.name)
+
+    async def _on_blocked(self, resp: UpstreamResponse):
+        loop_time = asyncio.get_running_loop().time()
+        if loop_time >= self._blocked_until:
+            logger.warning("httpx hızlı yolu engellendi (%s, %s); %ss tarayıcıya düşülüyor.", resp.status, resp.url, self.cooldown_sec)
+            self._blocked_until = loop_time + self.cooldown_sec
+            # Bekleme bitince taze cookie'lerle yeniden kurulsun
+            self._needs_bootstrap = True
+        self.counters["blocked"] += 1
+
+    async def fetch(self, url: str, timeout_sec: int = 20) -> UpstreamResponse:
+        if self._fast_path_open():
+            resp = await self._fetch_fast(url, timeout_sec)
+            if not resp.blocked:
+                self.counters["fast"] += 1
+                return resp
+            # Collector sadece tarayıcıdan gelen son yanıtı görür; tarayıcıya düşmeye sebep olan
+            # 403/429 governor'a burada bildirilir (AIMD yavaşlama + duraklatma)
+            get_governor().observe([resp])
+            await self._on_blocked(resp)
+        self.counters["fallback"] += 1
+        return await self.fallback.fetch(url, timeout_sec)
+
+    async def fetch_many(self, urls: List[str], timeout_sec: int = 20) -> List[UpstreamResponse]:
+        if not self._fast_path_open():
+            self.counters["fallback"] += len(urls)
+            return await self.fallback.fetch_many(urls, timeout_sec)
+        results = list(await asyncio.gather(*[self._fetch_fast(u, timeout_sec) for u in urls]))
+        blocked_idx = [i for i, r in enumerate(results) if r.blocked]
+        self.counters["fast"] += len(urls) - len(blocked_idx)
+        if blocked_idx:
+            get_governor().observe([results[i] for i in blocked_idx])
+            await self._on_blocked(results[blocked_idx[0]])
+            self.counters["fallback"] += len(blocked_idx)
+            retried = await self.fallback.fetch_many([urls[i] for i in blocked_idx], timeout_sec)
+            for i, r in zip(blocked_idx, retried):
+                results[i] = r
+        return results
+
+    async def close(self):
+        if self._client is not None and self._client_loop is asyncio.get_running_loop():
+            await self._client.aclose()
+        self._client = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"name": self.name, "http2": _HTTP2_AVAILABLE, **self.counters}
+
+
+BASE_DIR = Path(__file__).resolve().parent
+DEFAULT_FIXTURE_DIR = BASE_DIR.parent / "data" / "fixtures"
+
+
+class FixtureStore:
+    """URL başına bir gzip'li JSON dosyası: data/fixtures/<sha1(url)>.json.gz"""
+
+    def __init__(self, directory: Path = DEFAULT_FIXTURE_DIR):
+        self.directory = Path(directory)
+        # Açılmış (decompress edilmiş) metinler; her okumada yeniden parse edilir ki
+        # çağıranların değiştirdiği nesneler kayda sızmasın
+        self._memory: Dict[str, Optional[str]] = {}
+
+    def path_for(self, url: str) -> Path:
+        return self.directory / f"{hashlib.sha1(url.encode('utf-8')).hexdigest()}.json.gz"
+
+    def load(self, url: str) -> Optional[Dict[str, Any]]:
+        if url not in self._memory:
+            p = self.path_for(url)
+            text = None
+            if p.exists():
+                try:
+                    with gzip.open(p, "rt", encoding="utf-8") as f:
+                        text = f.read()
+                except Exception as e:
+                    logger.warning("fixture okunamadı (%s): %s", p.name, e)
+            self._memory[url] = text
+        text = self._memory[url]
+        return json.loads(text) if text is not None else None
+
+    def save(self, url: str, status: int, data: Any):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        text = json.dumps({"url": url, "status": status, "data": data, "recorded_at": int(time.time())},
+                          ensure_ascii=False, separators=(",", ":"))
+        p = self.path_for(url)
+        tmp = p.with_name(p.name + ".tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            f.write(text)
+        tmp.replace(p)
+        self._memory[url] = text
+
+
+class RecordingTransport:
+    """Gerçek transport'u kullanır ve her başarılı yanıtı URL anahtarıyla fixture deposuna yazar."""
+    name = "record"
+
+    def __init__(self, inner, store: FixtureStore):
+        self.inner = inner
+        self.store = store
+        self.uses_browser = inner.uses_browser
+        self.rate_limited = inner.rate_limited
+        self.recorded = 0
+
+    async def _record(self, responses: List[UpstreamResponse]):
+        for r in responses:
+            if r.ok:
+                try:
+                    await asyncio.to_thread(self.store.save, r.url, r.status, r.data)
+                    self.recorded += 1
+                except Exception as e:
+                    logger.warning("fixture yazılamadı (%s): %s", r.url, e)
+
+    async def fetch(self, url: str, timeout_sec: int = 20) -> UpstreamResponse:
+        resp = await self.inner.fetch(url, timeout_sec)
+        await self._record([resp])
+        return resp
+
+    async def fetch_many(self, urls: List[str], timeout_sec: int = 20) -> List[UpstreamResponse]:
+        responses = await self.inner.fetch_many(urls, timeout_sec)
+        await self._record(responses)
+        return responses
+
+    async def close(self):
+        await self.inner.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"name": self.name, "recorded": self.recorded, "inner": self.inner.stats()}
+
+
+class ReplayTransport:
+    """
+    Upstream'e hiç gitmeden kaydedilmiş yanıtları döndürür. `latency_ms` (+ rastgele `jitter_ms`)
+    kadar yapay gecikme eklenir; kaydı olmayan URL'ler 404 hata olarak döner.
+    """
+    name = "replay"
+    uses_browser = False
+    # Upstream'e gidilmez; governor'dan geçmez ki ölçülen süre limiter değil kodun kendisi olsun
+    rate_limited = False
+
+    def __init__(self, store: FixtureStore, latency_ms: float = 0.0, jitter_ms: float = 0.0):
+        self.store = store
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.counters = {"hits": 0, "misses": 0}
+
+    async def fetch(self, url: str, timeout_sec: int = 20) -> UpstreamResponse:
+        delay = self.latency_ms + (random.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        entry = self.store.load(url)
+        if entry is None:
+            self.counters["misses"] += 1
+            return UpstreamResponse(url, 404, error="fixture missing", transport=self.name)
+        self.counters["hits"] += 1
+        return UpstreamResponse(url, entry.get("status", 200), entry.get("data"), transport=self.name)
+
+    async def fetch_many(self, urls: List[str], timeout_sec: int = 20) -> List[UpstreamResponse]:
+        return list(await asyncio.gather(*[self.fetch(u, timeout_sec) for u in urls]))
+
+    async def close(self):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"name": self.name, "latency_ms": self.latency_ms, "jitter_ms": self.jitter_ms, **self.counters}
+
+
+_TRANSPORT = None
+
+
+def get_transport():
+    """
+    COLLECTOR_TRANSPORT=httpx (varsayılan) ya da browser.
+    COLLECTOR_MODE=live (varsayılan) | record | replay; fixture dizini COLLECTOR_FIXTURE_DIR,
+    replay gecikmesi COLLECTOR_REPLAY_LATENCY_MS / COLLECTOR_REPLAY_JITTER_MS ile ayarlanır.
+    """
+    global _TRANSPORT
+    if _TRANSPORT is None:
+        mode = os.getenv("COLLECTOR_MODE", "live").lower()
+        store = FixtureStore(Path(os.getenv("COLLECTOR_FIXTURE_DIR", str(DEFAULT_FIXTURE_DIR))))
+        if mode == "replay":
+            _TRANSPORT = ReplayTransport(
+                store,
+                latency_ms=float(os.getenv("COLLECTOR_REPLAY_LATENCY_MS", "0")),
+                jitter_ms=float(os.getenv("COLLECTOR_REPLAY_JITTER_MS", "0")),
+            )
+            return _TRANSPORT
+        browser = BrowserTransport()
+        kind = os.getenv("COLLECTOR_TRANSPORT", "httpx").lower()
+        live = HttpxTransport(browser) if kind == "httpx" else browser
+        _TRANSPORT = RecordingTransport(live, store) if mode == "record" else live
+    return _TRANSPORT
+
+
+async def close_transport():
+    if _TRANSPORT is not None:
+        await _TRANSPORT.close()
@@ -1,6 +1,7 @@
 # C:\Users\Lenovo-is\Desktop\tennis-match-predictor\scripts\create_dataset.py
 # Kapsamlı Tenis Veri Toplama Sistemi - SHAP Analizi ve Makine Öğrenmesi için Optimize Edilmiş
 
+import os
 import sys
 import asyncio
 import json
@@ -34,12 +35,17 @@ try:
         fetch_bulk_odds_for_date
     )
     from app.tgs_calculator import fractional_to_decimal
+    from app.ratelimit import SCRIPT_UPSTREAM_RATE, upstream_priority
 except ImportError as e:
     print(f"HATA: Gerekli modüller yüklenemedi. Hata: {e}")
     print(f"Proje kök dizini: {project_root}")
     print(f"Python path: {sys.path[:3]}")
     exit()
 
+# Upstream hız sınırı süreç başınadır: bu script API ile aynı bütçeyi paylaşmaz.
+# UPSTREAM_RATE verilmediyse düşük hızla çalışır (governor ilk istekte kurulur).
+os.environ.setdefault("UPSTREAM_RATE", SCRIPT_UPSTREAM_RATE)
+
 # Hata loglaması için temel yapılandırma
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -1286,5 +1292,6 @@ async def find_and_process_todays_matches():
         logger.error(f"Detaylı hata: {traceback.format_exc()}")
 
 if __name__ == "__main__":
-    # Bugün oynanan 10 maç verisi çek
-    asyncio.run(find_and_process_todays_matches())
\ No newline at end of file
+    # Bugün oynanan 10 maç verisi çek (toplu veri toplama en düşük öncelikle çalışır)
+    with upstream_priority("bulk"):
+        asyncio.run(find_and_process_todays_matches())
\ No newline at end of file
@@ -1,5 +1,6 @@
 # Basit Tenis Veri Toplama - Sadece 2 Maç için Hızlı Test
 
+import os
 import sys
 import asyncio
 import pandas as pd
@@ -14,10 +15,15 @@ sys.path.insert(0, str(project_root))
 
 try:
     from app.collector import fetch_scheduled_events_for_dates, fetch_all_event_details
+    from app.ratelimit import SCRIPT_UPSTREAM_RATE, upstream_priority
 except ImportError as e:
     print(f"HATA: {e}")
     exit()
 
+# Upstream hız sınırı süreç başınadır: bu script API ile aynı bütçeyi paylaşmaz.
+# UPSTREAM_RATE verilmediyse düşük hızla çalışır (governor ilk istekte kurulur).
+os.environ.setdefault("UPSTREAM_RATE", SCRIPT_UPSTREAM_RATE)
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 logger = logging.getLogger(__name__)
 
@@ -124,6 +130,8 @@ async def main():
 
 if __name__ == "__main__":
     start_time = time.time()
-    asyncio.run(main())
+    # Toplu veri toplama, API/agent çağrılarının arkasında en düşük öncelikle çalışır
+    with upstream_priority("bulk"):
+        asyncio.run(main())
     end_time = time.time()
     logger.info(f"⏱️ Toplam süre: {end_time - start_time:.2f} saniye")
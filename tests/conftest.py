@@ -0,0 +1,4 @@
+import os
+
+# Testler repodaki kalıcı cache dosyasına yazmaz
+os.environ.setdefault("CACHE_PERSIST", "0")
@@ -0,0 +1,281 @@
+import random
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import pytest
+
+from app import tgs_calculator
+
+# --- Vektörel skorlamadan önceki tek maçlık hesabın dondurulmuş kopyası (karşılaştırma referansı) ---
+BASELINE_WEIGHTS = {
+    "oran": 0.25,
+    "sıralama": 0.10,
+    "genel_form": 0.05,
+    "son_10_mac_formu": 0.05,
+    "h2h": 0.075,
+    "sentiment": 0.05,
+    "yuzey_formu": 0.075,
+    "rakip_kalitesi": 0.10,
+    "tiebreak_psikolojisi": 0.05,
+    "servis_hakimiyeti": 0.10,
+    "kritik_anlar_puani": 0.075,
+    "hucum_puani": 0.075,
+}
+_total = sum(BASELINE_WEIGHTS.values())
+BASELINE_WEIGHTS = {k: w / _total for k, w in BASELINE_WEIGHTS.items()}
+
+
+def baseline_fractional_to_decimal(fractional: str) -> float:
+    if not fractional or "/" not in fractional:
+        return float(fractional or "2.0")
+    try:
+        num, den = map(int, fractional.split('/'))
+        if den == 0: return 2.0
+        return 1.0 + (num / den)
+    except (ValueError, TypeError):
+        return 2.0
+
+
+def baseline_metric_scores(data, home_team_id, away_team_id, ground_type):
+    home_scores, away_scores = {}, {}
+
+    def aggregate_stats_for_surface(all_stats: List[Dict], surface: str) -> Dict:
+        surface_stats = [s for s in all_stats if s.get("groundType") == surface]
+        stats_to_aggregate = surface_stats if surface_stats else all_stats
+        if not stats_to_aggregate: return defaultdict(float)
+        aggregated = defaultdict(float)
+        for stat_group in stats_to_aggregate:
+            for key, value in stat_group.items():
+                if isinstance(value, (int, float)): aggregated[key] += value
+        return aggregated
+
+    home_yearly = aggregate_stats_for_surface(data['home_player']['yearly_stats']['all_stats'], ground_type)
+    away_yearly = aggregate_stats_for_surface(data['away_player']['yearly_stats']['all_stats'], ground_type)
+
+    def calculate_score(home_val, away_val):
+        total = home_val + away_val
+        return (0.5, 0.5) if total <= 0 else (home_val / total, away_val / total)
+
+    home_serve_power = (home_yearly.get('aces', 0) * 1.5 + home_yearly.get('firstServePointsScored', 0) - home_yearly.get('doubleFaults', 0) * 2)
+    away_serve_power = (away_yearly.get('aces', 0) * 1.5 + away_yearly.get('firstServePointsScored', 0) - away_yearly.get('doubleFaults', 0) * 2)
+    home_scores['servis_hakimiyeti'], away_scores['servis_hakimiyeti'] = calculate_score(home_serve_power, away_serve_power)
+
+    h_tiebreak_total = home_yearly.get('tiebreaksWon', 0) + home_yearly.get('tiebreakLosses', 0)
+    a_tiebreak_total = away_yearly.get('tiebreaksWon', 0) + away_yearly.get('tiebreakLosses', 0)
+    h_tiebreak_ratio = home_yearly.get('tiebreaksWon', 0) / h_tiebreak_total if h_tiebreak_total > 0 else 0.5
+    a_tiebreak_ratio = away_yearly.get('tiebreaksWon', 0) / a_tiebreak_total if a_tiebreak_total > 0 else 0.5
+    h_bp_ratio = home_yearly.get('breakPointsScored', 0) / (home_yearly.get('breakPointsTotal') or 1)
+    a_bp_ratio = away_yearly.get('breakPointsScored', 0) / (away_yearly.get('breakPointsTotal') or 1)
+    home_clutch = (h_tiebreak_ratio + h_bp_ratio) / 2
+    away_clutch = (a_tiebreak_ratio + a_bp_ratio) / 2
+    home_scores['kritik_anlar_puani'], away_scores['kritik_anlar_puani'] = calculate_score(home_clutch, away_clutch)
+
+    home_attack_ratio = home_yearly.get('winnersTotal', 0) / (home_yearly.get('unforcedErrorsTotal') or 1)
+    away_attack_ratio = away_yearly.get('winnersTotal', 0) / (away_yearly.get('unforcedErrorsTotal') or 1)
+    home_scores['hucum_puani'], away_scores['hucum_puani'] = calculate_score(home_attack_ratio, away_attack_ratio)
+
+    try:
+        ranks = {}
+        for player_key in ['home', 'away']:
+            player_ranks = data[f'{player_key}_player'].get('rankings', {}).get('rankings', [])
+            official = next((r['ranking'] for r in player_ranks if r.get('rankingClass') == 'team'), None)
+            utr = next((r['ranking'] for r in player_ranks if r.get('rankingClass') == 'utr'), None)
+            valid_ranks = [1/r for r in [official, utr] if r is not None and r > 0]
+            ranks[player_key] = (sum(valid_ranks) / len(valid_ranks)) if valid_ranks else 0
+        home_scores['sıralama'], away_scores['sıralama'] = calculate_score(ranks.get('home', 0), ranks.get('away', 0))
+    except Exception: home_scores['sıralama'], away_scores['sıralama'] = 0.5, 0.5
+
+    try:
+        pre_market = next(m for m in data['match_details']['oddsAll'].get('markets', []) if not m.get('isLive') and m.get('marketName') == 'Full time')
+        home_odds = baseline_fractional_to_decimal(next(c for c in pre_market['choices'] if c['name'] == '1').get('fractionalValue', "2.0"))
+        away_odds = baseline_fractional_to_decimal(next(c for c in pre_market['choices'] if c['name'] == '2').get('fractionalValue', "2.0"))
+        home_prob, away_prob = 1 / home_odds, 1 / away_odds
+        home_scores['oran'], away_scores['oran'] = calculate_score(home_prob, away_prob)
+    except Exception: home_scores['oran'], away_scores['oran'] = 0.5, 0.5
+
+    try:
+        votes = data['match_details']['votes'].get('vote', {})
+        home_scores['sentiment'], away_scores['sentiment'] = calculate_score(votes.get('vote1', 0), votes.get('vote2', 0))
+    except Exception: home_scores['sentiment'], away_scores['sentiment'] = 0.5, 0.5
+
+    all_matches_home = data['home_player'].get('matches', {}).get('events', [])
+    all_matches_away = data['away_player'].get('matches', {}).get('events', [])
+
+    try:
+        surface_h2h_home_wins, surface_h2h_away_wins = 0, 0
+        for match in all_matches_home:
+            opponent_id, is_home_in_past_match = (None, None)
+            if str(match.get('homeTeam', {}).get('id')) == str(home_team_id):
+                opponent_id, is_home_in_past_match = str(match.get('awayTeam', {}).get('id')), True
+            elif str(match.get('awayTeam', {}).get('id')) == str(home_team_id):
+                opponent_id, is_home_in_past_match = str(match.get('homeTeam', {}).get('id')), False
+            if opponent_id == str(away_team_id) and match.get('groundType') == ground_type:
+                winner_code = match.get('winnerCode')
+                if (is_home_in_past_match and winner_code == 1) or (not is_home_in_past_match and winner_code == 2):
+                    surface_h2h_home_wins += 1
+                else:
+                    surface_h2h_away_wins += 1
+        home_scores['h2h'], away_scores['h2h'] = calculate_score(surface_h2h_home_wins, surface_h2h_away_wins)
+    except Exception: home_scores['h2h'], away_scores['h2h'] = 0.5, 0.5
+
+    def get_stats_from_matches(matches: List[Dict], player_id: int, limit: Optional[int] = None):
+        if limit and len(matches) > limit: matches = matches[:limit]
+        stats = defaultdict(float)
+        for event in matches:
+            stats['total'] += 1
+            winner_code = event.get('winnerCode')
+            is_home = (event.get('homeTeam', {}).get('id') == player_id)
+            is_away = (event.get('awayTeam', {}).get('id') == player_id)
+            is_winner = (is_home and winner_code == 1) or (is_away and winner_code == 2)
+            if is_winner:
+                stats['wins'] += 1
+                opponent = event.get('awayTeam') if is_home else event.get('homeTeam')
+                opponent_rank = opponent.get('ranking', 1000)
+                if opponent_rank and opponent_rank > 0:
+                    stats['quality_score'] += 1000 / opponent_rank
+                    stats['quality_wins'] += 1
+            if event.get('groundType') == ground_type:
+                stats['surface_total'] += 1
+                if is_winner: stats['surface_wins'] += 1
+            for i in range(1, 6):
+                tb_key = f'period{i}TieBreak'
+                if tb_key in event.get('homeScore', {}) and tb_key in event.get('awayScore', {}):
+                    stats['tb_played'] += 1
+                    home_tb, away_tb = event['homeScore'][tb_key], event['awayScore'][tb_key]
+                    if (is_home and home_tb > away_tb) or (is_away and away_tb > home_tb):
+                        stats['tb_wins'] += 1
+        return stats
+
+    home_stats_all = get_stats_from_matches(all_matches_home, home_team_id)
+    away_stats_all = get_stats_from_matches(all_matches_away, away_team_id)
+    home_stats_last10 = get_stats_from_matches(all_matches_home, home_team_id, limit=10)
+    away_stats_last10 = get_stats_from_matches(all_matches_away, away_team_id, limit=10)
+
+    home_scores['genel_form'] = home_stats_all['wins'] / home_stats_all['total'] if home_stats_all['total'] > 0 else 0.5
+    away_scores['genel_form'] = away_stats_all['wins'] / away_stats_all['total'] if away_stats_all['total'] > 0 else 0.5
+    home_scores['son_10_mac_formu'] = home_stats_last10['wins'] / home_stats_last10['total'] if home_stats_last10['total'] > 0 else 0.5
+    away_scores['son_10_mac_formu'] = away_stats_last10['wins'] / away_stats_last10['total'] if away_stats_last10['total'] > 0 else 0.5
+    home_scores['yuzey_formu'] = home_stats_all['surface_wins'] / home_stats_all['surface_total'] if home_stats_all['surface_total'] > 0 else 0.5
+    away_scores['yuzey_formu'] = away_stats_all['surface_wins'] / away_stats_all['surface_total'] if away_stats_all['surface_total'] > 0 else 0.5
+    home_quality_avg = home_stats_all['quality_score'] / home_stats_all['quality_wins'] if home_stats_all['quality_wins'] > 0 else 1
+    away_quality_avg = away_stats_all['quality_score'] / away_stats_all['quality_wins'] if away_stats_all['quality_wins'] > 0 else 1
+    home_scores['rakip_kalitesi'], away_scores['rakip_kalitesi'] = calculate_score(home_quality_avg, away_quality_avg)
+    home_scores['tiebreak_psikolojisi'] = home_stats_all['tb_wins'] / home_stats_all['tb_played'] if home_stats_all['tb_played'] > 0 else 0.5
+    away_scores['tiebreak_psikolojisi'] = away_stats_all['tb_wins'] / away_stats_all['tb_played'] if away_stats_all['tb_played'] > 0 else 0.5
+    return home_scores, away_scores
+
+
+def baseline_tgs(home_scores, away_scores):
+    home_tgs = sum(BASELINE_WEIGHTS[key] * home_scores.get(key, 0.5) for key in BASELINE_WEIGHTS)
+    away_tgs = sum(BASELINE_WEIGHTS[key] * away_scores.get(key, 0.5) for key in BASELINE_WEIGHTS)
+    total_tgs = home_tgs + away_tgs
+    return home_tgs, away_tgs, home_tgs / total_tgs if total_tgs > 0 else 0.5, away_tgs / total_tgs if total_tgs > 0 else 0.5
+
+
+# --- Rastgele girdiler: sıfır toplamlar, eksik marketler/oylar, tuhaf sıralamalar ---
+SURFACES = ("Hardcourt outdoor", "Clay", "Grass")
+
+
+def _yearly(rng):
+    stats = []
+    for _ in range(rng.choice((0, 1, 2, 3))):
+        group = {"groundType": rng.choice(SURFACES)}
+        for key in ("aces", "doubleFaults", "firstServePointsScored", "firstServePointsTotal",
+                    "secondServePointsScored", "secondServePointsTotal", "tiebreaksWon", "tiebreakLosses",
+                    "breakPointsScored", "breakPointsTotal", "winnersTotal", "unforcedErrorsTotal"):
+            if rng.random() < 0.8:
+                group[key] = rng.choice((0, 0, rng.randint(0, 5), rng.randint(0, 2000), rng.uniform(0, 50)))
+        stats.append(group)
+    return {"all_stats": stats}
+
+
+def _rankings(rng):
+    choice = rng.random()
+    if choice < 0.1:
+        return {"error": "yok"}
+    if choice < 0.2:
+        return {}
+    odd = (0, -3, 1, 1500, None)
+    rankings = []
+    if rng.random() < 0.8:
+        rankings.append({"rankingClass": "team", "ranking": rng.choice(odd + (rng.randint(1, 400),))})
+    if rng.random() < 0.6:
+        rankings.append({"rankingClass": "utr", "ranking": rng.choice(odd + (rng.uniform(1, 16),))})
+    return {"rankings": rankings}
+
+
+def _matches(rng, player_id, opponent_id, next_id):
+    events = []
+    for _ in range(rng.choice((0, 1, 5, 12, 25))):
+        next_id[0] += 1
+        other = opponent_id if rng.random() < 0.2 else rng.randint(10**6, 2 * 10**6)
+        home_side = rng.random() < 0.5
+        other_team = {"id": other}
+        if rng.random() < 0.8:
+            other_team["ranking"] = rng.choice((0, -1, None, rng.randint(1, 900)))
+        home, away = ({"id": player_id}, other_team) if home_side else (other_team, {"id": player_id})
+        home_score, away_score = {}, {}
+        for n in range(1, 4):
+            if rng.random() < 0.3:
+                home_score[f"period{n}TieBreak"], away_score[f"period{n}TieBreak"] = rng.randint(0, 9), rng.randint(0, 9)
+        events.append({"id": next_id[0], "winnerCode": rng.choice((1, 2, 2, None)), "homeTeam": home, "awayTeam": away,
+                       "groundType": rng.choice(SURFACES), "homeScore": home_score, "awayScore": away_score})
+    return {"events": events}
+
+
+def _odds(rng):
+    choice = rng.random()
+    if choice < 0.15:
+        return {}
+    if choice < 0.25:
+        return {"markets": [{"marketName": "Full time", "isLive": True, "choices": []}]}
+    fractions = ("1/2", "5/4", "0/1", "3/0", "abc", "", "2.5", "7/x")
+
+    def value():
+        return rng.choice(fractions + (f"{rng.randint(1, 20)}/{rng.randint(1, 20)}",) * 4)
+
+    choices = [{"name": "1", "fractionalValue": value()}, {"name": "2", "fractionalValue": value()}]
+    if rng.random() < 0.1:
+        del choices[0]["fractionalValue"]
+    return {"markets": [{"marketName": "Full time", "isLive": False, "choices": choices}]}
+
+
+def _votes(rng):
+    choice = rng.random()
+    if choice < 0.15:
+        return {}
+    if choice < 0.3:
+        return {"vote": {"vote1": 0, "vote2": 0}}
+    return {"vote": {"vote1": rng.randint(0, 5000), "vote2": rng.randint(0, 5000)}}
+
+
+def _case(rng, index, next_id):
+    # Profil cache'i oyuncu + zemin başına tutulur; her durum kendi oyuncularıyla sıfırdan kurulur
+    home_id, away_id = 9_000_000 + 2 * index, 9_000_001 + 2 * index
+    ground = rng.choice(SURFACES)
+    data = {
+        "best_of": rng.choice((3, 5, None)),
+        "home_player": {"rankings": _rankings(rng), "matches": _matches(rng, home_id, away_id, next_id), "yearly_stats": _yearly(rng)},
+        "away_player": {"rankings": _rankings(rng), "matches": _matches(rng, away_id, home_id, next_id), "yearly_stats": _yearly(rng)},
+        "match_details": {"oddsAll": _odds(rng), "votes": _votes(rng)},
+    }
+    return data, home_id, away_id, ground
+
+
+def test_batch_scoring_matches_baseline():
+    if tgs_calculator.WEIGHTS.get("markov"):
+        pytest.skip("MARKOV_WEIGHT ayarlı: TGS eski ağırlıklarla karşılaştırılamaz")
+    rng = random.Random(20260101)
+    next_id = [0]
+    cases = [_case(rng, i, next_id) for i in range(600)]
+    inputs = [tgs_calculator.extract_metric_inputs(*case) for case in cases]
+    scored = tgs_calculator.score_matches(inputs)
+
+    for case, result in zip(cases, scored):
+        home_scores, away_scores = baseline_metric_scores(*case)
+        for key in BASELINE_WEIGHTS:
+            assert result["home"][key] == home_scores[key], key
+            assert result["away"][key] == away_scores[key], key
+        expected = baseline_tgs(home_scores, away_scores)
+        got = (result["home_tgs"], result["away_tgs"], result["home_win_prob"], result["away_win_prob"])
+        assert got == expected
@@ -0,0 +1,52 @@
+import asyncio
+
+from app.cache import TieredCache
+
+
+def _cache(tmp_path, max_entries=10):
+    return TieredCache(tmp_path / "cache.sqlite3").namespace("ns", ttl=60, max_entries=max_entries)
+
+
+def _disk_rows(cache):
+    with cache._db_lock:
+        return cache._db().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+def test_put_defers_disk_write_until_flush(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put("ns", "a", {"events": [1, 2]})
+    assert cache._pending and _disk_rows(cache) == 0
+    assert cache.flush() == 1
+    assert _disk_rows(cache) == 1
+
+    reopened = _cache(tmp_path)
+    assert asyncio.run(reopened.get_async("ns", "a")) == {"events": [1, 2]}
+    assert reopened.stats()["ns"]["disk_hits"] == 1
+
+
+def test_pending_write_is_read_after_memory_eviction(tmp_path):
+    cache = _cache(tmp_path, max_entries=1)
+    cache.put("ns", "a", 1)
+    cache.flush()
+    cache.put("ns", "a", 2)
+    cache.put("ns", "b", 3)  # "a" bellekten düşer, yeni değeri henüz diske yazılmadı
+    assert cache.get("ns", "a") == 2
+    cache.invalidate("ns", "b")
+    assert asyncio.run(cache.get_async("ns", "b")) is None
+    cache.flush()
+    assert _cache(tmp_path).get("ns", "a") == 2 and _cache(tmp_path).get("ns", "b") is None
+
+
+def test_background_writer_flushes(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.cache.DISK_FLUSH_INTERVAL_SEC", 0.01)
+    cache = _cache(tmp_path)
+    cache.put("ns", "a", "x")
+
+    async def wait():
+        for _ in range(100):
+            if _disk_rows(cache):
+                return
+            await asyncio.sleep(0.01)
+
+    asyncio.run(wait())
+    assert _disk_rows(cache) == 1
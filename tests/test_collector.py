@@ -0,0 +1,43 @@
+import asyncio
+
+from app.collector import single_flight
+from app.ratelimit import UpstreamGovernor, upstream_priority
+
+
+def test_interactive_joiner_promotes_queued_flight():
+    governor = UpstreamGovernor(rate=100, burst=4, max_concurrency=2, reservations={"interactive": 1})
+
+    @single_flight
+    async def fetch(x):
+        async with governor.slot():
+            return {"x": x}
+
+    async def run():
+        # Ortak tek yer bir bulk isteğinde; bulk'a ayrılmış yer yok
+        held = await governor.acquire(priority="bulk")
+        with upstream_priority("bulk"):
+            bulk = asyncio.ensure_future(fetch(1))
+        await asyncio.sleep(0.05)
+        assert not bulk.done()
+        # Aynı işe katılan interaktif çağıran işi kendi (ayrılmış) yerine taşır
+        interactive = await asyncio.wait_for(fetch(1), timeout=1)
+        assert interactive == {"x": 1}
+        assert await bulk == {"x": 1}
+        governor.release(held)
+
+    asyncio.run(run())
+
+
+def test_coalesced_callers_get_independent_results():
+    @single_flight
+    async def fetch(x):
+        await asyncio.sleep(0.01)
+        return {"items": [x]}
+
+    async def run():
+        results = await asyncio.gather(fetch(1), fetch(1), fetch(1))
+        results[0]["items"].append("changed")
+        assert results[1] == results[2] == {"items": [1]}
+        assert len({id(r) for r in results}) == 3
+
+    asyncio.run(run())
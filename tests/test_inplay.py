@@ -0,0 +1,41 @@
+from app.inplay import live_score_state
+
+
+def _event(first_to_serve, sets, points, periods):
+    home = {"current": sets[0], "point": points[0]}
+    away = {"current": sets[1], "point": points[1]}
+    for n, (games_home, games_away) in enumerate(periods, 1):
+        home[f"period{n}"], away[f"period{n}"] = games_home, games_away
+    return {"firstToServe": first_to_serve, "homeScore": home, "awayScore": away, "defaultPeriodCount": 3}
+
+
+def _home_serving(*args):
+    return live_score_state(_event(*args))["home_serving"]
+
+
+def test_server_alternates_across_sets():
+    assert _home_serving(1, (0, 0), ("0", "0"), [(0, 0)]) is True
+    assert _home_serving(1, (0, 0), ("0", "0"), [(1, 0)]) is False
+    assert _home_serving(2, (0, 0), ("15", "0"), [(2, 1)]) is True
+    # 6-3 ilk set (9 oyun) + 2-1: 12 oyun oynandı, sıradaki oyunu maçı açan atar
+    assert _home_serving(1, (1, 0), ("0", "0"), [(6, 3), (2, 1)]) is True
+
+
+def test_tiebreak_point_server():
+    # 6-4 + 6-6: 22 oyun, tiebreak'i ev sahibi açar; sıra A, BB, AA, BB
+    expected = [True, False, False, True, True, False, False]
+    for n, serving in enumerate(expected):
+        points = (str((n + 1) // 2), str(n // 2))
+        assert _home_serving(1, (1, 0), points, [(6, 4), (6, 6)]) is serving
+
+
+def test_unknown_server():
+    assert _home_serving(None, (0, 0), ("0", "0"), [(0, 0)]) is None
+    assert _home_serving(1, (1, 0), ("0", "0"), [(None, None), (0, 0)]) is None
+
+
+def test_out_of_range_tiebreak_points_are_rejected():
+    assert live_score_state(_event(1, (0, 0), ("12", "3"), [(6, 6)])) is None
+    assert live_score_state(_event(1, (0, 0), ("-1", "0"), [(6, 6)])) is None
+    # Uzayan tiebreak normalize edilip tabloya sığar
+    assert live_score_state(_event(1, (0, 0), ("12", "11"), [(6, 6)])) is not None
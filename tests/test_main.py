@@ -0,0 +1,20 @@
+from fastapi.testclient import TestClient
+
+from app import main
+
+
+def test_match_predictions_requires_id_list():
+    client = TestClient(main.app)
+    for body in ({"event_ids": "12345"}, {"event_ids": {"1": 2}}, "12345"):
+        response = client.post("/api/match-predictions", json=body)
+        assert response.status_code == 400
+
+
+def test_match_predictions_store_error_returns_json(monkeypatch):
+    async def broken_read(date_str, event_ids=None):
+        raise OSError("database is locked")
+
+    monkeypatch.setattr(main, "read_predictions_async", broken_read)
+    response = TestClient(main.app).post("/api/match-predictions", json={"event_ids": [1]})
+    assert response.status_code == 500
+    assert response.json()["detail"] == "database is locked"
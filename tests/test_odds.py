@@ -0,0 +1,20 @@
+import asyncio
+from datetime import datetime
+
+from app import odds
+from app.event_index import index_events
+
+
+def test_event_odds_use_event_start_date(monkeypatch):
+    start = datetime(2026, 3, 14, 12, 0)
+    index_events([{"id": 4242, "homeTeam": {"id": 1}, "awayTeam": {"id": 2}, "startTimestamp": int(start.timestamp())}])
+    requested = []
+
+    async def fake_odds(date_str):
+        requested.append(date_str)
+        return {}
+
+    monkeypatch.setattr(odds, "get_odds_for_date", fake_odds)
+    asyncio.run(odds.get_event_odds(4242))
+    assert requested == ["2026-03-14"]
+    assert odds.event_date(9999, int(start.timestamp())) == "2026-03-14"
@@ -0,0 +1,26 @@
+from app import player_profiles
+
+
+def _match(event_id, winner_code):
+    return {"id": event_id, "winnerCode": winner_code, "homeTeam": {"id": 7, "ranking": 20},
+            "awayTeam": {"id": 8, "ranking": 40}, "groundType": "Clay"}
+
+
+def test_sliding_window_updates_incrementally_without_mutating_cache():
+    first = [_match(n, 1) for n in range(10, 0, -1)]
+    profile = player_profiles.get_player_profile(7, "Clay", first)
+    assert profile["matches"] == 10
+
+    # Yeni maç başa eklendi, en eski maç pencereden düştü: uzunluk aynı kaldı
+    second = [_match(11, 2)] + first[:-1]
+    before = player_profiles.profile_stats()
+    updated = player_profiles.get_player_profile(7, "Clay", second)
+    after = player_profiles.profile_stats()
+
+    assert after["incremental"] == before["incremental"] + 1
+    assert after["rebuilds"] == before["rebuilds"]
+    assert updated["matches"] == 11 and updated["latest_event_id"] == 11
+    assert updated["recent"][0] == 0
+    # Önceki profil nesnesi yerinde değiştirilmedi
+    assert profile["matches"] == 10 and profile["recent"][0] == 1
+    assert player_profiles.get_player_profile(7, "Clay", second) is updated
@@ -0,0 +1,171 @@
+import asyncio
+import json
+import os
+import time
+from datetime import date
+
+from app import pred_archive, pred_store
+
+
+def _use_temp_store(monkeypatch, tmp_path):
+    store = pred_store.SqlitePredictionStore(tmp_path / "p.sqlite3", json_dir=tmp_path / "raw")
+    monkeypatch.setattr(pred_store, "_STORE", store)
+    monkeypatch.setattr(pred_store, "FLUSH_INTERVAL_MS", 10)
+    monkeypatch.setattr(pred_store, "_FLUSH_TASK", None)
+    monkeypatch.setattr(pred_store, "_PENDING", {})
+    pred_store._VIEWS.clear()
+    return store
+
+
+def test_failed_flush_is_retried(monkeypatch, tmp_path):
+    _use_temp_store(monkeypatch, tmp_path)
+    real_upsert = pred_store.upsert_predictions
+    calls = []
+
+    def flaky_upsert(date_str, preds):
+        calls.append(date_str)
+        if len(calls) == 1:
+            raise OSError("disk busy")
+        return real_upsert(date_str, preds)
+
+    monkeypatch.setattr(pred_store, "upsert_predictions", flaky_upsert)
+
+    async def run():
+        pred_store.queue_predictions("2026-01-01", {"1": {"home_win_prob": 0.6}})
+        await asyncio.sleep(0.5)
+
+    asyncio.run(run())
+    assert len(calls) == 2
+    assert not pred_store._PENDING
+    assert pred_store.read_prediction("2026-01-01", "1") == {"home_win_prob": 0.6}
+
+
+def test_flush_across_event_loops(monkeypatch, tmp_path):
+    _use_temp_store(monkeypatch, tmp_path)
+
+    async def run(event_id):
+        pred_store.queue_predictions("2026-01-01", {event_id: {"home_win_prob": 0.5}})
+        # Kuyruktaki görev ile eşzamanlı flush aynı kilidi bekler
+        await asyncio.gather(pred_store.flush_predictions(), pred_store.flush_predictions())
+
+    asyncio.run(run("1"))
+    asyncio.run(run("2"))
+    assert set(pred_store.read_predictions("2026-01-01")) == {"1", "2"}
+
+
+def test_write_through_skips_foreign_commit(monkeypatch, tmp_path):
+    store = _use_temp_store(monkeypatch, tmp_path)
+    other = pred_store.SqlitePredictionStore(store.path, json_dir=tmp_path / "raw")
+    pred_store.upsert_predictions("2026-01-01", {"1": {"home_win_prob": 0.5}})
+    assert set(pred_store.read_predictions("2026-01-01")) == {"1"}
+
+    # Başka bağlantı, bizim belirtecimizi aldıktan sonra ama yazmamızdan önce commit eder
+    real_upsert = store.upsert
+
+    def racing_upsert(date_str, preds):
+        other.upsert(date_str, {"2": {"home_win_prob": 0.4}})
+        return real_upsert(date_str, preds)
+
+    monkeypatch.setattr(store, "upsert", racing_upsert)
+    pred_store.upsert_predictions("2026-01-01", {"3": {"home_win_prob": 0.3}})
+    assert set(pred_store.read_predictions("2026-01-01")) == {"1", "2", "3"}
+
+
+def _use_temp_archive(monkeypatch, tmp_path):
+    raw_dir = tmp_path / "raw"
+    raw_dir.mkdir(exist_ok=True)
+    monkeypatch.setattr(pred_store, "pred_dir_for", lambda date_str: raw_dir)
+    archive = pred_archive.PredictionArchive(tmp_path / "archive")
+    monkeypatch.setattr(pred_archive, "_ARCHIVE", archive)
+    return archive, raw_dir
+
+
+def test_archived_day_round_trip(monkeypatch, tmp_path):
+    store = _use_temp_store(monkeypatch, tmp_path)
+    archive, _raw_dir = _use_temp_archive(monkeypatch, tmp_path)
+    preds = {str(n): {"home_win_prob": n / 100, "scores": {"home": {"oran": 0.5}}} for n in range(1, 40)}
+    pred_store.upsert_predictions("2026-01-01", preds)
+    assert pred_store.read_predictions("2026-01-01") == preds  # görünüm ısınır
+
+    report = pred_store.archive_closed_days(today=date(2026, 1, 10))
+    assert report["archived_days"] == 1
+    assert store.dates() == [] and archive.days() == ["2026-01-01"]
+
+    assert pred_store.read_predictions("2026-01-01") == preds
+    assert json.loads(pred_store.predictions_body("2026-01-01")) == preds
+    pred_store._VIEWS.clear()  # soğuk okuma: manifest üzerinden tek maç
+    assert pred_store.read_prediction("2026-01-01", 7) == preds["7"]
+    assert pred_store.read_predictions("2026-01-01", ["3", "999"]) == {"3": preds["3"]}
+    assert json.loads(pred_store.prediction_body("2026-01-01", 5)) == preds["5"]
+    assert pred_store.prediction_body("2026-01-01", 999) is None
+
+
+def test_late_write_during_archiving_stays_in_store(monkeypatch, tmp_path):
+    store = _use_temp_store(monkeypatch, tmp_path)
+    archive, _raw_dir = _use_temp_archive(monkeypatch, tmp_path)
+    pred_store.upsert_predictions("2026-01-01", {"1": {"home_win_prob": 0.5}})
+    real_archive_day = archive.archive_day
+
+    def archive_then_late_write(date_str, preds):
+        written = real_archive_day(date_str, preds)
+        # Arşiv yazıldıktan sonra, depodan silinmeden önce geç gelen tahmin
+        pred_store.upsert_predictions(date_str, {"2": {"home_win_prob": 0.4}})
+        return written
+
+    monkeypatch.setattr(archive, "archive_day", archive_then_late_write)
+    report = pred_store.archive_closed_days(today=date(2026, 1, 10))
+    assert report["archived_days"] == 0
+    assert store.read_day("2026-01-01") == {"1": {"home_win_prob": 0.5}, "2": {"home_win_prob": 0.4}}
+    assert set(pred_store.read_predictions("2026-01-01")) == {"1", "2"}
+
+    monkeypatch.setattr(archive, "archive_day", real_archive_day)
+    assert pred_store.archive_closed_days(today=date(2026, 1, 10))["archived_days"] == 1
+    assert store.dates() == []
+    assert set(archive.read_day("2026-01-01")) == {"1", "2"}
+
+
+def test_raw_files_deleted_only_when_archived(monkeypatch, tmp_path):
+    archive, raw_dir = _use_temp_archive(monkeypatch, tmp_path)
+    for day in ("2026-01-01", "2026-01-20"):
+        (raw_dir / f"{day}.json").write_text(json.dumps({"1": {"home_win_prob": 0.5}}), encoding="utf-8")
+    store = pred_store.SqlitePredictionStore(tmp_path / "p.sqlite3", json_dir=raw_dir)
+    monkeypatch.setattr(pred_store, "_STORE", store)
+    pred_store._VIEWS.clear()
+    assert store.dates() == ["2026-01-01", "2026-01-20"]
+    # Depo açıldıktan sonra gelen ham dosya içeri aktarılmadı, dolayısıyla arşivlenmeyecek
+    (raw_dir / "2026-01-02.json").write_text(json.dumps({"1": {"home_win_prob": 0.6}}), encoding="utf-8")
+
+    report = pred_store.archive_closed_days(today=date(2026, 1, 25))
+    assert report == {"archived_days": 2, "raw_deleted": 1, "archive_dropped": 0}
+    # Arşivlenmiş ve saklama süresi dolmuş: silindi
+    assert not (raw_dir / "2026-01-01.json").exists()
+    # Arşivlenmiş ama saklama süresi içinde: duruyor
+    assert (raw_dir / "2026-01-20.json").exists()
+    # Saklama süresi dolmuş ama arşivde yok: duruyor
+    assert (raw_dir / "2026-01-02.json").exists()
+    assert pred_store.read_prediction("2026-01-01", 1) == {"home_win_prob": 0.5}
+
+
+def test_json_import_skips_unchanged_files_and_keeps_newer_rows(tmp_path):
+    raw_dir = tmp_path / "raw"
+    raw_dir.mkdir()
+    day_file = raw_dir / "2026-01-01.json"
+    day_file.write_text(json.dumps({"1": {"home_win_prob": 0.5}, "2": {"home_win_prob": 0.5}}), encoding="utf-8")
+    now = time.time()
+    os.utime(day_file, (now - 7200, now - 7200))
+    (raw_dir / "notes.json").write_text("[]", encoding="utf-8")
+
+    store = pred_store.SqlitePredictionStore(tmp_path / "p.sqlite3", json_dir=raw_dir)
+    assert store.read_day("2026-01-01") == {"1": {"home_win_prob": 0.5}, "2": {"home_win_prob": 0.5}}
+    assert store.counters["imported"] == 2
+    # Değişmemiş dosya yeniden aktarılmaz (yeni bağlantıda da)
+    assert store.migrate_json(raw_dir) == 0
+    reopened = pred_store.SqlitePredictionStore(tmp_path / "p.sqlite3", json_dir=raw_dir)
+    assert reopened.dates() == ["2026-01-01"] and reopened.counters["imported"] == 0
+
+    # Dosya değişti (mtime farklı) ama "1" depoda dosyadan daha yeni yazıldı: sadece "2" güncellenir
+    store.upsert("2026-01-01", {"1": {"home_win_prob": 0.9}})
+    day_file.write_text(json.dumps({"1": {"home_win_prob": 0.1}, "2": {"home_win_prob": 0.2}}), encoding="utf-8")
+    os.utime(day_file, (now - 3600, now - 3600))
+    assert store.migrate_json(raw_dir) == 2
+    assert store.read_day("2026-01-01") == {"1": {"home_win_prob": 0.9}, "2": {"home_win_prob": 0.2}}
@@ -0,0 +1,87 @@
+import time
+
+import numpy as np
+import pytest
+
+from app.markov import match_distribution
+from app.simulation import simulate_match
+
+# Referans: hold_prob/tiebreak_prob formüllerini kullanmadan sayı sayı oynanan simülasyon.
+# Hem oyun-seviyesi simülatörü hem de kesin Markov motorunu bağımsız olarak doğrular.
+REFERENCE_SIMULATIONS = 40_000
+CASES = [(0.64, 0.60, 3, 7), (0.70, 0.55, 3, 7), (0.64, 0.60, 5, 10), (0.58, 0.66, 5, 10)]
+
+
+def point_level_reference(p_home, p_away, best_of, final_set_tiebreak, n=REFERENCE_SIMULATIONS, seed=7):
+    rng = np.random.default_rng(seed)
+    sets_to_win = best_of // 2 + 1
+    sets_h, sets_a = np.zeros(n, int), np.zeros(n, int)
+    games_h, games_a = np.zeros(n, int), np.zeros(n, int)
+    pts_h, pts_a = np.zeros(n, int), np.zeros(n, int)
+    total_games = np.zeros(n, int)
+    # Oyunun (tiebreak'te tiebreak'in) ilk servisçisi; ilk servis kura ile
+    game_server = rng.random(n) < 0.5
+    done = np.zeros(n, bool)
+    while not done.all():
+        tiebreak = (games_h == 6) & (games_a == 6)
+        tb_points = pts_h + pts_a
+        server = np.where(tiebreak & (((tb_points + 1) // 2) % 2 == 1), ~game_server, game_server)
+        home_point = (rng.random(n) < np.where(server, p_home, p_away)) == server
+        live = ~done
+        pts_h += live & home_point
+        pts_a += live & ~home_point
+
+        final_set = sets_h + sets_a == best_of - 1
+        target = np.where(tiebreak, np.where(final_set, final_set_tiebreak, 7), 4)
+        game_over = live & (np.maximum(pts_h, pts_a) >= target) & (np.abs(pts_h - pts_a) >= 2)
+        home_game = game_over & (pts_h > pts_a)
+        games_h += home_game
+        games_a += game_over & ~home_game
+        pts_h[game_over] = pts_a[game_over] = 0
+        # Servis her oyunda (tiebreak dahil) el değiştirir
+        game_server = np.where(game_over, ~game_server, game_server)
+
+        set_over = game_over & (((np.maximum(games_h, games_a) >= 6) & (np.abs(games_h - games_a) >= 2)) | tiebreak)
+        total_games += np.where(set_over, games_h + games_a, 0)
+        home_set = set_over & (games_h > games_a)
+        sets_h += home_set
+        sets_a += set_over & ~home_set
+        games_h[set_over] = games_a[set_over] = 0
+        done |= (sets_h == sets_to_win) | (sets_a == sets_to_win)
+
+    keys, counts = np.unique(sets_h * 10 + sets_a, return_counts=True)
+    return {
+        "home_win_prob": float((sets_h == sets_to_win).mean()),
+        "set_scores": {f"{k // 10}-{k % 10}": c / n for k, c in zip(keys.tolist(), counts.tolist())},
+        "expected_total_games": float(total_games.mean()),
+    }
+
+
+def _assert_close(result, reference, prob_tol, games_tol):
+    assert result["home_win_prob"] == pytest.approx(reference["home_win_prob"], abs=prob_tol)
+    for key in set(result["set_scores"]) | set(reference["set_scores"]):
+        assert result["set_scores"].get(key, 0.0) == pytest.approx(reference["set_scores"].get(key, 0.0), abs=prob_tol), key
+    assert result["expected_total_games"] == pytest.approx(reference["expected_total_games"], abs=games_tol)
+
+
+@pytest.mark.parametrize("p_home,p_away,best_of,final_set_tiebreak", CASES)
+def test_engines_agree_with_point_level_reference(p_home, p_away, best_of, final_set_tiebreak):
+    reference = point_level_reference(p_home, p_away, best_of, final_set_tiebreak)
+    exact = match_distribution(p_home, p_away, best_of, final_set_tiebreak, with_games=True)
+    simulated = simulate_match(p_home, p_away, best_of, final_set_tiebreak, seed=11)
+    # 40k referans simülasyonunda olasılık standart hatası <= 0.0025
+    _assert_close(exact, reference, prob_tol=0.01, games_tol=0.25)
+    _assert_close(simulated, reference, prob_tol=0.012, games_tol=0.3)
+    _assert_close(simulated, exact, prob_tol=0.006, games_tol=0.15)
+
+
+@pytest.mark.parametrize("best_of,final_set_tiebreak", [(3, 7), (5, 10)])
+def test_simulation_time_budget(best_of, final_set_tiebreak):
+    simulate_match(0.64, 0.60, best_of, final_set_tiebreak)
+    timings = []
+    for _ in range(5):
+        start = time.perf_counter()
+        simulate_match(0.64, 0.60, best_of, final_set_tiebreak)
+        timings.append(time.perf_counter() - start)
+    # 100k simülasyonluk istek bütçesi 100 ms
+    assert min(timings) < 0.1
@@ -0,0 +1,24 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import snapshots
+
+
+def test_concurrent_duplicate_snapshots_are_written_once(monkeypatch, tmp_path):
+    monkeypatch.setenv("SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(snapshots, "_SEEN", {})
+    real_load = snapshots.load_snapshots
+
+    def slow_load(date_str):
+        # Kümenin kurulumu yavaşken diğer işçiler de aynı günü yazmaya gelir
+        time.sleep(0.05)
+        return real_load(date_str)
+
+    monkeypatch.setattr(snapshots, "load_snapshots", slow_load)
+    pred = {"home_win_prob": 0.6, "scores": {"home": {}, "away": {}}}
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: snapshots.record_snapshot("2026-01-01", 5, 60, pred), range(32)))
+
+    assert results.count(True) == 1
+    assert len(real_load("2026-01-01")) == 1
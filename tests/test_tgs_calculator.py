@@ -0,0 +1,81 @@
+import asyncio
+import time
+
+from app import tgs_calculator
+
+
+def _expires_in(namespace, key):
+    ns = tgs_calculator._CACHE._namespaces[namespace]
+    expires_at, _value = ns.entries[tgs_calculator._CACHE._key(key)]
+    return expires_at - time.time()
+
+
+def test_closed_year_fetch_error_is_not_long_cached(monkeypatch):
+    responses = {
+        2020: {"statistics": [], "fetch_error": True},  # upstream hatası
+        2019: {"statistics": []},  # gerçekten boş yıl
+    }
+
+    async def fake_fetch(team_id, year):
+        return responses[year]
+
+    monkeypatch.setattr(tgs_calculator, "fetch_year_statistics", fake_fetch)
+    result = asyncio.run(tgs_calculator.get_player_stats_for_years(991, [2020, 2019]))
+
+    assert result["fetch_errors"] == [2020]
+    assert _expires_in("year_stats_closed", (991, 2020)) <= tgs_calculator.YEAR_STATS_ERROR_TTL
+    assert _expires_in("year_stats_closed", (991, 2019)) > tgs_calculator.YEAR_STATS_ERROR_TTL
+    player = {"rankings": {}, "matches": {"events": [{"id": 1}]}, "yearly_stats": result}
+    assert not tgs_calculator._player_inputs_complete(player)
+
+
+def test_live_win_probabilities_fetch_only_year_statistics(monkeypatch):
+    calls = {"years": 0, "matches": 0, "rankings": 0}
+
+    async def fake_years(team_id, year):
+        calls["years"] += 1
+        return {"statistics": [{"groundType": "Hardcourt outdoor", "firstServePointsScored": 300,
+                                "firstServePointsTotal": 420, "secondServePointsScored": 100,
+                                "secondServePointsTotal": 200}]}
+
+    async def fake_matches(team_id, page=0):
+        calls["matches"] += 1
+        return {"events": [], "hasNextPage": False}
+
+    async def fake_rankings(team_id):
+        calls["rankings"] += 1
+        return {}
+
+    monkeypatch.setattr(tgs_calculator, "fetch_year_statistics", fake_years)
+    monkeypatch.setattr(tgs_calculator, "fetch_player_matches", fake_matches)
+    monkeypatch.setattr(tgs_calculator, "fetch_rankings_via_page", fake_rankings)
+    event = {"id": 77, "homeTeam": {"id": 881}, "awayTeam": {"id": 882}, "groundType": "Hardcourt outdoor",
+             "firstToServe": 1, "defaultPeriodCount": 3,
+             "homeScore": {"current": 0, "period1": 2, "point": "15"},
+             "awayScore": {"current": 0, "period1": 1, "point": "0"}}
+    result = asyncio.run(tgs_calculator.get_live_win_probabilities([event]))
+
+    assert 0 < result[77]["home_win_prob"] < 1
+    assert calls == {"years": 6, "matches": 0, "rankings": 0}
+
+
+def test_live_win_probabilities_isolate_bad_events(monkeypatch):
+    async def fake_serve_probs(info):
+        return 0.62, 0.6
+
+    def flaky_win_prob(state, p_home, p_away):
+        if state["games"] == [5, 5]:
+            raise IndexError("bozuk durum")
+        return 0.5
+
+    monkeypatch.setattr(tgs_calculator, "get_serve_probs", fake_serve_probs)
+    monkeypatch.setattr(tgs_calculator, "live_win_prob", flaky_win_prob)
+
+    def event(event_id, games):
+        return {"id": event_id, "homeTeam": {"id": 1}, "awayTeam": {"id": 2}, "firstToServe": 1,
+                "homeScore": {"current": 0, "period1": games, "point": "0"},
+                "awayScore": {"current": 0, "period1": games, "point": "0"}}
+
+    result = asyncio.run(tgs_calculator.get_live_win_probabilities([event(1, 5), event(2, 3)]))
+    assert "error" in result[1]
+    assert result[2]["home_win_prob"] == 0.5
@@ -0,0 +1,53 @@
+import asyncio
+
+from app import transport
+from app.ratelimit import UpstreamGovernor
+from app.transport import HttpxTransport, UpstreamResponse
+
+
+class _Fallback:
+    async def fetch(self, url, timeout_sec=20):
+        return UpstreamResponse(url, 200, {"ok": True})
+
+    async def fetch_many(self, urls, timeout_sec=20):
+        return [UpstreamResponse(u, 200, {"ok": True}) for u in urls]
+
+
+def test_first_hop_block_reaches_governor(monkeypatch):
+    governor = UpstreamGovernor(rate=8)
+    monkeypatch.setattr(transport, "get_governor", lambda: governor)
+    http = HttpxTransport(_Fallback())
+
+    async def blocked(url, timeout_sec):
+        return UpstreamResponse(url, 429, error="blocked (429)")
+
+    http._fetch_fast = blocked
+
+    async def run():
+        async with governor.slot():
+            return await http.fetch("https://example.invalid/x")
+
+    resp = asyncio.run(run())
+    assert resp.ok and resp.status == 200
+    assert governor.counters["blocked"] == 1
+    assert governor.rate < governor.max_rate
+
+
+def test_replay_skips_governor(monkeypatch, tmp_path):
+    from app import collector
+    from app.transport import FixtureStore, ReplayTransport
+
+    store = FixtureStore(tmp_path)
+    urls = [f"https://example.invalid/{i}" for i in range(20)]
+    for url in urls:
+        store.save(url, 200, {"url": url})
+    # Tek token'lık, saniyede bir istek veren governor replay'i yavaşlatmamalı
+    governor = UpstreamGovernor(rate=1, burst=1, max_concurrency=1, reservations={"interactive": 1})
+    monkeypatch.setattr(collector, "get_transport", lambda: ReplayTransport(store))
+    monkeypatch.setattr(collector, "get_governor", lambda: governor)
+
+    async def run():
+        return await asyncio.wait_for(asyncio.gather(*[collector._fetch_json(u) for u in urls]), timeout=2)
+
+    assert asyncio.run(run()) == [{"url": u} for u in urls]
+    assert governor.counters["requests"] == 0